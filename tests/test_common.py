@@ -107,3 +107,19 @@ def test_should_format_string_value():
     i = TYPE_FORMAT_MAPPERS[str]('a')
 
     assert i == u'\x04a'
+
+
+def test_should_sort_key_iter_top_records_stable():
+    records = [{'a': 2, 'i': 0}, {'a': 1, 'i': 1}, {'a': 2, 'i': 2}, {'i': 3}, {'a': 1, 'i': 4}]
+
+    for limit in range(0, 6):
+        assert list(sort_key_iter('a', records, limit=limit)) == list(sort_key_iter('a', records))[:limit]
+        assert list(sort_key_iter('a', records, reverse=True, limit=limit)) == \
+            list(sort_key_iter('a', records, reverse=True))[:limit]
+
+
+def test_should_parse_formatted_values():
+    formatted = ''.join(type_formatter_iter([-5, True, None, 7, 'abc']))
+
+    assert list(type_parser_iter(formatted)) == [-5, True, None, 7, 'abc']
+    assert list(type_parser_iter(TYPE_INFL + TYPE_FORMAT_MAPPERS[str]('a1'))) == [EMPTY, 'a1']
@@ -76,3 +76,41 @@ def test_should_validate_query_in_nin_ops():
 
         with pytest.raises(InvalidScanOperationValueError):
             UdbBaseLinearIndex.validate_query({'a': {op: '0'}})
+
+
+def test_should_check_condition_using_compiled_condition_context():
+    records = [
+        {'a': 1, 'b': 'b', 'c': 1},
+        {'a': 2, 'b': 'bc', 'c': 2.5},
+        {'a': 3, 'b': None, 'c': '3'},
+        {'a': True, 'c': False},
+        {},
+    ]
+    queries = [
+        {'a': 1},
+        {'a': {'$eq': 2}, 'b': {'$like': 'b%'}},
+        {'a': {'$gt': 1, '$lte': 3}},
+        {'a': {'$gte': 1}, 'c': {'$lt': '4'}},
+        {'a': {'$in': [1, 3]}, 'b': {'$ne': None}},
+        {'a': {'$nin': [1, 3]}},
+        {'c': {'$fn': lambda record: record.get('a') == 2}},
+        {'c': lambda record: record.get('a') == 3},
+        {'b': {'$unknown': 1}},
+        {'b': None},
+    ]
+
+    for q in queries:
+        context = UdbBaseLinearIndex.create_condition_context(q)
+
+        for record in records:
+            assert UdbBaseLinearIndex.check_condition(record, q, context) == \
+                UdbBaseLinearIndex.check_condition(record, q)
+
+
+def test_should_check_condition_using_cached_compiled_condition_context():
+    context_1 = UdbBaseLinearIndex.create_condition_context({'a': {'$gt': 1}})
+    context_2 = UdbBaseLinearIndex.create_condition_context({'a': {'$gt': 2}})
+
+    assert context_1.__code__ is context_2.__code__
+    assert context_1({'a': 2}) is True
+    assert context_2({'a': 2}) is False
@@ -11,6 +11,39 @@ def test_should_get_cover_key_on_fully_covered_data():
     assert i.get_cover_key(d) == ''.join(type_formatter_iter([1, 2, 3]))
 
 
+def test_should_get_binary_cover_key_then_decode_cover_key():
+    i = UdbBaseLinearIndex(['a', 'b', 'c', 'd']).set_binary_keys()
+    d = {'a': -1, 'b': True, 'c': None, 'd': 'd\u00ff'}
+
+    assert i.get_cover_key(d) == b'\x03\x00' + b'\xff' * 8 + b'\x02\x01\x01\x04d\xc3\xbf'
+    assert i.get_cover_keys([(0, d)]) == [(i.get_cover_key(d), 0)]
+    assert i.decode_cover_key(i.get_cover_key(d)) == d
+
+
+def test_should_get_tuple_cover_key_then_decode_cover_key():
+    i = UdbBaseLinearIndex(['a', 'b', 'c', 'd']).set_tuple_keys()
+    d = {'a': 1, 'b': True, 'c': None, 'd': 1.5}
+
+    assert i.get_cover_key(d) == (1, b'\x01', None, 1.5)
+    assert i.get_cover_keys([(0, d), (1, {'a': 1, 'c': 'c'})]) == [
+        ((1, b'\x01', None, 1.5), 0),
+        ((1, b'', 'c', b''), 1),
+    ]
+    assert i.decode_cover_key(i.get_cover_key(d)) == d
+
+
+def test_should_get_ordered_tuple_cover_key_then_decode_cover_key():
+    i = UdbBaseLinearIndex(['a', 'b', 'c', 'd']).set_tuple_keys()
+    i.is_ranged = True
+    i.set_tuple_keys()
+    d = {'a': 1, 'b': True, 'c': None, 'd': 'd'}
+
+    assert i.get_cover_key(d) == (3, 1, 2, True, 1, 4, 'd')
+    assert i.get_cover_keys([(0, d)]) == [(i.get_cover_key(d), 0)]
+    assert i.decode_cover_key(i.get_cover_key(d)) == d
+    assert i.get_cover_key({'a': 2}) > i.get_cover_key({'a': 1.5, 'b': 'b'}) > i.get_cover_key({'a': True})
+
+
 def test_should_get_cover_key_on_partially_covered_data():
     i = UdbBaseLinearIndex(['a', 'b', 'c'])
     d = {'a': 1, 'c': 3}
@@ -0,0 +1,68 @@
+import pickle
+
+from udb_py.index.udb_bitmap import UdbBitmap
+
+
+SPARSE = list(range(0, 140000, 7))
+DENSE = [uid for uid in range(0, 70000) if uid % 3]
+
+
+def test_should_add_then_discard():
+    b = UdbBitmap()
+
+    b.add(70000).add(3).add(3).add(1 << 40)
+
+    assert list(b) == [3, 70000, 1 << 40]
+    assert len(b) == 3
+    assert 70000 in b and 4 not in b
+
+    b.discard(70000).discard(5)
+
+    assert list(b) == [3, 1 << 40]
+
+
+def test_should_add_to_dense_container_then_discard():
+    b = UdbBitmap(DENSE)
+
+    assert len(b) == len(DENSE)
+    assert list(b) == DENSE
+
+    for uid in DENSE[:-10]:
+        b.discard(uid)
+
+    assert list(b) == DENSE[-10:]
+
+
+def test_should_and():
+    for a in (SPARSE, DENSE):
+        for b in (SPARSE, DENSE):
+            assert list(UdbBitmap(a) & UdbBitmap(b)) == sorted(set(a) & set(b))
+
+
+def test_should_or():
+    for a in (SPARSE, DENSE):
+        for b in (SPARSE, DENSE):
+            assert list(UdbBitmap(a) | UdbBitmap(b)) == sorted(set(a) | set(b))
+
+
+def test_should_sub():
+    for a in (SPARSE, DENSE):
+        for b in (SPARSE, DENSE):
+            assert list(UdbBitmap(a) - UdbBitmap(b)) == sorted(set(a) - set(b))
+
+
+def test_should_not_change_operands():
+    a = UdbBitmap(SPARSE)
+    b = UdbBitmap(DENSE)
+
+    (a | b).add(1)
+    (a - b).add(1)
+
+    assert list(a) == SPARSE
+    assert list(b) == DENSE
+
+
+def test_should_pickle():
+    b = UdbBitmap(SPARSE + DENSE)
+
+    assert pickle.loads(pickle.dumps(b)) == b
@@ -0,0 +1,89 @@
+import pickle
+
+from udb_py.common import *
+from udb_py.index.udb_bitmap_index import UdbBitmapIndex
+
+
+class UdbBitmapIndexTest(UdbBitmapIndex):
+    @property
+    def index(self):
+        return self._hash
+
+
+def test_should_insert_then_delete():
+    i = UdbBitmapIndexTest(['a'])
+
+    i.insert('1', 123).insert('1', 123).insert('1', 333).insert('2', 321).delete('1', 123)
+
+    assert list(i.index['1']) == [333]
+    assert i.count_by_key_ne('1') == 1
+
+    i.delete('2', 321)
+
+    assert '2' not in i.index
+
+
+def test_should_insert_many_by_schema():
+    i = UdbBitmapIndexTest(['a'])
+
+    i.insert_many_by_schema([(uid, {'a': uid % 2}) for uid in range(10)])
+
+    assert list(i.search_by_key_eq(''.join(type_formatter_iter([1])))) == [1, 3, 5, 7, 9]
+    assert i.count_by_key_eq(''.join(type_formatter_iter([0]))) == 5
+
+
+def test_should_upsert():
+    i = UdbBitmapIndexTest(['a'])
+
+    i.insert('1', 123).insert('1', 111).upsert('1', '2', 123)
+
+    assert list(i.search_by_key_eq('1')) == [111]
+    assert list(i.search_by_key_eq('2')) == [123]
+
+
+def test_should_search_by_key_in_and_nin():
+    i = UdbBitmapIndexTest(['a'])
+
+    i.insert('1', 5).insert('2', 3).insert('3', 1).insert('1', 2)
+
+    assert list(i.search_by_key_in(['1', '3'])) == [1, 2, 5]
+    assert list(i.search_by_key_nin(['1', '3'])) == [3]
+    assert list(i.search_by_key_ne('1')) == [1, 3]
+    assert i.count_by_key_nin(['1']) == 2
+
+
+def test_should_search_by_key_ne_and_nin_skipping_none_key():
+    i = UdbBitmapIndexTest(['a'])
+
+    i.insert('1', 5).insert(None, 3).insert('2', 1)
+
+    assert list(i.search_by_key_ne('1')) == [1]
+    assert list(i.search_by_key_nin(['1'])) == [1]
+    assert i.count_by_key_ne('1') == 1
+    assert i.count_by_key_nin(['1']) == 1
+
+
+def test_should_get_snapshot_then_load_snapshot():
+    i = UdbBitmapIndexTest(['a'])
+
+    i.insert('1', 123).insert('1', 333).insert('2', 321)
+
+    snapshot = pickle.loads(pickle.dumps(i.get_snapshot()))
+
+    i = UdbBitmapIndexTest(['a']).load_snapshot(snapshot)
+
+    assert list(i.search_by_key_eq('1')) == [123, 333]
+    assert list(i.search_by_key_ne('1')) == [321]
+
+
+def test_should_get_snapshot_not_changed_by_index():
+    i = UdbBitmapIndexTest(['a'])
+
+    i.insert('1', 123)
+
+    snapshot = i.get_snapshot()
+
+    i.insert('1', 333).insert('2', 321)
+
+    assert list(snapshot[0]) == ['1']
+    assert list(snapshot[0]['1']) == [123]
@@ -1,3 +1,4 @@
+import pickle
 import pytest
 
 from udb_py.common import *
@@ -106,6 +107,14 @@ def test_should_search_by_key_prefix():
     assert list(i.search_by_key_prefix('1')) == [111, 123]
 
 
+
+def test_should_search_by_key_prefix_reversed():
+    i = UdbBtreeBaseIndexTest(['a', 'b', 'c'])
+
+    i.insert('123', 123).insert('321', 321).insert('111', 111).insert('333', 333)
+
+    assert list(i.search_by_key_prefix('1', reverse=True)) == [123, 111]
+
 def test_should_search_by_key_prefix_in():
     i = UdbBtreeBaseIndexTest(['a', 'b', 'c'])
 
@@ -122,6 +131,22 @@ def test_should_search_by_key_range():
     assert list(i.search_by_key_range('12', '33')) == [123, 321]
 
 
+
+def test_should_search_by_key_range_reversed():
+    i = UdbBtreeBaseIndexTest(['a'])
+
+    for x in range(0, 1000):
+        i.insert(TYPE_FORMAT_MAPPERS[int](x), x)
+
+    assert list(i.search_by_key_range(reverse=True)) == list(range(999, -1, -1))
+    assert list(i.search_by_key_range(
+        TYPE_FORMAT_MAPPERS[int](10),
+        TYPE_FORMAT_MAPPERS[int](100),
+        True,
+        True,
+        reverse=True,
+    )) == list(range(99, 10, -1))
+
 def test_should_search_by_key_range_excluding_min():
     i = UdbBtreeBaseIndexTest(['a', 'b', 'c'])
 
@@ -136,3 +161,23 @@ def test_should_search_by_key_range_excluding_max():
     i.insert('123', 123).insert('321', 321).insert('111', 111).insert('333', 333)
 
     assert list(i.search_by_key_range('123', '333', lte_excluded=True)) == [123, 321]
+
+
+def test_should_decode_cover_key():
+    i = UdbBtreeBaseIndexTest(['a', 'b', 'c'])
+
+    assert i.decode_cover_key(i.get_cover_key({'a': 1, 'c': 'x'})) == {'a': 1, 'c': 'x'}
+    assert i.decode_cover_key(i.get_cover_key({'a': 'x', 'b': 1, 'c': 2})) is None
+
+
+def test_should_get_snapshot_then_load_snapshot():
+    i = UdbBtreeBaseIndexTest(['a', 'b', 'c'])
+
+    i.insert('123', 123).insert('321', 321)
+
+    snapshot = pickle.loads(pickle.dumps(i.get_snapshot()))
+
+    i = UdbBtreeBaseIndexTest(['a', 'b', 'c']).load_snapshot(snapshot)
+
+    assert list(i.search_by_key_range('1', '4')) == [123, 321]
+    assert i.estimate_by_key_range('1', '4') == 2
@@ -0,0 +1,137 @@
+import pickle
+import pytest
+
+from udb_py.common import *
+from udb_py.udb_index import SCAN_OP_SEQ
+from udb_py.index.udb_base_linear_index import SCAN_OP_IN
+from udb_py.index.udb_btree_int_index import UdbBtreeIntBaseIndex, UdbBtreeIntIndex
+
+
+class UdbBtreeIntIndexTest(UdbBtreeIntIndex):
+    @property
+    def index(self):
+        return self._btree
+
+
+def test_should_not_create_on_multiple_fields_schema():
+    with pytest.raises(ValueError):
+        UdbBtreeIntIndex(['a', 'b'])
+
+
+def test_should_insert_then_delete():
+    i = UdbBtreeIntIndexTest(['a'])
+
+    i.insert(1, 123).insert(1, 123).insert(1, 333).insert(-2, 321)
+
+    assert list(i.index.get(1)) == [123, 333]
+
+    i.delete(1, 123)
+
+    assert i.index.get(1) == 333
+    assert len(i) == 2
+
+
+def test_should_insert_by_schema():
+    i = UdbBtreeIntIndexTest(['a'])
+
+    i.insert_by_schema({'a': 1 << 40}, 123)
+    i.insert_many_by_schema([(124, {'a': 1 << 40}), (125, {'a': -1})])
+
+    assert list(i.index.keys()) == [-1, 1 << 40]
+    assert list(i.index.get(1 << 40)) == [123, 124]
+
+
+def test_should_not_insert_by_schema_on_missing_field():
+    i = UdbBtreeIntIndexTest(['a'])
+
+    with pytest.raises(FieldRequiredError):
+        i.insert_by_schema({'b': 1}, 123)
+
+    with pytest.raises(FieldRequiredError):
+        i.insert_many_by_schema([(123, {'b': 1})])
+
+
+def test_should_upsert():
+    i = UdbBtreeIntIndexTest(['a'])
+
+    i.insert(1, 123).insert(1, 111).upsert(1, 2, 123)
+
+    assert i.index.get(1) == 111
+    assert i.index.get(2) == 123
+
+
+def test_should_search_by_key_range():
+    i = UdbBtreeIntIndexTest(['a'])
+
+    i.insert(5, 5).insert(1, 1).insert(3, 3).insert(3, 4).insert(-7, -7)
+
+    assert list(i.search_by_key_range(1, 3)) == [1, 3, 4]
+    assert list(i.search_by_key_range(1, 5, gte_excluded=True, reverse=True)) == [5, 3, 4]
+    assert list(i.search_by_key_nin([3])) == [-7, 1, 5]
+    assert i.count_by_key_range(-10, 3) == 4
+
+
+def test_should_get_snapshot_then_load_snapshot():
+    i = UdbBtreeIntIndexTest(['a'])
+
+    i.insert(1, 123).insert(1, 333).insert(2, 321)
+
+    snapshot = pickle.loads(pickle.dumps(i.get_snapshot()))
+
+    i = UdbBtreeIntIndexTest(['a']).load_snapshot(snapshot)
+
+    assert list(i.index.get(1)) == [123, 333]
+    assert i.estimate_by_key_range(0, 3) == 3
+
+
+def test_should_search_base_index_by_key_range():
+    i = UdbBtreeIntBaseIndex(['a'])
+
+    i.insert(5, 5).insert(1, 1).insert(3, 3).insert(-7, -7)
+
+    assert list(i.search_by_key_range(1, 5, lte_excluded=True)) == [1, 3]
+    assert i.decode_cover_key(3) == {'a': 3}
+
+
+def test_should_not_insert_by_schema_on_invalid_value():
+    i = UdbBtreeIntIndexTest(['a'])
+
+    for val in ('1', 1.5, True, 1 << 63, -(1 << 63) - 1):
+        with pytest.raises(ValueError) as e:
+            i.insert_by_schema({'a': val}, 123)
+
+        assert 'a on UdbBtreeIntIndexTest' in str(e.value)
+
+        with pytest.raises(ValueError) as e:
+            i.insert_many_by_schema([(124, {'a': 1}), (125, {'a': val})])
+
+        assert 'a on UdbBtreeIntIndexTest' in str(e.value)
+
+    assert len(i) == 0
+
+
+def test_should_get_seq_scan_op_on_non_int_condition():
+    i = UdbBtreeIntIndex(['ts'])
+
+    for q in (
+        {'ts': 'x'},
+        {'ts': None},
+        {'ts': True},
+        {'ts': {'$gte': 1.5}},
+        {'ts': {'$gt': 'a'}},
+        {'ts': {'$in': [1, 'a']}},
+    ):
+        assert i.get_scan_op(q)[0] == SCAN_OP_SEQ
+
+    assert i.get_scan_op({'ts': {'$in': [1, 2]}})[0] == SCAN_OP_IN
+
+    i = UdbBtreeIntIndex(['a'])
+
+    with pytest.raises(ValueError):
+        i.set_binary_keys()
+
+    with pytest.raises(ValueError):
+        i.set_float_precision(6)
+
+    with pytest.raises(ValueError):
+        i.set_tuple_keys()
@@ -1,3 +1,5 @@
+import pickle
+from array import array
 import pytest
 
 from udb_py.common import *
@@ -15,7 +17,7 @@ def test_should_delete():
 
     i.insert('123', 123).insert('123', 123).insert('123', 333).delete('123', 123)
 
-    assert i.index.get('123', 123) == {333}
+    assert i.index.get('123', 123) == 333
 
 
 def test_should_insert():
@@ -23,7 +25,8 @@ def test_should_insert():
 
     i.insert('123', 123).insert('123', 123).insert('123', 333)
 
-    assert i.index.get('123') == {123, 333}
+    assert i.index.get('123') == array('q', [123, 333])
+    assert i._stats_count == 2
 
 
 def test_should_insert_by_schema():
@@ -31,7 +34,7 @@ def test_should_insert_by_schema():
 
     i.insert_by_schema({'a': 1, 'b': 2, 'c': 3}, 123)
 
-    assert i.index.get(''.join(type_formatter_iter([1, 2, 3]))) == {123}
+    assert i.index.get(''.join(type_formatter_iter([1, 2, 3]))) == 123
 
 
 def test_should_insert_by_schema_with_default_value():
@@ -39,7 +42,7 @@ def test_should_insert_by_schema_with_default_value():
 
     i.insert_by_schema({'a': 1, 'c': 3}, 123)
 
-    assert i.index.get(''.join(type_formatter_iter([1, 1, 3]))) == {123}
+    assert i.index.get(''.join(type_formatter_iter([1, 1, 3]))) == 123
 
 
 def test_should_insert_by_schema_with_default_value_as_callable():
@@ -47,7 +50,7 @@ def test_should_insert_by_schema_with_default_value_as_callable():
 
     i.insert_by_schema({'a': 1, 'c': 3}, 123)
 
-    assert i.index.get(''.join(type_formatter_iter([1, 1, 3]))) == {123}
+    assert i.index.get(''.join(type_formatter_iter([1, 1, 3]))) == 123
 
 
 def test_should_upsert():
@@ -55,7 +58,7 @@ def test_should_upsert():
 
     i.insert('123', 123).insert('123', 123).insert('123', 111).upsert('123', '321', 123)
 
-    assert i.index.get('321') == {123}
+    assert i.index.get('321') == 123
 
 
 def test_should_upsert_deleting_old_key():
@@ -63,7 +66,7 @@ def test_should_upsert_deleting_old_key():
 
     i.insert('123', 123).insert('123', 123).insert('123', 111).upsert('123', '321', 123)
 
-    assert i.index.get('123') == {111}
+    assert i.index.get('123') == 111
 
 
 def test_should_search_by_key():
@@ -122,6 +125,14 @@ def test_should_search_by_key_range():
     assert list(i.search_by_key_range('12', '33')) == [123, 333, 321]
 
 
+
+def test_should_search_by_key_range_reversed():
+    i = UdbBtreeIndexTest(['a', 'b', 'c'])
+
+    i.insert('123', 123).insert('123', 123).insert('123', 333).insert('321', 321).insert('111', 111).insert('333', 333)
+
+    assert list(i.search_by_key_range('12', '33', reverse=True)) == [321, 123, 333]
+
 def test_should_search_by_key_range_excluding_min():
     i = UdbBtreeIndexTest(['a', 'b', 'c'])
 
@@ -136,3 +147,47 @@ def test_should_search_by_key_range_excluding_max():
     i.insert('123', 123).insert('321', 321).insert('111', 111).insert('333', 333)
 
     assert list(i.search_by_key_range('123', '333', lte_excluded=True)) == [123, 321]
+
+
+def test_should_estimate_by_key_eq():
+    i = UdbBtreeIndexTest(['a', 'b', 'c'])
+
+    i.insert('123', 123).insert('123', 333).insert('321', 321)
+
+    assert i.estimate_by_key_eq('123') == 2
+    assert i.estimate_by_key_eq('111') == 0
+
+
+def test_should_estimate_by_key_range():
+    i = UdbBtreeIndexTest(['a', 'b', 'c'])
+
+    i.insert('123', 123).insert('123', 333).insert('321', 321).insert('111', 111).insert('333', 333)
+
+    assert i.estimate_by_key_range('12', '33') == 3
+    assert i.estimate_by_key_range('123', '333', gte_excluded=True) == 2
+
+    i.delete('321', 321)
+
+    assert i.estimate_by_key_range('12', '33') == 2
+
+
+def test_should_estimate_by_key_prefix_in():
+    i = UdbBtreeIndexTest(['a', 'b', 'c'])
+
+    i.insert('123', 123).insert('123', 333).insert('321', 321).insert('111', 111).insert('333', 333)
+
+    assert i.estimate_by_key_prefix_in(['32']) == 1
+    assert i.estimate_by_key_prefix_in(['11', '32']) == 4
+
+
+def test_should_get_snapshot_then_load_snapshot():
+    i = UdbBtreeIndexTest(['a', 'b', 'c'])
+
+    i.insert('123', 123).insert('123', 333).insert('321', 321)
+
+    snapshot = pickle.loads(pickle.dumps(i.get_snapshot()))
+
+    i = UdbBtreeIndexTest(['a', 'b', 'c']).load_snapshot(snapshot)
+
+    assert i.index.get('123') == array('q', [123, 333])
+    assert i.estimate_by_key_range('1', '4') == 3
@@ -0,0 +1,46 @@
+import pickle
+from array import array
+
+from udb_py.index.udb_bucket import (
+    BUCKET_ARRAY_SIZE_MAX,
+    bucket_add,
+    bucket_contains,
+    bucket_from_snapshot,
+    bucket_iter,
+    bucket_len,
+    bucket_remove,
+    bucket_snapshot,
+)
+
+
+def test_should_add_to_single_uid_bucket():
+    assert bucket_add(5, 5) == 5
+    assert bucket_add(5, 3) == array('q', [3, 5])
+    assert bucket_add(array('q', [3, 5]), 4) == array('q', [3, 4, 5])
+    assert bucket_add(array('q', [3, 5]), 5) == array('q', [3, 5])
+
+
+def test_should_add_to_grown_bucket_as_tree_set():
+    bucket = array('q', range(BUCKET_ARRAY_SIZE_MAX))
+
+    bucket = bucket_add(bucket, -1)
+
+    assert type(bucket) is not array
+    assert list(bucket_iter(bucket)) == list(range(-1, BUCKET_ARRAY_SIZE_MAX))
+    assert bucket_len(bucket) == BUCKET_ARRAY_SIZE_MAX + 1
+    assert bucket_contains(bucket, -1)
+
+
+def test_should_remove_from_bucket():
+    assert bucket_remove(5, 5) is None
+    assert bucket_remove(5, 3) == 5
+    assert bucket_remove(array('q', [3, 5]), 3) == 5
+    assert bucket_remove(array('q', [3, 4, 5]), 4) == array('q', [3, 5])
+    assert bucket_remove(bucket_from_snapshot([3]), 3) is None
+
+
+def test_should_get_snapshot_then_load_snapshot():
+    for bucket in (5, array('q', [3, 5]), bucket_add(array('q', range(BUCKET_ARRAY_SIZE_MAX)), -1)):
+        loaded = bucket_from_snapshot(pickle.loads(pickle.dumps(bucket_snapshot(bucket))))
+
+        assert list(bucket_iter(loaded)) == list(bucket_iter(bucket))
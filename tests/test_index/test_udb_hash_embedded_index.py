@@ -2,6 +2,7 @@ import pytest
 
 from udb_py.common import *
 from udb_py.index.udb_hash_base_index import UdbHashEmbeddedBaseIndex
+from udb_py.index.udb_hash_index import UdbHashEmbeddedIndex
 
 
 class UdbHashEmbeddedIndexTest(UdbHashEmbeddedBaseIndex):
@@ -40,3 +41,12 @@ def test_should_upsert_deleting_old_key():
     i.insert(['1', '2', '3'], 123).upsert(['2', '3'], ['4', '5'], 123)
 
     assert i.index.get('2', None) is None and i.index.get('3', None) is None
+
+
+def test_should_insert_many():
+    i = UdbHashEmbeddedIndex(['a'])
+
+    i.insert_many([(['1', '2'], 123), (['1'], 124), (['1'], 124)])
+
+    assert list(i.search_by_key_eq('1')) == [123, 124] and list(i.search_by_key_eq('2')) == [123]
+    assert i._stats_count == 3
@@ -80,3 +80,15 @@ def test_should_search_by_key_in():
     i.insert('123', 123).insert('321', 321).insert('111', 111).insert('333', 333)
 
     assert list(i.search_by_key_in(['123', '111'])) == [123, 111]
+
+
+def test_should_get_snapshot_not_changed_by_index():
+    i = UdbHashBaseIndexTest(['a', 'b', 'c'])
+
+    i.insert('123', 123)
+
+    snapshot = i.get_snapshot()
+
+    i.insert('321', 321)
+
+    assert snapshot == {'123': 123}
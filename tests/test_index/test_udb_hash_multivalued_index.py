@@ -1,3 +1,5 @@
+import pickle
+from array import array
 import pytest
 
 from udb_py.common import *
@@ -15,7 +17,7 @@ def test_should_delete():
 
     i.insert('123', 123).insert('123', 123).insert('123', 333).delete('123', 123)
 
-    assert i.index.get('123', 123) == {333}
+    assert i.index.get('123', 123) == 333
 
 
 def test_should_insert():
@@ -23,7 +25,8 @@ def test_should_insert():
 
     i.insert('123', 123).insert('123', 123).insert('123', 333)
 
-    assert i.index.get('123') == {123, 333}
+    assert i.index.get('123') == array('q', [123, 333])
+    assert i._stats_count == 2
 
 
 def test_should_insert_by_schema():
@@ -31,7 +34,7 @@ def test_should_insert_by_schema():
 
     i.insert_by_schema({'a': 1, 'b': 2, 'c': 3}, 123)
 
-    assert i.index.get(''.join(type_formatter_iter([1, 2, 3]))) == {123}
+    assert i.index.get(''.join(type_formatter_iter([1, 2, 3]))) == 123
 
 
 def test_should_insert_by_schema_with_default_value():
@@ -39,7 +42,7 @@ def test_should_insert_by_schema_with_default_value():
 
     i.insert_by_schema({'a': 1, 'c': 3}, 123)
 
-    assert i.index.get(''.join(type_formatter_iter([1, 1, 3]))) == {123}
+    assert i.index.get(''.join(type_formatter_iter([1, 1, 3]))) == 123
 
 
 def test_should_insert_by_schema_with_default_value_as_callable():
@@ -47,7 +50,7 @@ def test_should_insert_by_schema_with_default_value_as_callable():
 
     i.insert_by_schema({'a': 1, 'c': 3}, 123)
 
-    assert i.index.get(''.join(type_formatter_iter([1, 1, 3]))) == {123}
+    assert i.index.get(''.join(type_formatter_iter([1, 1, 3]))) == 123
 
 
 def test_should_upsert():
@@ -55,7 +58,7 @@ def test_should_upsert():
 
     i.insert('123', 123).insert('123', 123).insert('123', 111).upsert('123', '321', 123)
 
-    assert i.index.get('321') == {123}
+    assert i.index.get('321') == 123
 
 
 def test_should_upsert_deleting_old_key():
@@ -63,7 +66,7 @@ def test_should_upsert_deleting_old_key():
 
     i.insert('123', 123).insert('123', 123).insert('123', 111).upsert('123', '321', 123)
 
-    assert i.index.get('123') == {111}
+    assert i.index.get('123') == 111
 
 
 def test_should_search_by_key():
@@ -80,3 +83,32 @@ def test_should_search_by_key_in():
     i.insert('123', 123).insert('123', 123).insert('123', 333).insert('321', 321).insert('111', 111).insert('333', 333)
 
     assert list(i.search_by_key_in(['123', '111'])) == [123, 333, 111]
+
+
+def test_should_estimate_by_key_eq():
+    i = UdbHashIndexTest(['a', 'b', 'c'])
+
+    i.insert('123', 123).insert('123', 333).insert('321', 321)
+
+    assert i.estimate_by_key_eq('123') == 2
+    assert i.estimate_by_key_eq('111') == 0
+
+
+def test_should_estimate_by_key_in():
+    i = UdbHashIndexTest(['a', 'b', 'c'])
+
+    i.insert('123', 123).insert('123', 333).insert('321', 321)
+
+    assert i.estimate_by_key_in(['123', '321', '111']) == 3
+
+
+def test_should_get_snapshot_then_load_snapshot():
+    i = UdbHashIndexTest(['a', 'b', 'c'])
+
+    i.insert('123', 123).insert('123', 333).insert('321', 321)
+
+    snapshot = pickle.loads(pickle.dumps(i.get_snapshot()))
+
+    i = UdbHashIndexTest(['a', 'b', 'c']).load_snapshot(snapshot)
+
+    assert i.index == {'123': array('q', [123, 333]), '321': 321}
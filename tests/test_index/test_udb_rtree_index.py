@@ -1,3 +1,4 @@
+import pickle
 import pytest
 
 from udb_py.common import InvalidScanOperationValueError
@@ -159,3 +160,15 @@ def test_should_select_by_intersection():
     i.insert([2, 2], 1).insert([0, 0], 2).insert([3, 3], 3)
 
     assert list(i.search_by_intersection(1, 1, 3, 3)) == [1, 3]
+
+
+def test_should_get_snapshot_then_load_snapshot():
+    i = UdbRtreeIndex('a')
+
+    i.insert([2, 2], 1).insert([0, 0], 2).insert([3, 3], 3)
+
+    snapshot = pickle.loads(pickle.dumps(i.get_snapshot()))
+
+    i = UdbRtreeIndex('a').load_snapshot(snapshot)
+
+    assert list(i.search_by_intersection(1, 1, 3, 3)) == [1, 3]
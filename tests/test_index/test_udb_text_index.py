@@ -1,3 +1,4 @@
+import pickle
 import pytest
 
 from udb_py.common import *
@@ -87,3 +88,15 @@ def test_should_upsert_not_deleting_not_requested():
     i.insert({'a': '123'}, 123).insert({'a': '123'}, 124).upsert({'a': '123'}, {'a': '321'}, 123)
 
     assert list(i.index.searcher().search(i.parser.parse('123'))) == [{'udb__uid__': str(124)}]
+
+
+def test_should_get_snapshot_then_load_snapshot():
+    i = UdbTextIndexTest(['a'])
+
+    i.insert({'a': '123'}, 123).insert({'a': '321'}, 321)
+
+    snapshot = pickle.loads(pickle.dumps(i.get_snapshot()))
+
+    i = UdbTextIndexTest(['a']).load_snapshot(snapshot)
+
+    assert list(i.index.searcher().search(i.parser.parse('321'))) == [{'udb__uid__': str(321)}]
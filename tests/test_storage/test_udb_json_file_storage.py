@@ -1,6 +1,9 @@
 import os
 import pytest
 
+from udb_py import udb
+from udb_py.index import UdbBtreeIndex, UdbBtreeUniqBaseIndex
+from udb_py.udb import Udb
 from udb_py.udb_index import UdbIndex
 from udb_py.storage.udb_json_file_storage import UdbJsonFileStorage
 
@@ -48,6 +51,106 @@ def test_should_save_db_then_load_db():
     }
 
 
+def test_should_save_db_then_load_db_with_bulk_indexing(monkeypatch):
+    monkeypatch.setattr(udb, '_LOAD_BATCH_SIZE', 2)
+
+    s = UdbJsonFileStorage('ignore.test')
+
+    s.drop()
+
+    db = Udb({'a': UdbBtreeIndex(['a']), 'b': UdbBtreeUniqBaseIndex(['b'])}, storage=s)
+
+    db.insert_many({'a': i % 2, 'b': i} for i in range(5))
+    db.save_db()
+
+    progress = []
+
+    db = Udb({'a': UdbBtreeIndex(['a']), 'b': UdbBtreeUniqBaseIndex(['b'])}, storage=s)
+
+    assert db.load_db(on_progress=lambda *args: progress.append(args)) is True
+    assert sorted(progress) == [
+        ('a', 2, 5), ('a', 4, 5), ('a', 5, 5),
+        ('b', 2, 5), ('b', 4, 5), ('b', 5, 5),
+    ]
+    assert [r['b'] for r in db.select({'a': 1})] == [1, 3]
+    assert db.count({'b': {'$gte': 2}}) == 3
+
+
+def test_should_save_snapshot_then_load_db_restoring_indexes():
+    s = UdbJsonFileStorage('ignore.test')
+
+    s.drop()
+
+    db = Udb({'a': UdbBtreeIndex(['a'])}, storage=s)
+
+    db.insert_many({'a': i % 2, 'b': i} for i in range(5))
+
+    assert db.save_snapshot() is True
+    assert s.load()['snapshot']['delta'] == {}
+
+    db = Udb({'a': UdbBtreeIndex(['a'])}, storage=s)
+
+    assert db.load_db() is True
+    assert [r['b'] for r in db.select({'a': 1})] == [1, 3]
+
+    db.save_db()
+
+    assert 'snapshot' not in s.load()
+
+
+@pytest.mark.parametrize('compression, ext', [
+    ('bz2', '.bz2'),
+    ('lzma', '.xz'),
+    ('zlib', '.gz'),
+])
+def test_should_save_compressed_snapshot_then_load_db(compression, ext):
+    s = UdbJsonFileStorage('ignore.test', compression=compression, block_size=16)
+
+    s.drop()
+
+    db = Udb({'a': UdbBtreeIndex(['a'])}, storage=s)
+
+    db.insert_many({'a': i % 2, 'b': i} for i in range(5))
+
+    assert db.save_snapshot() is True
+    assert os.path.isfile('./ignore.test.json' + ext) is True
+    assert os.path.isfile('./ignore.test.snapshot' + ext) is True
+
+    db = Udb({'a': UdbBtreeIndex(['a'])}, storage=s)
+
+    assert db.load_db() is True
+    assert [r['b'] for r in db.select({'a': 1})] == [1, 3]
+
+    s.drop()
+
+    assert os.path.isfile('./ignore.test.json' + ext) is False
+    assert os.path.isfile('./ignore.test.snapshot' + ext) is False
+
+
+def test_should_drop_snapshot_saved_by_other_compression():
+    s = UdbJsonFileStorage('ignore.test', compression='zlib')
+
+    s.drop()
+
+    db = Udb({'a': UdbBtreeIndex(['a'])}, storage=s)
+
+    db.insert_many({'a': i % 2, 'b': i} for i in range(5))
+    db.save_snapshot()
+
+    s = UdbJsonFileStorage('ignore.test')
+
+    s.drop()
+
+    assert os.path.isfile('./ignore.test.snapshot.gz') is False
+
+    os.remove('./ignore.test.json.gz')
+
+
+def test_should_not_create_with_unknown_compression():
+    with pytest.raises(ValueError):
+        UdbJsonFileStorage('ignore.test', compression='unknown')
+
+
 def test_should_drop():
     copyfile('tests/test_storage', '.', 'ignore.test.json')
 
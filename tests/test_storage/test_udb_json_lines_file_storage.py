@@ -0,0 +1,117 @@
+import os
+import pytest
+
+from udb_py.index import UdbBtreeIndex
+from udb_py.udb import Udb
+from udb_py.udb_index import UdbIndex
+from udb_py.storage import udb_json_lines_file_storage
+from udb_py.storage.udb_json_lines_file_storage import UdbJsonLinesFileStorage
+
+
+class UdbTestIndex(UdbIndex):
+    def get_meta(self):
+        return {}
+
+
+def test_should_save_db_then_load_db():
+    i = {
+        'a': UdbTestIndex(),
+        'b': UdbTestIndex(),
+    }
+
+    s = UdbJsonLinesFileStorage('ignore.test')
+
+    s.drop()
+
+    s.save(i, 4, {1: {'a': 1}, 3: {'a': 2}})
+
+    db = s.load()
+
+    assert list(db.pop('data')) == [(1, {'a': 1}), (3, {'a': 2})]
+    assert db == {
+        'indexes': {
+            'a': [None, {}],
+            'b': [None, {}],
+        },
+        'revision': 4,
+    }
+
+
+def test_should_save_db_then_load_db_streaming_records():
+    s = UdbJsonLinesFileStorage('ignore.test')
+
+    s.drop()
+
+    db = Udb({'a': UdbBtreeIndex(['a'])}, storage=s)
+
+    db.insert_many({'a': i % 2, 'b': i} for i in range(5))
+    db.save_db()
+
+    with open('./ignore.test.jsonl', 'r') as r:
+        assert len(r.readlines()) == 6
+
+    db = Udb({'a': UdbBtreeIndex(['a'])}, storage=s)
+
+    assert db.load_db() is True
+    assert [r['b'] for r in db.select({'a': 1})] == [1, 3]
+    assert db.insert({'a': 1, 'b': 5})['__rev__'] == 5
+
+
+def test_should_save_snapshot_then_load_db_restoring_indexes():
+    s = UdbJsonLinesFileStorage('ignore.test')
+
+    s.drop()
+
+    db = Udb({'a': UdbBtreeIndex(['a'])}, storage=s)
+
+    db.insert_many({'a': i % 2, 'b': i} for i in range(5))
+
+    assert db.save_snapshot() is True
+    assert s.load()['snapshot']['delta'] == {}
+
+    db = Udb({'a': UdbBtreeIndex(['a'])}, storage=s)
+
+    assert db.load_db() is True
+    assert [r['b'] for r in db.select({'a': 1})] == [1, 3]
+
+
+@pytest.mark.parametrize('compression', ['bz2', 'lzma', 'zlib'])
+def test_should_save_compressed_db_then_load_db(compression):
+    s = UdbJsonLinesFileStorage('ignore.test', compression=compression, block_size=16)
+
+    s.drop()
+
+    s.save({}, 3, {0: {'a': 1}, 2: {'a': 2}})
+
+    assert list(s.load()['data']) == [(0, {'a': 1}), (2, {'a': 2})]
+
+    s.drop()
+
+
+def test_should_keep_previous_db_on_interrupted_save(monkeypatch):
+    s = UdbJsonLinesFileStorage('ignore.test')
+
+    s.drop()
+
+    s.save({}, 1, {0: {'a': 1}})
+
+    def dumps(value):
+        raise ValueError
+
+    monkeypatch.setattr(udb_json_lines_file_storage.json, 'dumps', dumps)
+
+    with pytest.raises(ValueError):
+        s.save({}, 2, {0: {'a': 1}, 1: {'a': 2}})
+
+    monkeypatch.undo()
+
+    assert list(s.load()['data']) == [(0, {'a': 1})]
+
+
+def test_should_drop():
+    s = UdbJsonLinesFileStorage('ignore.test')
+
+    s.save({}, 1, {0: {'a': 1}})
+    s.drop()
+
+    assert os.path.isfile('./ignore.test.jsonl') is False
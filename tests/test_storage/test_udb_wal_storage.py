@@ -1,7 +1,10 @@
 import os
 import pytest
 
+from udb_py.index import UdbBtreeIndex
+from udb_py.udb import Udb
 from udb_py.udb_index import UdbIndex
+from udb_py.storage import udb_wal_storage
 from udb_py.storage.udb_wal_storage import UdbWalStorage
 
 
@@ -60,6 +63,648 @@ def test_should_save_db_then_load_db():
     }
 
 
+def test_should_save_many_then_load_db():
+    s = UdbWalStorage('ignore.test')
+
+    s.drop()
+
+    s.save_meta({}, 0)
+
+    s.load()
+
+    s.on_insert_many([(0, {'a': 0}), (1, {'a': 1}), (2, {'a': 2})])
+    s.on_delete(1)
+
+    db = s.load()
+
+    assert db == {
+        'data': {
+            0: {'a': 0, '__rev__': 0},
+            2: {'a': 2, '__rev__': 2},
+        },
+        'indexes': {},
+        'revision': 3,
+    }
+
+
+def test_should_save_snapshot_then_load_delta():
+    s = UdbWalStorage('ignore.test')
+
+    s.drop()
+
+    db = Udb({'a': UdbBtreeIndex(['a'])}, storage=s)
+
+    db.load_db()
+    db.insert_many({'a': i} for i in range(3))
+
+    assert db.save_snapshot() is True
+
+    db.insert({'a': 3})
+
+    snapshot = s.load()['snapshot']
+
+    assert snapshot['delta'] == {3: None}
+    assert snapshot['indexes']['a'][:2] == ['btree', db.indexes['a'].get_meta()]
+    assert snapshot['revision'] == 3
+
+
+def test_should_save_snapshot_then_load_db_reindexing_delta():
+    s = UdbWalStorage('ignore.test')
+
+    s.drop()
+
+    db = Udb({'a': UdbBtreeIndex(['a'])}, storage=s)
+
+    db.load_db()
+    db.insert_many({'a': i} for i in range(3))
+    db.save_snapshot()
+    db.insert({'a': 3})
+    db.update({'a': 10}, q={'a': 1})
+    db.delete({'a': 2})
+
+    db = Udb({'a': UdbBtreeIndex(['a'])}, storage=s)
+
+    assert db.load_db() is True
+    assert [r['a'] for r in db.select({'a': {'$gte': 0}})] == [0, 3, 10]
+    assert list(db.select({'a': 1})) == []
+    assert list(db.select({'a': 2})) == []
+    # the repacked WAL gets the new snapshot
+    assert s.load()['snapshot']['delta'] == {}
+
+
+def test_should_save_snapshot_then_load_db_from_snapshot_and_wal_tail():
+    s = UdbWalStorage('ignore.test')
+
+    s.drop()
+
+    db = Udb(storage=s)
+
+    db.load_db()
+    db.insert_many({'a': i} for i in range(3))
+    db.save_snapshot()
+
+    assert os.path.getsize('./ignore.test.wal.data') == 0
+    assert os.path.isfile('./ignore.test.wal.data.1') is False
+
+    db.insert({'a': 3})
+
+    assert s.load()['data'] == {
+        0: {'a': 0, '__rev__': 0},
+        1: {'a': 1, '__rev__': 1},
+        2: {'a': 2, '__rev__': 2},
+        3: {'a': 3, '__rev__': 3},
+    }
+
+
+def test_should_load_db_from_interrupted_checkpoint():
+    s = UdbWalStorage('ignore.test')
+
+    s.drop()
+
+    db = Udb(storage=s)
+
+    db.load_db()
+    db.insert({'a': 0})
+    db.save_snapshot()
+    db.insert({'a': 1})
+    db.delete({'a': 0})
+
+    s.load()
+
+    # the checkpoint is interrupted right after the WAL rotation
+    s._wal_rotate()
+    s.on_insert(2, {'a': 2, '__rev__': 2})
+
+    assert s.load()['data'] == {
+        1: {'a': 1, '__rev__': 1},
+        2: {'a': 2, '__rev__': 2},
+    }
+    assert s.is_checkpoint_required() is True
+
+    s.save_snapshot({}, 3, s.load()['data'])
+
+    assert os.path.isfile('./ignore.test.wal.data.2') is False
+    assert os.path.isfile('./ignore.test.wal.data.3') is False
+    assert s.load()['data'] == {
+        1: {'a': 1, '__rev__': 1},
+        2: {'a': 2, '__rev__': 2},
+    }
+
+
+def test_should_load_db_from_interrupted_checkpoint_deleting_covered_segments():
+    s = UdbWalStorage('ignore.test')
+
+    s.drop()
+
+    db = Udb(storage=s)
+
+    db.load_db()
+    db.insert({'a': 0})
+
+    s._wal_rotate()
+
+    copyfile('.', '.', 'ignore.test.wal.data.1', 'ignore.test.wal.data.1.copy')
+
+    db.save_snapshot()
+
+    # the checkpoint is interrupted right after the snapshot saving
+    os.replace('./ignore.test.wal.data.1.copy', './ignore.test.wal.data.1')
+
+    with open('./ignore.test.wal.manifest', 'w') as f:
+        f.write('{"last": 2, "segments": [1, 2]}')
+
+    assert s.load()['data'] == {0: {'a': 0, '__rev__': 0}}
+    assert os.path.isfile('./ignore.test.wal.data.1') is False
+
+
+def test_should_save_segments_then_load_db_merging_segments():
+    s = UdbWalStorage('ignore.test', segment_size=1, workers=2)
+
+    s.drop()
+
+    db = Udb(storage=s)
+
+    db.load_db()
+    db.insert_many({'a': i} for i in range(3))
+    db.insert({'a': 3})
+    db.update({'b': 1}, q={'a': 1})
+    db.delete({'a': 2})
+
+    assert os.path.isfile('./ignore.test.wal.data.4') is True
+
+    assert s.load()['data'] == {
+        0: {'a': 0, '__rev__': 0},
+        1: {'a': 1, 'b': 1, '__rev__': 1},
+        3: {'a': 3, '__rev__': 3},
+    }
+
+
+@pytest.mark.parametrize('compression, ext', [
+    ('bz2', '.bz2'),
+    ('lzma', '.xz'),
+    ('zlib', '.gz'),
+])
+def test_should_save_compressed_segments_and_snapshot_then_load_db(compression, ext):
+    s = UdbWalStorage('ignore.test', segment_size=1, compression=compression, block_size=16)
+
+    s.drop()
+
+    db = Udb({'a': UdbBtreeIndex(['a'])}, storage=s)
+
+    db.load_db()
+    db.insert_many({'a': i} for i in range(3))
+    db.save_snapshot()
+    db.insert({'a': 3})
+    db.update({'b': 1}, q={'a': 1})
+    db.delete({'a': 2})
+
+    assert os.path.isfile('./ignore.test.wal.snapshot' + ext) is True
+    assert os.path.isfile('./ignore.test.wal.data.3' + ext) is True
+    assert os.path.isfile('./ignore.test.wal.data.3') is False
+
+    data = s.load()
+
+    assert data['data'] == {
+        0: {'a': 0, '__rev__': 0},
+        1: {'a': 1, 'b': 1, '__rev__': 1},
+        3: {'a': 3, '__rev__': 3},
+    }
+    assert data['snapshot']['revision'] == 3
+
+    s.drop()
+
+    assert [name for name in os.listdir('.') if name.startswith('ignore.test.wal')] == []
+
+
+def test_should_save_compressed_snapshot_then_load_db_by_other_compression():
+    s = UdbWalStorage('ignore.test', compression='zlib')
+
+    s.drop()
+
+    db = Udb({'a': UdbBtreeIndex(['a'])}, storage=s)
+
+    db.load_db()
+    db.insert_many({'a': i} for i in range(3))
+    db.save_snapshot()
+    db.insert({'a': 3})
+
+    s.close()
+
+    s = UdbWalStorage('ignore.test', compression='bz2')
+
+    assert [r['a'] for r in s.load()['data'].values()] == [0, 1, 2, 3]
+
+    db = Udb({'a': UdbBtreeIndex(['a'])}, storage=s)
+
+    db.load_db()
+    db.save_snapshot()
+
+    assert os.path.isfile('./ignore.test.wal.snapshot.bz2') is True
+    assert os.path.isfile('./ignore.test.wal.snapshot.gz') is False
+
+    s = UdbWalStorage('ignore.test')
+
+    assert [r['a'] for r in s.load()['data'].values()] == [0, 1, 2, 3]
+
+    s.drop()
+
+    assert [name for name in os.listdir('.') if name.startswith('ignore.test.wal')] == []
+
+
+def test_should_not_create_with_unknown_compression():
+    with pytest.raises(ValueError):
+        UdbWalStorage('ignore.test', compression='unknown')
+
+
+def test_should_checkpoint_when_wal_exceeds_checkpoint_size():
+    s = UdbWalStorage('ignore.test', checkpoint_size=100)
+
+    s.drop()
+
+    db = Udb(storage=s)
+
+    db.load_db()
+    db.insert({'a': 'a' * 40})
+
+    assert os.path.isfile('./ignore.test.wal.snapshot') is False
+
+    db.insert({'a': 'a' * 40})
+
+    assert os.path.isfile('./ignore.test.wal.snapshot') is True
+    assert os.path.getsize('./ignore.test.wal.data') == 0
+    assert len(s.load()['data']) == 2
+
+
+def test_should_checkpoint_by_mapper_of_load_db():
+    s = UdbWalStorage('ignore.test', checkpoint_size=100)
+
+    s.drop()
+
+    db = Udb(storage=s)
+
+    db.load_db(mapper=lambda record: dict(record, m=1))
+    db.insert({'a': 'a' * 40})
+    db.insert({'a': 'a' * 40})
+
+    assert os.path.isfile('./ignore.test.wal.snapshot') is True
+    assert [r['m'] for r in s.load()['data'].values()] == [1, 1]
+
+
+@pytest.mark.parametrize('durability, fsync_count', [
+    ('none', 0),
+    ('batch', 2),
+    ('op', 4),
+])
+def test_should_fsync_by_durability(monkeypatch, durability, fsync_count):
+    s = UdbWalStorage('ignore.test', durability=durability)
+
+    s.drop()
+
+    db = Udb(storage=s)
+
+    db.load_db()
+
+    fsyncs = []
+
+    monkeypatch.setattr(os, 'fsync', lambda fd: fsyncs.append(fd))
+
+    db.insert_many({'a': i} for i in range(3))
+    db.update({'b': 1}, q={'a': {'$gte': 0}})
+
+    assert len(fsyncs) == fsync_count
+    assert [r['b'] for r in s.load()['data'].values()] == [1, 1, 1]
+
+
+@pytest.mark.parametrize('durability', ['none', 'interval'])
+def test_should_write_wal_on_every_commit(durability):
+    s = UdbWalStorage('ignore.test', durability=durability, fsync_interval=60000)
+
+    s.drop()
+
+    db = Udb(storage=s)
+
+    db.load_db()
+    db.insert({'a': 0})
+    db.insert({'a': 1})
+
+    assert [r['a'] for r in UdbWalStorage('ignore.test').load()['data'].values()] == [0, 1]
+
+    s.close()
+
+
+def test_should_fsync_by_interval_durability(monkeypatch):
+    s = UdbWalStorage('ignore.test', durability='interval', fsync_interval=100)
+
+    s.drop()
+
+    db = Udb(storage=s)
+
+    db.load_db()
+
+    fsyncs = []
+    now = [1000.0]
+
+    monkeypatch.setattr(os, 'fsync', lambda fd: fsyncs.append(fd))
+    monkeypatch.setattr(udb_wal_storage.time, 'monotonic', lambda: now[0])
+
+    db.insert({'a': 0})
+    db.insert({'a': 1})
+
+    assert len(fsyncs) == 1
+
+    now[0] += 0.1
+
+    db.insert({'a': 2})
+
+    assert len(fsyncs) == 2
+
+
+@pytest.mark.parametrize('durability', ['none', 'interval', 'batch', 'op'])
+def test_should_write_by_background_writer_then_load_db(durability):
+    s = UdbWalStorage('ignore.test', durability=durability, queue_size=2)
+
+    s.drop()
+
+    db = Udb(storage=s)
+
+    db.load_db()
+    db.insert_many({'a': i} for i in range(3))
+
+    for i in range(3, 10):
+        db.insert({'a': i})
+
+    db.update({'b': 1}, q={'a': {'$gte': 5}})
+    db.delete(q={'a': 0})
+
+    s.close()
+
+    assert s._writer is None
+
+    data = UdbWalStorage('ignore.test').load()['data']
+
+    assert sorted(r['a'] for r in data.values()) == list(range(1, 10))
+    assert sorted(r['a'] for r in data.values() if r.get('b') == 1) == [5, 6, 7, 8, 9]
+
+
+def test_should_drain_background_writer_on_exit(monkeypatch):
+    exit_fns = []
+
+    monkeypatch.setattr(udb_wal_storage.atexit, 'register', exit_fns.append)
+    monkeypatch.setattr(udb_wal_storage.atexit, 'unregister', exit_fns.remove)
+
+    s = UdbWalStorage('ignore.test', durability='interval', fsync_interval=60000, queue_size=100)
+
+    s.drop()
+
+    db = Udb(storage=s)
+
+    db.load_db()
+
+    for i in range(10):
+        db.insert({'a': i})
+
+    assert exit_fns == [s.close]
+
+    exit_fns[0]()
+
+    assert exit_fns == []
+    assert s._writer is None
+    assert sorted(r['a'] for r in UdbWalStorage('ignore.test').load()['data'].values()) == list(range(10))
+
+
+@pytest.mark.parametrize('durability', ['none', 'batch'])
+def test_should_wait_durable_revision_of_background_writer(monkeypatch, durability):
+    s = UdbWalStorage('ignore.test', durability=durability, queue_size=16)
+
+    s.drop()
+
+    db = Udb(storage=s)
+
+    db.load_db()
+
+    fsyncs = []
+
+    monkeypatch.setattr(os, 'fsync', lambda fd: fsyncs.append(fd))
+
+    record = db.insert({'a': 0})
+
+    assert s.wait_durable(record['__rev__'], timeout=5) is True
+    assert len(fsyncs) == 1
+    assert s.wait_durable(record['__rev__']) is True
+    assert len(fsyncs) == 1
+
+    s.close()
+
+
+def test_should_block_writing_op_while_background_writer_queue_is_full(monkeypatch):
+    s = UdbWalStorage('ignore.test', queue_size=1)
+
+    s.drop()
+
+    db = Udb(storage=s)
+
+    db.load_db()
+
+    appended = []
+    append = s._wal_append
+
+    monkeypatch.setattr(s, '_wal_append', lambda *args: appended.append(args) or append(*args))
+
+    for i in range(5):
+        db.insert({'a': i})
+
+        assert len(appended) >= i - 1
+
+    s.flush()
+
+    assert len(appended) == 5
+
+    s.close()
+
+
+@pytest.mark.parametrize('codec', ['json', 'msgpack', 'struct'])
+def test_should_save_db_by_codec_then_load_db(codec):
+    if codec == 'msgpack':
+        pytest.importorskip('msgpack')
+
+    s = UdbWalStorage('ignore.test', codec=codec)
+
+    s.drop()
+
+    db = Udb(storage=s)
+
+    db.load_db()
+    db.insert_many({'a': i, 'b': 'b' + str(i) * 300, 'c': [i, 0.5, None, True]} for i in range(3))
+    db.update({'d': {'e': 1}}, q={'a': 1})
+    db.delete(q={'a': 2})
+
+    data = s.load()['data']
+
+    assert data == {
+        0: {'a': 0, 'b': 'b' + '0' * 300, 'c': [0, 0.5, None, True], '__rev__': 0},
+        1: {'a': 1, 'b': 'b' + '1' * 300, 'c': [1, 0.5, None, True], 'd': {'e': 1}, '__rev__': 1},
+    }
+
+
+def test_should_encode_by_struct_codec_then_decode():
+    val = {'a': [None, True, False, 1, - 1 << 70, 0.5, 'é' * 300, b'b', (1, 2)], 'b': {1: {}}}
+
+    assert udb_wal_storage._struct_decode(memoryview(udb_wal_storage._struct_encode(val))) == {
+        'a': [None, True, False, 1, - 1 << 70, 0.5, 'é' * 300, b'b', [1, 2]], 'b': {1: {}},
+    }
+
+    with pytest.raises(TypeError):
+        udb_wal_storage._struct_encode({'a': {1}})
+
+    with pytest.raises(ValueError):
+        udb_wal_storage._struct_decode(udb_wal_storage._struct_encode(val)[:-1])
+
+
+def test_should_load_db_written_by_different_codecs():
+    s = UdbWalStorage('ignore.test', codec='json')
+
+    s.drop()
+
+    db = Udb(storage=s)
+
+    db.load_db()
+    db.insert({'a': 0})
+
+    s.load()
+    s = UdbWalStorage('ignore.test', codec='struct')
+
+    db = Udb(storage=s)
+
+    db.load_db()
+    db.insert({'a': 1})
+
+    assert [r['a'] for r in s.load()['data'].values()] == [0, 1]
+
+
+def test_should_load_db_from_wal_with_torn_tail():
+    s = UdbWalStorage('ignore.test')
+
+    s.drop()
+
+    db = Udb(storage=s)
+
+    db.load_db()
+    db.insert({'a': 0})
+
+    s.load()
+
+    size = os.path.getsize('./ignore.test.wal.data')
+
+    db.insert({'a': 1})
+
+    s.load()
+
+    with open('./ignore.test.wal.data', 'rb') as r:
+        wal = r.read()
+
+    for torn_size in range(size + 1, len(wal)):
+        with open('./ignore.test.wal.data', 'wb') as w:
+            w.write(wal[:torn_size])
+
+        with pytest.raises(udb_wal_storage.CorruptedWalError):
+            UdbWalStorage('ignore.test').load()
+
+        assert [r['a'] for r in UdbWalStorage('ignore.test', True).load()['data'].values()] == [0]
+        assert os.path.getsize('./ignore.test.wal.data') == size
+
+
+def test_should_load_db_from_wal_with_corrupted_frame_truncating_wal():
+    s = UdbWalStorage('ignore.test')
+
+    s.drop()
+
+    db = Udb(storage=s)
+
+    db.load_db()
+    db.insert({'a': 0})
+    db.insert({'a': 1})
+    db.insert({'a': 2})
+
+    s.load()
+
+    with open('./ignore.test.wal.data', 'rb') as r:
+        wal = bytearray(r.read())
+
+    frame_size = len(wal) // 3
+    # the value of the second frame remains valid JSON, so only the checksum detects the corruption
+    wal[wal.index(b'"a": 1') + 5] = ord('7')
+
+    with open('./ignore.test.wal.data', 'wb') as w:
+        w.write(wal)
+
+    with pytest.raises(udb_wal_storage.CorruptedWalError):
+        UdbWalStorage('ignore.test').load()
+
+    s = UdbWalStorage('ignore.test', True)
+
+    db = Udb(storage=s)
+
+    db.load_db()
+
+    assert [r['a'] for r in db.select()] == [0]
+    assert os.path.getsize('./ignore.test.wal.data') == frame_size
+
+    db.insert({'a': 3})
+
+    assert [r['a'] for r in s.load()['data'].values()] == [0, 3]
+
+
+@pytest.mark.parametrize('compression, ext', [
+    (None, ''),
+    ('zlib', '.gz'),
+])
+def test_should_load_db_from_corrupted_segment_not_replaying_later_segments(compression, ext):
+    s = UdbWalStorage('ignore.test', segment_size=1, compression=compression)
+
+    s.drop()
+
+    db = Udb(storage=s)
+
+    db.load_db()
+
+    for i in range(4):
+        db.insert({'a': i})
+
+    s.close()
+
+    with open('./ignore.test.wal.data.2' + ext, 'r+b') as w:
+        w.seek(- 6, os.SEEK_END)
+        w.write(b'\xff')
+
+    with pytest.raises(udb_wal_storage.CorruptedWalError):
+        UdbWalStorage('ignore.test', compression=compression).load()
+
+    s = UdbWalStorage('ignore.test', True, segment_size=1, compression=compression)
+
+    db = Udb(storage=s)
+
+    db.load_db()
+
+    assert [r['a'] for r in db.select()] == [0]
+    assert os.path.isfile('./ignore.test.wal.data.3' + ext) is False
+
+    db.insert({'a': 4})
+
+    assert [r['a'] for r in s.load()['data'].values()] == [0, 4]
+
+    s.drop()
+
+
+def test_should_not_create_with_unknown_codec():
+    with pytest.raises(ValueError):
+        UdbWalStorage('ignore.test', codec='unknown')
+
+
+def test_should_not_create_with_unknown_durability():
+    with pytest.raises(ValueError):
+        UdbWalStorage('ignore.test', durability='unknown')
+
+
 def test_should_drop():
     copyfile('tests/test_storage', '.', 'ignore.test.wal.data')
     copyfile('tests/test_storage', '.', 'ignore.test.wal.data.bak')
@@ -0,0 +1,78 @@
+import pytest
+
+from udb_py.common import *
+from udb_py.udb import Udb, UdbBitmapIndex, UdbBtreeBaseIndex, UdbBtreeIndex, UdbHashIndex
+
+
+class UdbBtreeIndexTest(UdbBtreeIndex):
+    def search_by_key_eq(self, key, items=False):
+        raise AssertionError('records must be counted by the index')
+
+    def search_by_key_range(self, *args, **kwargs):
+        raise AssertionError('records must be counted by the index')
+
+
+class UdbBitmapIndexTest(UdbBitmapIndex):
+    def search_by_key_eq(self, key):
+        raise AssertionError('records must be counted by the bitmaps')
+
+    def search_by_key_in(self, keys):
+        raise AssertionError('records must be counted by the bitmaps')
+
+
+def test_should_count_all():
+    udb = Udb()
+
+    udb.insert({'a': 1})
+    udb.insert({'a': 2})
+
+    assert udb.count() == 2
+
+
+def test_should_count_by_index():
+    udb = Udb({
+        'a': UdbBtreeIndexTest(['a']),
+        'b': UdbHashIndex(['b']),
+        'c': UdbBtreeBaseIndex(['c']),
+    })
+
+    for x in range(0, 100):
+        udb.insert({'a': x % 10, 'b': x % 5, 'c': x})
+
+    assert udb.count({'a': 1}) == 10
+    assert udb.count({'a': 11}) == 0
+    assert udb.count({'a': {'$gte': 5}}) == 50
+    assert udb.count({'a': {'$gt': 5, '$lt': 8}}) == 20
+    assert udb.count({'b': {'$in': [1, 2]}}) == 40
+    assert udb.count({'c': {'$gte': 90}}) == 10
+    assert udb.count({'c': {'$in': [1, 2, 200]}}) == 2
+
+
+def test_should_count_by_scan():
+    udb = Udb({
+        'a': UdbBtreeIndex(['a']),
+        'b': UdbHashIndex(['b']),
+    })
+
+    for x in range(0, 100):
+        udb.insert({'a': x % 10, 'b': x % 5, 'c': x})
+
+    assert udb.count({'a': 1, 'c': {'$lt': 50}}) == 5
+    assert udb.count({'a': 1, 'b': 1}) == 10
+    assert udb.count({'c': {'$gte': 10}}) == 90
+    assert udb.count({'c': {'$gte': 10}}) == len(list(udb.select({'c': {'$gte': 10}})))
+
+
+def test_should_count_by_bitmap_indexes():
+    udb = Udb({
+        'a': UdbBitmapIndexTest(['a']),
+        'b': UdbBitmapIndexTest(['b']),
+    })
+
+    for x in range(0, 100):
+        udb.insert({'a': x % 10, 'b': x % 4, 'c': x})
+
+    assert udb.count({'a': 1, 'b': 1}) == 5
+    assert udb.count({'a': {'$in': [1, 2]}, 'b': {'$ne': 1}}) == 15
+    assert udb.count({'a': {'$nin': [1, 2]}}) == 80
+    assert udb.count({'a': {'$nin': [1, 2]}, 'b': 0, 'c': {'$lt': 50}}) == 11
@@ -1,10 +1,10 @@
 import pytest
 
 from udb_py.udb import Udb
-from udb_py.udb_index import SCAN_OP_CONST, SCAN_OP_SEQ, SCAN_OP_SORT, SCAN_OP_SUB
+from udb_py.udb_index import SCAN_OP_AND, SCAN_OP_CONST, SCAN_OP_COVER, SCAN_OP_SEQ, SCAN_OP_SORT, SCAN_OP_SUB
 from udb_py.index.udb_base_linear_index import SCAN_OP_IN, SCAN_OP_PREFIX, SCAN_OP_PREFIX_IN, SCAN_OP_RANGE
 from udb_py.index.udb_base_geo_index import SCAN_OP_INTERSECTION, SCAN_OP_NEAR
-from udb_py.index import UdbBtreeBaseIndex
+from udb_py.index import UdbBtreeBaseIndex, UdbBtreeIndex, UdbHashIndex
 
 
 def test_should_plan_const_scan():
@@ -309,6 +309,94 @@ def test_should_plan_sub_scan():
     assert q == {'x': 1}
 
 
+def test_should_plan_reverse_range_scan_instead_of_sort():
+    i = Udb({
+        'a': UdbBtreeIndex(['a']),
+        'b': UdbHashIndex(['b']),
+    })
+
+    q = {'a': {'$gte': 1}}
+    plan = i.get_q_cursor(q, sort='-a', limit=5, get_plan=True)
+
+    assert len(plan) == 2
+    assert plan[0][1] == SCAN_OP_RANGE
+    assert plan[1][1] == SCAN_OP_SUB
+
+    q = {'b': 1}
+    plan = i.get_q_cursor(q, sort='-b', get_plan=True)
+
+    assert len(plan) == 2
+    assert plan[0][1] == SCAN_OP_CONST
+    assert plan[1][1] == SCAN_OP_SORT
+
+
+def test_should_plan_cover_scan():
+    i = Udb({
+        'ab': UdbBtreeIndex(['a', 'b']),
+    })
+
+    plan = i.get_q_cursor({'a': {'$gte': 1}}, fields=['a', 'b'], get_plan=True)
+
+    assert len(plan) == 2
+    assert plan[0][1] == SCAN_OP_RANGE
+    assert plan[1][0] == i.indexes['ab']
+    assert plan[1][1] == SCAN_OP_COVER
+    assert plan[1][4] == ['a', 'b']
+
+    plan = i.get_q_cursor({'a': {'$gte': 1}}, fields=['a', 'c'], get_plan=True)
+
+    assert len(plan) == 1
+
+    plan = i.get_q_cursor({'a': {'$gte': 1}, 'c': 1}, fields=['a', 'b'], get_plan=True)
+
+    assert len(plan) == 2
+    assert plan[1][1] == SCAN_OP_SEQ
+
+
+def test_should_plan_sort_before_sub_scan():
+    i = Udb({
+        'a': UdbBtreeBaseIndex(['a']),
+    })
+
+    q = {'x': 1}
+    plan = i.get_q_cursor(q, limit=3, offset=2, sort='-b', get_plan=True)
+
+    assert len(plan) == 3
+    assert plan[0][1] == SCAN_OP_SEQ
+    assert plan[1][1] == SCAN_OP_SORT
+    assert plan[1][4] == 'b'
+    assert plan[1][5] is False
+    assert plan[2][1] == SCAN_OP_SUB
+    assert plan[2][4] == 3
+    assert plan[2][5] == 2
+
+
+def test_should_plan_sort_stage_on_sort_key_not_scanned_by_index():
+    i = Udb({
+        'ab': UdbBtreeIndex(['a', 'b']),
+    })
+
+    for x in range(0, 20):
+        i.insert({'a': x % 4, 'b': x})
+
+    for sort in ('b', '-b'):
+        q = {'a': {'$gte': 1}}
+        plan = i.get_q_cursor(q, sort=sort, get_plan=True)
+
+        assert plan[0][1] == SCAN_OP_RANGE
+        assert plan[-1][1] == SCAN_OP_SORT
+
+    assert [r['b'] for r in i.select({'a': {'$gte': 2}}, sort='-b', limit=3)] == [19, 18, 15]
+    assert [r['b'] for r in i.select({'a': {'$in': [3, 1]}}, sort='a', limit=3)] == [1, 5, 9]
+
+    q = {'a': 1, 'b': {'$lt': 10}}
+    plan = i.get_q_cursor(q, sort='-b', get_plan=True)
+
+    assert len(plan) == 1
+    assert plan[0][1] == SCAN_OP_RANGE
+    assert [r['b'] for r in i.select({'a': 1, 'b': {'$lt': 10}}, sort='-b')] == [9, 5, 1]
+
+
 def test_should_not_plan_sub_scan_on_const_not_multivalued_coverage():
     i = Udb({
         'a': UdbBtreeBaseIndex(['a']),
@@ -336,3 +424,187 @@ def test_should_not_plan_any_scan_on_const_not_multivalued_coverage_with_transce
 
     assert len(plan) == 0
     assert q == {'a': 1}
+
+
+def test_should_plan_cheapest_scan_by_estimate():
+    i = Udb({
+        'a': UdbHashIndex(['a']),
+        'b': UdbBtreeIndex(['b']),
+    })
+
+    for x in range(0, 100):
+        i.insert({'a': 1, 'b': x})
+
+    q = {'a': 1, 'b': {'$gte': 95}}
+    plan = i.get_q_cursor(q, get_plan=True)
+
+    assert plan[0][0] == i.indexes['b']
+    assert plan[0][1] == SCAN_OP_RANGE
+    assert plan[0][4] < 100
+    assert q == {'a': 1}
+
+    q = {'a': 1, 'b': {'$gte': 0}}
+    plan = i.get_q_cursor(q, get_plan=True)
+
+    assert plan[0][0] == i.indexes['a']
+    assert plan[0][1] == SCAN_OP_CONST
+    assert plan[0][4] == 100
+    assert q == {}
+
+
+def test_should_plan_intersection_scan():
+    i = Udb({
+        'a': UdbHashIndex(['a']),
+        'b': UdbHashIndex(['b']),
+    })
+
+    for x in range(0, 100):
+        i.insert({'a': x % 10, 'b': x % 5})
+
+    q = {'a': 1, 'b': 1, 'c': 1}
+    plan = i.get_q_cursor(q, get_plan=True)
+
+    assert len(plan) == 3  # const, and, seq
+    assert plan[0][0] == i.indexes['a']
+    assert plan[0][1] == SCAN_OP_CONST
+    assert plan[0][4] == 10
+    assert plan[1][0] == i.indexes['b']
+    assert plan[1][1] == SCAN_OP_AND
+    assert plan[1][4] == 20
+    assert plan[1][5] == SCAN_OP_CONST
+    assert plan[2][1] == SCAN_OP_SEQ
+    assert q == {'c': 1}
+
+
+def test_should_not_plan_intersection_scan_on_large_record_set():
+    i = Udb({
+        'a': UdbHashIndex(['a']),
+        'b': UdbHashIndex(['b']),
+    })
+
+    for x in range(0, 100):
+        i.insert({'a': x, 'b': x % 2})
+
+    q = {'a': 1, 'b': 1}
+    plan = i.get_q_cursor(q, get_plan=True)
+
+    assert len(plan) == 2  # const, seq
+    assert plan[0][0] == i.indexes['a']
+    assert plan[1][1] == SCAN_OP_SEQ
+    assert q == {'b': 1}
+
+
+def test_should_not_plan_intersection_scan_on_op_not_searchable_by_index():
+    i = Udb({
+        'a': UdbBtreeIndex(['a']),
+        'c': UdbHashIndex(['c']),
+    })
+
+    for x in range(0, 100):
+        i.insert({'a': x % 10, 'c': 'q' if x < 5 else 'p'})
+
+    q = {'a': {'$in': [1]}, 'c': {'$ne': 'p'}}
+    plan = i.get_q_cursor(q, get_plan=True)
+
+    assert len(plan) == 2  # in, seq
+    assert plan[0][0] == i.indexes['a']
+    assert plan[1][1] == SCAN_OP_SEQ
+    assert list(i.select({'a': {'$in': [1]}, 'c': {'$ne': 'p'}})) == [{'a': 1, 'c': 'q', '__rev__': 1}]
+
+
+def test_should_cache_plan_by_q_shape():
+    i = Udb({
+        'a': UdbHashIndex(['a']),
+        'b': UdbBtreeIndex(['b']),
+        'c': UdbBtreeIndex(['c']),
+    })
+
+    for x in range(0, 100):
+        i.insert({'a': 1, 'b': x, 'c': x})
+
+    plan = i.get_q_cursor({'a': 1, 'b': {'$gte': 95}}, get_plan=True)
+
+    assert plan[0][0] == i.indexes['b']
+    assert len(i._plan_cache) == 1
+    assert list(i._plan_cache.values())[0] == (i.indexes['a'], i.indexes['b'])
+
+    plan = i.get_q_cursor({'a': 1, 'b': {'$gte': 0}}, get_plan=True)
+
+    assert plan[0][0] == i.indexes['a']
+    assert len(i._plan_cache) == 1
+
+    assert [r['b'] for r in i.select({'a': 1, 'b': {'$gte': 98}})] == [98, 99]
+    assert len(i._plan_cache) == 1
+
+
+def test_should_cache_plan_by_like_pattern_shape():
+    i = Udb({
+        'a': UdbBtreeIndex(['a']),
+    })
+
+    i.insert({'a': 'abc'})
+    i.insert({'a': 'bcd'})
+
+    plan = i.get_q_cursor({'a': {'$like': '%c'}}, get_plan=True)
+
+    assert plan[0][1] == SCAN_OP_SEQ
+
+    plan = i.get_q_cursor({'a': {'$like': 'a%'}}, get_plan=True)
+
+    assert plan[0][0] == i.indexes['a']
+    assert plan[0][1] == SCAN_OP_PREFIX
+    assert len(i._plan_cache) == 1
+
+
+def test_should_not_cache_plan_of_no_applicable_index():
+    i = Udb({
+        'a': UdbBtreeIndex(['a']),
+    })
+
+    plan = i.get_q_cursor({'b': 1}, get_plan=True)
+
+    assert plan[0][1] == SCAN_OP_SEQ
+    assert len(i._plan_cache) == 0
+
+
+def test_should_invalidate_plan_cache():
+    i = Udb({
+        'a': UdbBtreeIndex(['a']),
+    })
+
+    i.get_q_cursor({'a': 1}, get_plan=True)
+
+    assert len(i._plan_cache) == 1
+
+    Udb.register_index(UdbBtreeIndex)
+    i.get_q_cursor({'a': {'$gte': 1}}, get_plan=True)
+
+    assert len(i._plan_cache) == 1
+
+    i.get_q_cursor({'a': 2}, get_plan=True)
+
+    assert len(i._plan_cache) == 2
+
+    UdbBtreeIndex(['b']).append_key('c')
+    i.get_q_cursor({'a': {'$in': [1]}}, get_plan=True)
+
+    assert len(i._plan_cache) == 1
+
+
+def test_should_evict_plan_cache_lru():
+    i = Udb({
+        'a': UdbBtreeIndex(['a']),
+    }).set_plan_cache_size(2)
+
+    i.get_q_cursor({'a': 1}, get_plan=True)
+    i.get_q_cursor({'a': {'$gte': 1}}, get_plan=True)
+    i.get_q_cursor({'a': 1}, get_plan=True)
+    i.get_q_cursor({'a': {'$in': [1]}}, get_plan=True)
+
+    assert len(i._plan_cache) == 2
+    assert list(i._plan_cache.keys())[0][1] == (('a', False),)
+
+    i.set_plan_cache_size(0)
+    i.get_q_cursor({'a': 1}, get_plan=True)
+
+    assert len(i._plan_cache) == 0
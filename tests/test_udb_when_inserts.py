@@ -1,7 +1,7 @@
 import pytest
 
 from udb_py.common import auto_id, current_timestamp, ConstraintError
-from udb_py.udb import Udb, UdbBtreeBaseIndex, UdbBtreeUniqBaseIndex
+from udb_py.udb import Udb, UdbBtreeBaseIndex, UdbBtreeIndex, UdbBtreeUniqBaseIndex, UdbHashIndex
 
 
 def test_should_insert():
@@ -98,3 +98,44 @@ def test_should_raise_conflict_error_on_uniq_index():
         udb.insert({'a': 2})
 
     assert isinstance(excinfo.value, ConstraintError) is True
+
+
+def test_should_insert_many():
+    udb = Udb({
+        'a': UdbBtreeBaseIndex(['a']),
+        'b': UdbBtreeIndex(['b']),
+        'c': UdbHashIndex(['c']),
+        'd': UdbBtreeUniqBaseIndex(['d']),
+    }, schema={'c': 0})
+
+    inserted = []
+
+    udb.add_on_insert(lambda rid, values: inserted.append(rid))
+
+    assert udb.insert_many(({'a': x % 3, 'b': x % 2, 'd': x} for x in range(0, 10)), batch_size=4) == 10
+    assert inserted == list(range(0, 10))
+    assert udb.revision == 10
+    assert list(udb.select({'d': 3})) == [{'a': 0, 'b': 1, 'c': 0, 'd': 3, '__rev__': 3}]
+    assert [r['__rev__'] for r in udb.select({'a': 1})] == [1]  # the first record of the single valued index key
+    assert sorted(r['__rev__'] for r in udb.select({'b': 1})) == [1, 3, 5, 7, 9]
+    assert len(list(udb.select({'c': 0}))) == 10
+    assert len(udb.indexes['a']) == 3
+    assert len(udb.indexes['b']) == 2
+    assert len(udb.indexes['d']) == 10
+
+
+def test_should_raise_conflict_error_on_insert_many():
+    udb = Udb({
+        'a': UdbBtreeUniqBaseIndex(['a']),
+    })
+
+    udb.insert({'a': 1})
+
+    with pytest.raises(ConstraintError):
+        udb.insert_many([{'a': 2}, {'a': 1}])
+
+    with pytest.raises(ConstraintError):
+        udb.insert_many([{'a': 2}, {'a': 2}])
+
+    assert list(udb.select()) == [{'a': 1, '__rev__': 0}]
+    assert udb.revision == 1
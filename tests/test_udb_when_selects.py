@@ -1,7 +1,15 @@
 import pytest
 
 from udb_py.common import *
-from udb_py.udb import Udb, UdbBtreeBaseIndex, UdbBtreeIndex
+from udb_py.udb import (
+    Udb,
+    UdbBitmapIndex,
+    UdbBtreeBaseIndex,
+    UdbBtreeIndex,
+    UdbBtreeIntBaseIndex,
+    UdbBtreeIntIndex,
+    UdbHashIndex,
+)
 
 
 def test_should_select_by_full_covered_query():
@@ -434,6 +442,26 @@ def test_should_select_using_btree_index_by_range():
     ]
 
 
+def test_should_select_using_index_intersection():
+    udb = Udb(indexes={'a': UdbHashIndex(['a']), 'b': UdbBtreeIndex(['b'])})
+
+    for x in range(0, 20):
+        udb.insert({'a': x % 2, 'b': x % 4, 'c': x})
+
+    assert list(udb.select({'a': 1, 'b': {'$in': [1, 2]}})) == [
+        {'__rev__': 1, 'a': 1, 'b': 1, 'c': 1},
+        {'__rev__': 5, 'a': 1, 'b': 1, 'c': 5},
+        {'__rev__': 9, 'a': 1, 'b': 1, 'c': 9},
+        {'__rev__': 13, 'a': 1, 'b': 1, 'c': 13},
+        {'__rev__': 17, 'a': 1, 'b': 1, 'c': 17},
+    ]
+    assert list(udb.select({'a': 1, 'b': {'$gte': 2}, 'c': {'$lt': 10}})) == [
+        {'__rev__': 3, 'a': 1, 'b': 3, 'c': 3},
+        {'__rev__': 7, 'a': 1, 'b': 3, 'c': 7},
+    ]
+    assert list(udb.select({'a': 0, 'b': 1})) == []
+
+
 def test_should_select_using_sort():
     udb = Udb()
 
@@ -478,6 +506,206 @@ def test_should_select_using_reverse_sort():
     assert records == [a, c, e, f, d, b]
 
 
+def test_should_select_using_sort_before_limit_and_offset():
+    udb = Udb()
+
+    a = {'a': 6, '__rev__': 0}
+    b = {'a': 1, '__rev__': 1}
+    c = {'a': 5, '__rev__': 2}
+    d = {'a': 2, '__rev__': 3}
+    e = {'a': 4, '__rev__': 4}
+    f = {'a': 3, '__rev__': 5}
+
+    udb.insert(a)
+    udb.insert(b)
+    udb.insert(c)
+    udb.insert(d)
+    udb.insert(e)
+    udb.insert(f)
+
+    assert list(udb.select(sort='a', limit=2)) == [b, d]
+    assert list(udb.select(sort='a', limit=2, offset=1)) == [d, f]
+    assert list(udb.select(sort='-a', limit=3)) == [a, c, e]
+    assert list(udb.select(sort='-a', offset=4)) == [d, b]
+    assert list(udb.select({'a': {'$gte': 2}}, sort='-a', limit=1, offset=1)) == [c]
+
+
+def test_should_select_using_reverse_sort_by_index():
+    udb = Udb({
+        'a': UdbBtreeIndex(['a']),
+    })
+
+    for x in range(0, 100):
+        udb.insert({'a': x % 50, 'b': x})
+
+    records = list(udb.select({'a': {'$gte': 10}}, sort='-a', limit=5))
+
+    assert [r['a'] for r in records] == [49, 49, 48, 48, 47]
+
+
+def test_should_select_fields_covered_by_index():
+    udb = Udb({
+        'ab': UdbBtreeIndex(['a', 'b']),
+    })
+
+    udb.insert({'a': 1, 'b': 'x', 'c': 1})
+    udb.insert({'a': 2, 'b': 'y', 'c': 2})
+    udb.insert({'a': 3, 'c': 3})
+    udb.insert({'a': 4, 'b': None, 'c': 4})
+
+    udb.collection.clear()  # assures records are not fetched
+
+    assert list(udb.select({'a': {'$gte': 2}}, fields=['a', 'b'])) == [
+        {'a': 2, 'b': 'y'},
+        {'a': 3},
+        {'a': 4, 'b': None},
+    ]
+    assert list(udb.select({'a': {'$gte': 2}}, sort='-a', limit=2, fields=['b', 'a'])) == [
+        {'a': 4, 'b': None},
+        {'a': 3},
+    ]
+
+
+@pytest.mark.parametrize('index_class', [UdbBtreeIndex, UdbHashIndex])
+def test_should_select_using_index_of_binary_keys(index_class):
+    udb = Udb({'ab': index_class(['a', 'b']).set_binary_keys()})
+
+    for x in range(0, 20):
+        udb.insert({'a': x % 4 - 2, 'b': ('b0', 'b1', 'b2')[x % 3], 'c': x})
+
+    for q, fn in (
+        ({'a': -1, 'b': 'b1'}, lambda r: r['a'] == -1 and r['b'] == 'b1'),
+        ({'a': {'$in': [-2, 1]}, 'b': 'b2'}, lambda r: r['a'] in (-2, 1) and r['b'] == 'b2'),
+        ({'a': 0}, lambda r: r['a'] == 0),
+        ({'a': {'$in': [-1]}}, lambda r: r['a'] == -1),
+        ({'a': {'$gte': -1, '$lt': 1}}, lambda r: -1 <= r['a'] < 1),
+        ({'a': 1, 'b': {'$like': 'b%'}}, lambda r: r['a'] == 1),
+        ({'a': 1, 'b': {'$gt': 'b0'}}, lambda r: r['a'] == 1 and r['b'] > 'b0'),
+    ):
+        assert sorted(r['c'] for r in udb.select(q)) == [r['c'] for r in udb.collection.values() if fn(r)]
+
+    if index_class is UdbBtreeIndex:
+        assert [r['a'] for r in udb.select({'a': {'$gte': -1}}, sort='-a', limit=3)] == [1, 1, 1]
+        assert list(udb.select({'a': 1, 'b': 'b0'}, fields=['a', 'b'])) == [{'a': 1, 'b': 'b0'}] * 2
+
+
+@pytest.mark.parametrize('index_class', [UdbBtreeIndex, UdbHashIndex])
+def test_should_select_using_index_of_tuple_keys(index_class):
+    udb = Udb({'ab': index_class(['a', 'b']).set_tuple_keys()})
+
+    for x in range(0, 20):
+        udb.insert({'a': (x % 4 - 2, True, 0.5, 'a')[x % 4], 'b': ('b0', 'b1', 'b2')[x % 3], 'c': x})
+
+    for q, fn in (
+        ({'a': 1, 'b': 'b1'}, lambda r: r['a'] == 1 and type(r['a']) is int and r['b'] == 'b1'),
+        ({'a': True, 'b': 'b1'}, lambda r: r['a'] is True and r['b'] == 'b1'),
+        ({'a': {'$in': [-2, 0.5]}, 'b': 'b2'}, lambda r: r['a'] in (-2, 0.5) and r['b'] == 'b2'),
+        ({'a': 'a'}, lambda r: r['a'] == 'a'),
+        ({'a': {'$in': [0.5]}}, lambda r: r['a'] == 0.5),
+        ({'a': {'$gte': -2, '$lt': 1}}, lambda r: type(r['a']) is not bool and r['a'] in (-2, 0.5)),
+        ({'a': -2, 'b': {'$like': 'b%'}}, lambda r: r['a'] == -2),
+        ({'a': -2, 'b': {'$gt': 'b0'}}, lambda r: r['a'] == -2 and r['b'] > 'b0'),
+    ):
+        assert sorted(r['c'] for r in udb.select(q)) == [r['c'] for r in udb.collection.values() if fn(r)]
+
+    if index_class is UdbBtreeIndex:
+        assert [r['a'] for r in udb.select({'a': {'$gte': -2, '$lt': 1}}, sort='-a', limit=3)] == [0.5] * 3
+        assert list(udb.select({'a': 'a', 'b': 'b0'}, fields=['a', 'b'])) == [{'a': 'a', 'b': 'b0'}] * 2
+
+
+@pytest.mark.parametrize('index_class', [UdbBtreeIntIndex, UdbBtreeIntBaseIndex])
+def test_should_select_using_int_index(index_class):
+    udb = Udb({'a': index_class(['a'])})
+
+    for x in range(0, 20):
+        udb.insert({'a': x if index_class is UdbBtreeIntBaseIndex else x % 7 - 3, 'c': x})
+
+    for q, fn in (
+        ({'a': 1}, lambda r: r['a'] == 1),
+        ({'a': {'$in': [-2, 3]}}, lambda r: r['a'] in (-2, 3)),
+        ({'a': {'$nin': [-2, 3]}}, lambda r: r['a'] not in (-2, 3)),
+        ({'a': {'$ne': 2}}, lambda r: r['a'] != 2),
+        ({'a': {'$gte': -1, '$lt': 2}}, lambda r: -1 <= r['a'] < 2),
+        ({'a': {'$gt': 2}}, lambda r: r['a'] > 2),
+        ({'a': {'$lte': 2}, 'c': {'$gte': 10}}, lambda r: r['a'] <= 2 and r['c'] >= 10),
+    ):
+        assert sorted(r['c'] for r in udb.select(q)) == [r['c'] for r in udb.collection.values() if fn(r)]
+
+    assert [r['a'] for r in udb.select({'a': {'$lt': 3}}, sort='-a', limit=2)] == [2, 2 if index_class is UdbBtreeIntIndex else 1]
+    assert list(udb.select({'a': 2}, fields=['a'])) == [{'a': 2}] * (3 if index_class is UdbBtreeIntIndex else 1)
+
+
+
+@pytest.mark.parametrize('index_class', [UdbBtreeIntIndex, UdbBtreeIntBaseIndex])
+def test_should_select_using_int_index_on_non_int_condition(index_class):
+    udb = Udb({'ts': index_class(['ts'])})
+    udb_seq = Udb()
+
+    for x in range(0, 5):
+        udb.insert({'ts': x})
+        udb_seq.insert({'ts': x})
+
+    for q in (
+        lambda: {'ts': 'x'},
+        lambda: {'ts': None},
+        lambda: {'ts': True},
+        lambda: {'ts': {'$gte': 1.5}},
+        lambda: {'ts': {'$gt': 'a'}},
+        lambda: {'ts': {'$in': [1, 'a']}},
+    ):
+        assert list(udb.select(q())) == list(udb_seq.select(q()))
+
+    assert [r['ts'] for r in udb.select({'ts': {'$gte': 1.5}})] == [2, 3, 4]
+    assert [r['ts'] for r in udb.select({'ts': {'$in': [1, 'a']}})] == [1]
+
+
+def test_should_select_using_bitmap_indexes():
+    udb = Udb({
+        'a': UdbBitmapIndex(['a']),
+        'b': UdbBitmapIndex(['b']),
+    })
+
+    for x in range(0, 100):
+        udb.insert({'a': (None, True, 'a', 1)[x % 4], 'b': x % 3, 'c': x})
+
+    for q, fn in (
+        ({'a': 'a', 'b': 1}, lambda r: r['a'] == 'a' and r['b'] == 1),
+        ({'a': {'$in': [None, 1]}, 'b': {'$ne': 1}}, lambda r: (r['a'] is None or type(r['a']) is int) and r['b'] != 1),
+        ({'a': {'$nin': [True]}, 'b': {'$in': [0, 2]}}, lambda r: r['a'] is not True and r['b'] in (0, 2)),
+        ({'a': {'$nin': ['a', 1]}, 'c': {'$lt': 50}}, lambda r: (r['a'] is None or r['a'] is True) and r['c'] < 50),
+    ):
+        assert [r['c'] for r in udb.select(q)] == [r['c'] for r in udb.collection.values() if fn(r)]
+
+    assert [p[1] for p in udb.select({'a': 1, 'b': 2}, get_plan=True)] == ['const', 'and']
+
+
+def test_should_select_using_bitmap_indexes_skipping_missing_fields():
+    udb = Udb({'c': UdbBitmapIndex(['c'])})
+    udb_seq = Udb()
+
+    for values in ({'c': 'p'}, {'a': 1}, {'c': 'q'}):
+        udb.insert(dict(values))
+        udb_seq.insert(dict(values))
+
+    for get_q in (lambda: {'c': {'$ne': 'q'}}, lambda: {'c': {'$nin': ['q']}}):
+        assert list(udb.select(get_q())) == list(udb_seq.select(get_q())) == [{'c': 'p', '__rev__': 0}]
+        assert udb.count(get_q()) == 1
+
+
+def test_should_select_fields_not_covered_by_index():
+    udb = Udb({
+        'ab': UdbBtreeIndex(['a', 'b']),
+        'ba': UdbBtreeIndex(['b', 'a']),
+    })
+
+    udb.insert({'a': 1, 'b': 'x', 'c': 1})
+    udb.insert({'a': 2, 'b': 'y', 'c': 2})
+
+    assert list(udb.select({'a': 1}, fields=['a', 'c'])) == [{'a': 1, 'c': 1}]
+    assert list(udb.select({'b': 'y'}, fields=['a', 'b'])) == [{'a': 2, 'b': 'y'}]
+    assert list(udb.select(fields=['c'], sort='-c')) == [{'c': 2}, {'c': 1}]
+
+
 def test_should_use_copy_on_select():
     udb = Udb().set_copy_on_select()
 
@@ -1,7 +1,16 @@
 import pytest
 
 from udb_py.common import *
-from udb_py.udb import Udb, UdbBtreeBaseIndex, UdbBtreeUniqBaseIndex
+from udb_py.udb import (
+    Udb,
+    UdbBitmapIndex,
+    UdbBtreeBaseIndex,
+    UdbBtreeEmbeddedIndex,
+    UdbBtreeIndex,
+    UdbBtreeUniqBaseIndex,
+    UdbHashEmbeddedIndex,
+    UdbHashIndex,
+)
 
 
 def test_should_update_all():
@@ -64,6 +73,34 @@ def test_should_update_by_query():
     assert len(udb.indexes['b']) == 3
 
 
+@pytest.mark.parametrize('index', [UdbBitmapIndex, UdbBtreeIndex, UdbHashIndex])
+def test_should_update_by_query_on_multivalued_index_key(index):
+    udb = Udb({'a': index(['a'])})
+
+    udb.insert_many({'a': 2, 'b': i} for i in range(6))
+
+    update_count = udb.update({'a': 5}, {'a': 2})
+
+    assert update_count == 6
+    assert [r['b'] for r in udb.select({'a': 5})] == [0, 1, 2, 3, 4, 5]
+    assert list(udb.select({'a': 2})) == []
+
+
+@pytest.mark.parametrize('index', [UdbBtreeEmbeddedIndex, UdbHashEmbeddedIndex])
+def test_should_update_by_query_on_embedded_index_key(index):
+    udb = Udb({'a': index(['a'])})
+
+    udb.insert_many({'a': [1, 2], 'b': i} for i in range(3))
+
+    update_count = udb.update({'a': [3]}, {'b': 1})
+
+    assert update_count == 1
+    assert [r['b'] for r in udb.select({'a': 1})] == [0, 2]
+    assert [r['b'] for r in udb.select({'a': 2})] == [0, 2]
+    assert [r['b'] for r in udb.select({'a': 3})] == [1]
+    assert udb.indexes['a']._stats_count == 5
+
+
 def test_should_raise_conflict_error_on_uniq_index():
     udb = Udb({
         'a': UdbBtreeUniqBaseIndex(['a']),
@@ -12,9 +12,13 @@ from .common import (
     REQUIRED,
 )
 from .index import (
+    UdbBitmap,
+    UdbBitmapIndex,
     UdbBtreeBaseIndex,
     UdbBtreeIndex,
     UdbBtreeEmbeddedIndex,
+    UdbBtreeIntBaseIndex,
+    UdbBtreeIntIndex,
     UdbBtreeUniqBaseIndex,
     UdbHashBaseIndex,
     UdbHashIndex,
@@ -23,7 +27,7 @@ from .index import (
     UdbRtreeIndex,
     UdbTextIndex,
 )
-from .storage import UdbJsonFileStorage, UdbWalStorage
+from .storage import UdbJsonFileStorage, UdbJsonLinesFileStorage, UdbWalStorage
 from .udb import Udb
 from .udb_index import UdbIndex
 from .udb_storage import UdbStorage
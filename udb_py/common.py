@@ -1,9 +1,12 @@
+import contextlib
 import datetime
+import gc
+import heapq
 import sys
 import time
 import uuid
 
-from struct import pack
+from struct import pack, unpack
 
 
 CHAR255 = chr(255)
@@ -64,6 +67,21 @@ def fn(func):
     return lambda key, record: func(record)
 
 
+@contextlib.contextmanager
+def gc_disabled():
+    """
+    Disables gc within the context, gc passes over the bulk allocated long living objects are useless.
+    """
+    gc_is_enabled = gc.isenabled()
+    gc.disable()
+
+    try:
+        yield
+    finally:
+        if gc_is_enabled:
+            gc.enable()
+
+
 def _now():
     return datetime.datetime.now()
 
@@ -147,14 +165,81 @@ TYPE_FORMAT_MAPPERS = {
 }
 TYPE_INFL = chr(0)
 TYPE_INFR = chr(255)
+# same layout as bytes, the str value is utf-8 encoded keeping the order of the code points
+TYPE_FORMAT_MAPPERS_BINARY = {
+    Empty: lambda x: b'\x00',
+    InfL: lambda x: b'\x00',
+    bool: lambda x: b'\x02\x01' if x else b'\x02\x00',
+    int: lambda x: (b'\x03\x00' if x < 0 else b'\x03\x01') + pack('>q', x),
+    float: None,
+    type(None): lambda x: b'\x01',
+    str: lambda x: b'\x04' + x.encode('utf-8'),
+    InfR: lambda x: b'\xff',
+}
+TYPE_INFL_BINARY = b'\x00'
+TYPE_INFR_BINARY = b'\xff'
+# every value is preceded by the type tag, so the values of the different types are never compared and the numbers are
+# compared natively
+TYPE_FORMAT_MAPPERS_TUPLE = {
+    Empty: lambda x: (0,),
+    InfL: lambda x: (0,),
+    bool: lambda x: (2, x),
+    int: lambda x: (3, x),
+    float: lambda x: (3, x),
+    type(None): lambda x: (1,),
+    str: lambda x: (4, x),
+    InfR: lambda x: (255,),
+}
+TYPE_INFL_TUPLE = (0,)
+TYPE_INFR_TUPLE = (255,)
+# the unordered values are kept as is, only the bool is replaced to be distinct from the int
+TYPE_FORMAT_MAPPERS_TUPLE_HASH = {
+    Empty: lambda x: (b'',),
+    InfL: lambda x: (b'',),
+    bool: lambda x: (b'\x01',) if x else (b'\x00',),
+    int: lambda x: (x,),
+    float: lambda x: (x,),
+    type(None): lambda x: (None,),
+    str: lambda x: (x,),
+    InfR: lambda x: (b'\xff',),
+}
+TYPE_INFL_TUPLE_HASH = (b'',)
+TYPE_INFR_TUPLE_HASH = (b'\xff',)
+# the native 64-bit ints of the single int field indexes, the bounds are the ends of the keys range
+TYPE_INFL_INT = -(1 << 63)
+TYPE_INFR_INT = (1 << 63) - 1
+TYPE_FORMAT_MAPPERS_INT = {
+    Empty: lambda x: TYPE_INFL_INT,
+    InfL: lambda x: TYPE_INFL_INT,
+    int: lambda x: x,
+    InfR: lambda x: TYPE_INFR_INT,
+}
 
 
-def sort_key_iter(key, iterable, reverse=False, type_format_mappers=TYPE_FORMAT_MAPPERS):
-    return iter(sorted(
-        iterable,
-        key=lambda record: type_format_mappers.get(type(record.get(key, None)), type_format_mappers[type(None)])(record.get(key, None)),
-        reverse=reverse,
-    ))
+def sort_key_iter(key, iterable, reverse=False, type_format_mappers=TYPE_FORMAT_MAPPERS, limit=None):
+    """
+    Sorts the records by the key, only the top "limit" records are kept on the heap in case of the limit is provided.
+
+    :param key:
+    :param iterable:
+    :param reverse:
+    :param type_format_mappers:
+    :param limit:
+
+    :return:
+    """
+    type_format_mapper_none = type_format_mappers[type(None)]
+    type_format_mapper_get = type_format_mappers.get
+
+    def sort_key(record):
+        value = record.get(key, None)
+
+        return type_format_mapper_get(type(value), type_format_mapper_none)(value)
+
+    if limit is not None:
+        return iter((heapq.nlargest if reverse else heapq.nsmallest)(limit, iterable, key=sort_key))
+
+    return iter(sorted(iterable, key=sort_key, reverse=reverse))
 
 
 def sort_iter(iterable, reverse=False, type_format_mappers=TYPE_FORMAT_MAPPERS):
@@ -170,10 +255,125 @@ def type_formatter_iter(iterable):
         yield TYPE_FORMAT_MAPPERS[type(val)](val)
 
 
-def configure_float_precision(precision=18):
+def type_parser_iter(formatted):
+    """
+    Parses the sequence of the values formatted by the default or the binary type format mappers, the missing value
+    is parsed as EMPTY. The formatted string value is not terminated, so it consumes the rest of the sequence.
+
+    :param formatted:
+
+    :return:
+    """
+    if type(formatted) == bytes:
+        yield from _binary_type_parser_iter(formatted)
+
+        return
+
+    if type(formatted) == tuple:
+        yield from tuple_parser_iter(formatted)
+
+        return
+
+    pos = 0
+    length = len(formatted)
+
+    while pos < length:
+        tag = formatted[pos]
+
+        if tag == '\x03':
+            yield unpack('>q', formatted[pos + 2:pos + 10].encode('latin'))[0]
+
+            pos += 10
+        elif tag == '\x04':
+            yield formatted[pos + 1:]
+
+            return
+        elif tag == '\x02':
+            yield formatted[pos + 1] == '\x01'
+
+            pos += 2
+        elif tag == '\x01':
+            yield None
+
+            pos += 1
+        else:
+            yield EMPTY
+
+            pos += 1
+
+
+def _binary_type_parser_iter(formatted):
+    pos = 0
+    length = len(formatted)
+
+    while pos < length:
+        tag = formatted[pos]
+
+        if tag == 3:
+            yield unpack('>q', formatted[pos + 2:pos + 10])[0]
+
+            pos += 10
+        elif tag == 4:
+            yield formatted[pos + 1:].decode('utf-8')
+
+            return
+        elif tag == 2:
+            yield formatted[pos + 1] == 1
+
+            pos += 2
+        elif tag == 1:
+            yield None
+
+            pos += 1
+        else:
+            yield EMPTY
+
+            pos += 1
+
+
+def tuple_parser_iter(formatted, tagged=True):
+    """
+    Parses the sequence of the values formatted by the tuple or the tuple hash type format mappers, the missing value
+    is parsed as EMPTY.
+
+    :param formatted:
+    :param tagged: Formatted by the tuple type format mappers.
+
+    :return:
+    """
+    if not tagged:
+        for val in formatted:
+            if type(val) == bytes:
+                yield EMPTY if val == b'' else val == b'\x01'
+            else:
+                yield val
+
+        return
+
+    pos = 0
+    length = len(formatted)
+
+    while pos < length:
+        tag = formatted[pos]
+
+        if tag == 0:
+            yield EMPTY
+
+            pos += 1
+        elif tag == 1:
+            yield None
+
+            pos += 1
+        else:
+            yield formatted[pos + 1]
+
+            pos += 2
+
+
+def configure_float_precision(precision=18, binary=False):
     precision_multiplier = 10**precision
-    type_format_mapper_int = TYPE_FORMAT_MAPPERS[int]
-    type_format_mappers = dict(TYPE_FORMAT_MAPPERS)
+    type_format_mapper_int = (TYPE_FORMAT_MAPPERS_BINARY if binary else TYPE_FORMAT_MAPPERS)[int]
+    type_format_mappers = dict(TYPE_FORMAT_MAPPERS_BINARY if binary else TYPE_FORMAT_MAPPERS)
 
     def formatter(x):
         y = int(x)
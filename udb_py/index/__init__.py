@@ -1,8 +1,12 @@
 from .udb_base_linear_index import UdbBaseLinearIndex, UdbBaseLinearEmbeddedIndex
+from .udb_base_int_index import UdbBaseIntIndex
 from .udb_base_geo_index import UdbBaseGEOIndex
 from .udb_base_text_index import UdbBaseTextIndex
+from .udb_bitmap import UdbBitmap
+from .udb_bitmap_index import UdbBitmapIndex
 from .udb_btree_base_index import UdbBtreeBaseIndex, UdbBtreeEmbeddedBaseIndex
 from .udb_btree_index import UdbBtreeIndex, UdbBtreeEmbeddedIndex
+from .udb_btree_int_index import UdbBtreeIntBaseIndex, UdbBtreeIntIndex
 from .udb_btree_uniq_index import UdbBtreeUniqBaseIndex
 from .udb_hash_base_index import UdbHashBaseIndex, UdbHashEmbeddedBaseIndex
 from .udb_hash_index import UdbHashIndex, UdbHashEmbeddedIndex
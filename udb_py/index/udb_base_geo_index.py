@@ -308,7 +308,7 @@ class UdbBaseGEOIndex(UdbIndex):
                         1,
                         1,
                         3,
-                        lambda _: self.search_by_intersection(
+                        lambda _, by=self: by.search_by_intersection(
                             c_intersection['minX'],
                             c_intersection['minY'],
                             c_intersection['maxX'],
@@ -325,7 +325,7 @@ class UdbBaseGEOIndex(UdbIndex):
                         1,
                         1,
                         3,
-                        lambda _: self.search_by_near(
+                        lambda _, by=self: by.search_by_near(
                             c_near['x'],
                             c_near['y'],
                             c_near.get('minDistance'),
@@ -350,6 +350,18 @@ class UdbBaseGEOIndex(UdbIndex):
     def insert(self, key, uid):
         raise NotImplementedError
 
+    def count_by_intersection(self, p_x_min, p_y_min, p_x_max, p_y_max):
+        return None
+
+    def count_by_near(self, p_x, p_y, min_distance=None, max_distance=None, limit=None, collection=None):
+        return None
+
+    def estimate_by_intersection(self, p_x_min, p_y_min, p_x_max, p_y_max):
+        return None
+
+    def estimate_by_near(self, p_x, p_y, min_distance=None, max_distance=None, limit=None, collection=None):
+        return None
+
     def search_by_intersection(self, p_x_min, p_y_min, p_x_max, p_y_max):
         raise NotImplementedError
 
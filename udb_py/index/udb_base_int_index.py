@@ -0,0 +1,108 @@
+from ..common import (
+    EMPTY,
+    FieldRequiredError,
+    TYPE_FORMAT_MAPPERS_INT,
+    TYPE_INFL_INT,
+    TYPE_INFR_INT,
+)
+from .udb_base_linear_index import UdbBaseLinearIndex, SCAN_OP_SEQ
+
+
+class UdbBaseIntIndex(UdbBaseLinearIndex):
+    """
+    Base of the indexes over the single int field keyed by the native ints, the field is required.
+    """
+    is_prefixed = False
+    key_empty = 0
+    key_infl = TYPE_INFL_INT
+    key_infr = TYPE_INFR_INT
+    type_format_mappers = TYPE_FORMAT_MAPPERS_INT
+
+    def __init__(self, schema, name=None):
+        UdbBaseLinearIndex.__init__(self, schema, name)
+
+        if self.schema_last_index != 0:
+            raise ValueError('single int field schema expected on {}'.format(self.name))
+
+    def _get_value_error(self, val):
+        return ValueError('int64 value expected: {} on {}, got {!r}'.format(self.schema_keys[0], self.name, val))
+
+    def decode_cover_key(self, cover_key):
+        return {self.schema_keys[0]: cover_key}
+
+    def get_cover_key(self, record, second=None):
+        try:
+            cover_key = UdbBaseLinearIndex.get_cover_key(self, record, second)
+        except KeyError:
+            key = self.schema_keys[0]
+
+            raise self._get_value_error(second.get(key, record.get(key)) if second else record.get(key))
+
+        if cover_key is None:
+            raise FieldRequiredError('field required: {} on {}'.format(self.schema_keys[0], self.name))
+
+        if not TYPE_INFL_INT <= cover_key <= TYPE_INFR_INT:
+            raise self._get_value_error(cover_key)
+
+        return cover_key
+
+    def get_cover_keys(self, items):
+        items = list(items)
+
+        try:
+            pairs = UdbBaseLinearIndex.get_cover_keys(self, items)
+        except KeyError:
+            # the type format mappers cover only the ints, the first value of the other type is reported
+            key = self.schema_keys[0]
+
+            for uid, record in items:
+                val = record.get(key, EMPTY)
+
+                if val != EMPTY and type(val) is not int:
+                    raise self._get_value_error(val)
+
+            raise
+
+        for cover_key, uid in pairs:
+            if cover_key is None:
+                raise FieldRequiredError('field required: {} on {}'.format(self.schema_keys[0], self.name))
+
+            if not TYPE_INFL_INT <= cover_key <= TYPE_INFR_INT:
+                raise self._get_value_error(cover_key)
+
+        return pairs
+
+    def get_scan_op(self, q, limit=None, offset=None, collection=None):
+        condition = q.get(self.schema_keys[0], EMPTY)
+
+        # the keys are the native ints only, the condition of the other values is left to the sequential scan
+        if condition != EMPTY:
+            if type(condition) == dict:
+                for op, val in condition.items():
+                    if op == '$in' or op == '$nin':
+                        if any(type(x) is not int for x in val):
+                            return SCAN_OP_SEQ, 0, 0, 0, None, None
+                    elif op != '$fn' and type(val) is not int:
+                        return SCAN_OP_SEQ, 0, 0, 0, None, None
+            elif type(condition) is not int:
+                return SCAN_OP_SEQ, 0, 0, 0, None, None
+
+        return UdbBaseLinearIndex.get_scan_op(self, q, limit, offset, collection)
+
+    def is_covering(self, fields):
+        schema = self.schema
+
+        for field in fields:
+            if field not in schema or schema[field] != EMPTY:
+                return False
+
+        return True
+
+    def set_binary_keys(self, binary=True):
+        raise ValueError('binary keys are not supported by the int keyed index {}'.format(self.name))
+
+    def set_float_precision(self, precision=18):
+        raise ValueError('float precision is not supported by the int keyed index {}'.format(self.name))
+
+    def set_tuple_keys(self, tuple_keys=True):
+        raise ValueError('tuple keys are not supported by the int keyed index {}'.format(self.name))
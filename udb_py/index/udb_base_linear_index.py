@@ -1,13 +1,22 @@
 import collections
 import re
 
+from bisect import bisect_left, bisect_right
+
 from ..common import (
     FieldRequiredError,
     InvalidScanOperationValueError,
-    CHAR255,
     InfL,
     EMPTY,
     TYPE_COMPARATORS,
+    TYPE_FORMAT_MAPPERS_TUPLE,
+    TYPE_FORMAT_MAPPERS_TUPLE_HASH,
+    TYPE_INFL_TUPLE,
+    TYPE_INFL_TUPLE_HASH,
+    TYPE_INFR_TUPLE,
+    TYPE_INFR_TUPLE_HASH,
+    tuple_parser_iter,
+    type_parser_iter,
 )
 from ..udb_index import UdbIndex, SCAN_OP_CONST, SCAN_OP_SEQ
 
@@ -44,8 +53,13 @@ def _q_arr_range(q):
     q.pop('$gt', q.pop('$gte', q.pop('$lt', q.pop('$lte', EMPTY))))
 
 
+_COMPARABLE_TYPES = (bool, int, float, str)
+_CONDITION_CACHE = {}
+_CONDITION_CACHE_SIZE = 1024
 _LIKE_REGEX_CACHE = {}
 _LIKE_OP_ESCAPED_PERCENT = re.escape('%') == '\\%'
+_STATS_HISTOGRAM_BUCKETS = 64
+_STATS_HISTOGRAM_REBUILD_RATIO = 8
 _PRIMITIVE_VALS = (None, bool, float, int, str)
 
 
@@ -91,6 +105,10 @@ def _like_op(a, b):
     if type(a) != str:
         return False
 
+    return _get_like_regex(b).search(a) is not None
+
+
+def _get_like_regex(b):
     if b not in _LIKE_REGEX_CACHE:
         escaped_b = re.escape(b)
 
@@ -108,7 +126,7 @@ def _like_op(a, b):
             + '$'
         )
 
-    return _LIKE_REGEX_CACHE[b].search(a) is not None
+    return _LIKE_REGEX_CACHE[b]
 
 
 def _lt_op(a, b):
@@ -137,15 +155,103 @@ def _nin_op(a, values):
     return True  # return a not in b
 
 
+def _compile_condition(shape, ops):
+    """
+    Compiles the query shape into the factory of the specialized predicate.
+    The factory accepts the condition values in order of the shape and returns the predicate accepting the record.
+
+    :param shape: Tuple of (key, None) for the equality, (key, True) for the callable and (key, ((op key, type), ...))
+        for the dict condition
+    :param ops: Map of the op key to the op fn
+
+    :return: Factory of the predicate
+    """
+    namespace = {'EMPTY': EMPTY}
+    args = []
+    lines = []
+
+    for ind, (key, condition) in enumerate(shape):
+        if type(key) == str:
+            key_ref = repr(key)
+        else:
+            key_ref = 'k' + str(ind)
+            namespace[key_ref] = key
+
+        if condition is None:
+            arg = 'a' + str(len(args))
+            args.append(arg)
+            lines.append('if values.get({}, EMPTY) is not {}: return False'.format(key_ref, arg))
+        elif condition is True:
+            arg = 'a' + str(len(args))
+            args.append(arg)
+            lines.append('if not {}(values): return False'.format(arg))
+        else:
+            if any(op_key != '$fn' for op_key, _ in condition):
+                lines.append('val = values.get({}, EMPTY)'.format(key_ref))
+                lines.append('if val is EMPTY: return False')
+
+            for op_key, op_type in condition:
+                arg = 'a' + str(len(args))
+                args.append(arg)
+
+                if op_key == '$fn':
+                    lines.append('if not {}(values): return False'.format(arg))
+
+                    continue
+
+                op = ops[op_key]
+
+                if op is _eq_op:
+                    lines.append('if val is not {}: return False'.format(arg))
+                elif op is _ne_op:
+                    lines.append('if val is {}: return False'.format(arg))
+                elif op in (_gt_op, _gte_op, _lt_op, _lte_op) and op_type in _COMPARABLE_TYPES:
+                    namespace['t_' + arg] = op_type
+                    namespace['op_' + arg] = op
+                    lines.append('if not (val {} {} if type(val) is t_{} else op_{}(val, {})): return False'.format(
+                        {_gt_op: '>', _gte_op: '>=', _lt_op: '<', _lte_op: '<='}[op], arg, arg, arg, arg,
+                    ))
+                elif op is _in_op:
+                    lines.append('if id(val) not in {}: return False'.format(arg))
+                elif op is _nin_op:
+                    lines.append('if id(val) in {}: return False'.format(arg))
+                elif op is _like_op and op_type is str:
+                    lines.append('if type(val) is not str or {}.search(val) is None: return False'.format(arg))
+                else:
+                    namespace['op_' + arg] = op
+                    lines.append('if not op_{}(val, {}): return False'.format(arg, arg))
+
+    source = 'def factory(args):\n'
+
+    if args:
+        source += '    {}, = args\n'.format(', '.join(args))
+
+    source += '    def predicate(values):\n'
+    source += ''.join('        ' + line + '\n' for line in lines)
+    source += '        return True\n'
+    source += '    return predicate\n'
+
+    exec(compile(source, '<udb condition>', 'exec'), namespace)
+
+    return namespace['factory']
+
+
 class UdbBaseLinearIndex(UdbIndex):
+    intersecting_scan_ops = (SCAN_OP_CONST, SCAN_OP_IN)
     is_embedded = False
     is_multivalued = False
     is_prefixed = False
     is_ranged = False
     is_sorted_asc = False
+    is_sorted_desc = False
     is_sparse = False
     is_uniq = False
 
+    _stats_count = 0
+    _stats_histogram = None
+    _stats_histogram_depth = 1
+    _stats_modified = 0
+
     _OPS = {
         '$eq': _eq_op,
         '$gt': _gt_op,
@@ -160,6 +266,9 @@ class UdbBaseLinearIndex(UdbIndex):
 
     @classmethod
     def check_condition(cls, values, q, context=None, extend=None):
+        if context is not None and extend is None:
+            return context(values)
+
         for key, condition in q.items():
             val = values.get(key, EMPTY)
 
@@ -187,6 +296,59 @@ class UdbBaseLinearIndex(UdbIndex):
 
         return True
 
+    @classmethod
+    def create_condition_context(cls, q):
+        """
+        Creates the predicate compiled by the query shape (keys, ops and types of the condition values) and bound to the
+        condition values. The compiled predicates are cached by the query shape.
+
+        :param q: Query
+
+        :return: Predicate accepting the record
+        """
+        shape = []
+        args = []
+
+        for key, condition in q.items():
+            if condition and type(condition) == dict:
+                ops = []
+
+                for op_key, op_condition in condition.items():
+                    if op_key == '$fn':
+                        ops.append((op_key, None))
+                        args.append(op_condition)
+                    else:
+                        op = cls._OPS.get(op_key)
+
+                        if op:
+                            ops.append((op_key, type(op_condition)))
+
+                            if op is _in_op or op is _nin_op:
+                                args.append(frozenset(map(id, op_condition)))
+                            elif op is _like_op and type(op_condition) == str:
+                                args.append(_get_like_regex(op_condition))
+                            else:
+                                args.append(op_condition)
+
+                shape.append((key, tuple(ops)))
+            elif callable(condition):
+                shape.append((key, True))
+                args.append(condition)
+            else:
+                shape.append((key, None))
+                args.append(condition)
+
+        shape = (cls, tuple(shape))
+        factory = _CONDITION_CACHE.get(shape)
+
+        if factory is None:
+            if len(_CONDITION_CACHE) >= _CONDITION_CACHE_SIZE:
+                _CONDITION_CACHE.clear()
+
+            factory = _CONDITION_CACHE[shape] = _compile_condition(shape[1], cls._OPS)
+
+        return factory(args)
+
     @classmethod
     def merge_condition(cls, q1, q2, context=None, extend=None):
         for key, val in q2.items():
@@ -216,8 +378,10 @@ class UdbBaseLinearIndex(UdbIndex):
 
     @classmethod
     def seq(cls, seq, q, collection, schema=None):
+        check_condition = cls.create_condition_context(q)
+
         for rid in seq:
-            if cls.check_condition(collection[rid], q):
+            if check_condition(collection[rid]):
                 yield rid
 
     @classmethod
@@ -269,11 +433,34 @@ class UdbBaseLinearIndex(UdbIndex):
         self.schema_keys = list(schema.keys())
         self.schema_last_index = len(schema) - 1
 
+    def decode_cover_key(self, cover_key):
+        """
+        Decodes the cover key to the values of the schema keys, the missing values are omitted.
+
+        :param cover_key:
+
+        :return: dict or None if the cover key is ambiguous (string value is not the last one)
+        """
+        schema_keys = self.schema_keys
+        values = {}
+        ind = - 1
+
+        if self.is_tuple_keys:
+            parsed = tuple_parser_iter(cover_key, self.is_ranged)
+        else:
+            parsed = type_parser_iter(cover_key)
+
+        for ind, val in enumerate(parsed):
+            if val != EMPTY:
+                values[schema_keys[ind]] = val
+
+        return values if ind == self.schema_last_index else None
+
     def get_key(self, key, default=None):
         raise NotImplementedError
 
     def get_cover_key(self, record, second=None):
-        cover_key = ''
+        cover_key = self.key_empty
 
         for ind, key in enumerate(self.schema_keys):
             get = self.schema[key]
@@ -299,7 +486,7 @@ class UdbBaseLinearIndex(UdbIndex):
         return cover_key
 
     def get_cover_key_or_raise(self, record, second=None):
-        cover_key = ''
+        cover_key = self.key_empty
 
         for ind, key in enumerate(self.schema_keys):
             get = self.schema[key]
@@ -324,8 +511,77 @@ class UdbBaseLinearIndex(UdbIndex):
 
         return cover_key
 
+    def get_cover_keys(self, items):
+        """
+        Gets the (cover key, uid) pairs of the (uid, values) pairs, the schema is resolved once for the whole batch.
+
+        :param items:
+
+        :return:
+        """
+        if self.schema_default_values:
+            return UdbIndex.get_cover_keys(self, items)
+
+        schema = [(key, self.schema[key], callable(self.schema[key])) for key in self.schema_keys]
+
+        if self.is_tuple_keys and not self.is_ranged:
+            return self._get_hash_tuple_cover_keys(schema, items)
+
+        schema_first_key = schema[0][0]
+        type_format_mappers = self.type_format_mappers
+        type_format_mapper_infl = type_format_mappers[InfL](None)
+        key_empty = self.key_empty
+        pairs = []
+
+        for uid, record in items:
+            cover_key = key_empty
+
+            for key, get, get_is_callable in schema:
+                val = get(key, record) if get_is_callable else record.get(key, get)
+
+                if val == EMPTY:
+                    if key is schema_first_key:
+                        cover_key = None
+
+                        break
+
+                    cover_key += type_format_mapper_infl
+                else:
+                    cover_key += type_format_mappers[type(val)](val)
+
+            pairs.append((cover_key, uid))
+
+        return pairs
+
+    def _get_hash_tuple_cover_keys(self, schema, items):
+        """
+        Gets the (cover key, uid) pairs of the (uid, values) pairs as the tuples of the values themselves, the values
+        are formatted only if the missing or bool value is met.
+        """
+        type_format_mappers = self.type_format_mappers
+        pairs = []
+
+        for uid, record in items:
+            cover_key = tuple([
+                get(key, record) if get_is_callable else record.get(key, get)
+                for key, get, get_is_callable in schema
+            ])
+
+            if cover_key[0] is EMPTY:
+                cover_key = None
+            else:
+                for val in cover_key:
+                    if val is EMPTY or type(val) is bool:
+                        cover_key = sum([type_format_mappers[type(val)](val) for val in cover_key], ())
+
+                        break
+
+            pairs.append((cover_key, uid))
+
+        return pairs
+
     def get_meta(self):
-        return {
+        meta = {
             'schema': {
                 k: {'__emp__': True} if type(v) not in TYPE_COMPARATORS or v == EMPTY else v
                 for k, v in self.schema.items()
@@ -334,6 +590,15 @@ class UdbBaseLinearIndex(UdbIndex):
             'sparse': self.is_sparse,
         }
 
+        # the snapshot of the index is not restored to the index of the other keys encoding
+        if self.is_binary_keys:
+            meta['binary'] = True
+
+        if self.is_tuple_keys:
+            meta['tuple'] = True
+
+        return meta
+
     def get_scan_op(self, q, limit=None, offset=None, collection=None):
         """
         Gets scan op for the coverage key.
@@ -352,6 +617,8 @@ class UdbBaseLinearIndex(UdbIndex):
             fn_q_arranger,
         )
         """
+        key_infl = self.key_infl
+        key_infr = self.key_infr
         type_format_mappers = self.type_format_mappers
         ind = -1
 
@@ -365,14 +632,14 @@ class UdbBaseLinearIndex(UdbIndex):
                 if ind == 0:
                     return SCAN_OP_SEQ, 0, 0, 0, None, None
 
-                return SCAN_OP_PREFIX, ind, ind - 1, 1, self.search_by_key_prefix, None
+                return SCAN_OP_PREFIX, ind, ind - 1, 1, lambda k, by=self: by.search_by_key_prefix(k), None
 
             if type(condition) == dict:
                 c_fn = condition.get('$fn', EMPTY)
 
                 if c_fn != EMPTY:
                     if ind != 0 and self.is_prefixed:
-                        return SCAN_OP_PREFIX, ind, ind, 1, self.search_by_key_prefix, None
+                        return SCAN_OP_PREFIX, ind, ind, 1, lambda k, by=self: by.search_by_key_prefix(k), None
 
                     return SCAN_OP_SEQ, 0, 0, 0, None, None
 
@@ -387,7 +654,7 @@ class UdbBaseLinearIndex(UdbIndex):
                             ind + 1,  # cover key length
                             ind + 1,
                             2,  # priority
-                            lambda k: self.search_by_key_eq(k + key_part),
+                            lambda k, by=self: by.search_by_key_eq(k + key_part),
                             _q_arr_eq,
                         )
 
@@ -399,7 +666,7 @@ class UdbBaseLinearIndex(UdbIndex):
                             ind,  # cover key length
                             ind,
                             1,  # priority
-                            lambda k: self.search_by_key_prefix(k + key_part),
+                            lambda k, by=self: by.search_by_key_prefix(k + key_part),
                             None,
                         )
 
@@ -416,7 +683,7 @@ class UdbBaseLinearIndex(UdbIndex):
                             ind + 1,  # cover key length
                             ind + 1,
                             2,  # priority
-                            lambda k: self.search_by_key_ne(k + key_part),
+                            lambda k, by=self: by.search_by_key_ne(k + key_part),
                             _q_arr_ne,
                         )
 
@@ -428,7 +695,7 @@ class UdbBaseLinearIndex(UdbIndex):
                             ind,  # cover key length
                             ind,
                             1,  # priority
-                            lambda k: self.search_by_key_ne(k + key_part),
+                            lambda k, by=self: by.search_by_key_ne(k + key_part),
                             None,
                         )
 
@@ -441,7 +708,7 @@ class UdbBaseLinearIndex(UdbIndex):
                             ind + 1,  # cover key length
                             ind + 1,
                             2,  # priority
-                            lambda k: self.search_by_key_in(
+                            lambda k, by=self: by.search_by_key_in(
                                 map(lambda x: k + type_format_mappers[type(x)](x), c_in)
                             ),
                             _q_arr_in,
@@ -453,7 +720,7 @@ class UdbBaseLinearIndex(UdbIndex):
                             ind,  # cover key length
                             ind,
                             1,  # priority
-                            lambda k: self.search_by_key_prefix_in(
+                            lambda k, by=self: by.search_by_key_prefix_in(
                                 map(lambda x: k + type_format_mappers[type(x)](x), c_in)
                             ),
                             None,
@@ -470,7 +737,7 @@ class UdbBaseLinearIndex(UdbIndex):
                             ind + 1,  # cover key length
                             ind + 1,
                             2,  # priority
-                            lambda k: self.search_by_key_nin(
+                            lambda k, by=self: by.search_by_key_nin(
                                 map(lambda x: k + type_format_mappers[type(x)](x), c_nin)
                             ),
                             _q_arr_nin
@@ -482,7 +749,7 @@ class UdbBaseLinearIndex(UdbIndex):
                             ind,  # cover key length
                             ind,
                             1,  # priority
-                            lambda k: self.search_by_key_nin(
+                            lambda k, by=self: by.search_by_key_nin(
                                 map(lambda x: k + type_format_mappers[type(x)](x), c_nin)
                             ),
                             _q_arr_none,
@@ -508,9 +775,9 @@ class UdbBaseLinearIndex(UdbIndex):
                             ind + 1,  # cover key length
                             ind + 1,
                             1,  # priority
-                            lambda k: self.search_by_key_range(
-                                (k + c_gte) if c_gte != EMPTY else k + chr(0),
-                                (k + c_lte) if c_lte != EMPTY else k + CHAR255,
+                            lambda k, by=self: by.search_by_key_range(
+                                (k + c_gte) if c_gte != EMPTY else k + key_infl,
+                                (k + c_lte) if c_lte != EMPTY else k + key_infr,
                                 c_gt != EMPTY,
                                 c_lt != EMPTY,
                             ),
@@ -531,6 +798,14 @@ class UdbBaseLinearIndex(UdbIndex):
                         if -1 < c_like_pos__ < c_like_pos_p:
                             c_like_index = c_like_pos__
 
+                        # the string value of the tuple key is not extendable by the prefix, so the preceding key
+                        # parts are scanned only
+                        if self.is_tuple_keys and (c_like_index > -1 or len(condition) > 1):
+                            if ind == 0:
+                                return SCAN_OP_SEQ, 0, 0, 0, None, None
+
+                            return SCAN_OP_PREFIX, ind, ind, 1, lambda k, by=self: by.search_by_key_prefix(k), None
+
                         # no pattern symbols
                         if c_like_index == -1:
                             # key is fully covered, const scan
@@ -542,7 +817,7 @@ class UdbBaseLinearIndex(UdbIndex):
                                     ind + 1,  # cover key length
                                     ind + 1,
                                     2,  # priority
-                                    lambda k: self.search_by_key_eq(k + key_part),
+                                    lambda k, by=self: by.search_by_key_eq(k + key_part),
                                     _q_arr_like,
                                 )
                             # key not fully covered and cond has extra filtering, prefix scan
@@ -554,7 +829,7 @@ class UdbBaseLinearIndex(UdbIndex):
                                     ind + 1,  # cover key length
                                     ind + 1,
                                     1,  # priority
-                                    lambda k: self.search_by_key_prefix(k + key_part),
+                                    lambda k, by=self: by.search_by_key_prefix(k + key_part),
                                     _q_arr_like_eq,
                                 )
                             # cond replaced by '$eq', continue key checking
@@ -570,23 +845,69 @@ class UdbBaseLinearIndex(UdbIndex):
                                 ind + 1,  # cover key length
                                 ind,
                                 1,  # priority
-                                lambda k: self.search_by_key_prefix(k + key_part),
+                                lambda k, by=self: by.search_by_key_prefix(k + key_part),
                                 None,
                             )
 
                         if ind == 0:
                             return SCAN_OP_SEQ, 0, 0, 0, None, None
 
-                    return SCAN_OP_PREFIX, ind, ind, 1, self.search_by_key_prefix, None
+                    return SCAN_OP_PREFIX, ind, ind, 1, lambda k, by=self: by.search_by_key_prefix(k), None
 
                 return SCAN_OP_SEQ, 0, 0, 0, None, None
             elif callable(condition):
                 if ind != 0 and self.is_prefixed:
-                    return SCAN_OP_PREFIX, ind, ind, 1, self.search_by_key_prefix, None
+                    return SCAN_OP_PREFIX, ind, ind, 1, lambda k, by=self: by.search_by_key_prefix(k), None
 
                 return SCAN_OP_SEQ, 0, 0, 0, None, None
 
-        return SCAN_OP_CONST, ind + 1, ind + 1, 2, self.search_by_key_eq, None
+        return SCAN_OP_CONST, ind + 1, ind + 1, 2, lambda k, by=self: by.search_by_key_eq(k), None
+
+    def is_covering(self, fields):
+        """
+        Checks the fields are covered by the index, i.e. are the plain schema keys having no default value or accessor.
+
+        :param fields:
+
+        :return:
+        """
+        # formatted float is not distinguishable from the pair of formatted ints, the tuple keys keep the floats as is
+        if self.type_format_mappers[float] is not None and not self.is_tuple_keys:
+            return False
+
+        schema = self.schema
+
+        for field in fields:
+            if field not in schema or schema[field] != EMPTY:
+                return False
+
+        return True
+
+    def set_tuple_keys(self, tuple_keys=True):
+        """
+        Switches the cover keys to the tuples of the native values, the ordered index keeps the type tag before every
+        value, the hash one replaces only the bool values to be distinct from the ints. Must be set before the index is
+        filled.
+
+        :param tuple_keys:
+
+        :return:
+        """
+        if not tuple_keys:
+            return self.set_binary_keys(False)
+
+        self.is_binary_keys = False
+        self.is_tuple_keys = True
+        self.key_empty = ()
+
+        if self.is_ranged:
+            self.key_infl, self.key_infr = TYPE_INFL_TUPLE, TYPE_INFR_TUPLE
+            self.type_format_mappers = TYPE_FORMAT_MAPPERS_TUPLE
+        else:
+            self.key_infl, self.key_infr = TYPE_INFL_TUPLE_HASH, TYPE_INFR_TUPLE_HASH
+            self.type_format_mappers = TYPE_FORMAT_MAPPERS_TUPLE_HASH
+
+        return self
 
     def search_by_key_eq(self, key):
         raise NotImplementedError
@@ -618,6 +939,126 @@ class UdbBaseLinearIndex(UdbIndex):
     def search_by_key_seq(self, q, source):
         raise NotImplementedError
 
+    def count_by_key_eq(self, key):
+        return None
+
+    def count_by_key_ne(self, key):
+        return None
+
+    def count_by_key_in(self, keys):
+        count = 0
+
+        for key in set(keys):
+            key_count = self.count_by_key_eq(key)
+
+            if key_count is None:
+                return None
+
+            count += key_count
+
+        return count
+
+    def count_by_key_nin(self, keys):
+        return None
+
+    def count_by_key_prefix(self, key):
+        return None
+
+    def count_by_key_prefix_ne(self, key):
+        return None
+
+    def count_by_key_prefix_in(self, keys):
+        return None
+
+    def count_by_key_prefix_nin(self, keys):
+        return None
+
+    def count_by_key_range(self, gte=None, lte=None, gte_excluded=False, lte_excluded=False):
+        return None
+
+    def estimate_by_key_eq(self, key):
+        return None
+
+    def estimate_by_key_ne(self, key):
+        estimate = self.estimate_by_key_eq(key)
+
+        return None if estimate is None else max(self._stats_count - estimate, 0)
+
+    def estimate_by_key_in(self, keys):
+        estimate = 0
+
+        for key in keys:
+            key_estimate = self.estimate_by_key_eq(key)
+
+            if key_estimate is None:
+                return None
+
+            estimate += key_estimate
+
+        return estimate
+
+    def estimate_by_key_nin(self, keys):
+        estimate = self.estimate_by_key_in(keys)
+
+        return None if estimate is None else max(self._stats_count - estimate, 0)
+
+    def estimate_by_key_prefix(self, key):
+        return None
+
+    def estimate_by_key_prefix_ne(self, key):
+        return None
+
+    def estimate_by_key_prefix_in(self, keys):
+        return None
+
+    def estimate_by_key_prefix_nin(self, keys):
+        return None
+
+    def estimate_by_key_range(self, gte=None, lte=None, gte_excluded=False, lte_excluded=False):
+        return None
+
+    def estimate_by_histogram(self, gte=None, lte=None, gte_excluded=False, lte_excluded=False):
+        """
+        Estimates count of records covered by the index keys range using the equi-depth histogram.
+        The histogram is rebuilt lazily once the count of modifications exceeds the fraction of indexed records.
+
+        :param gte:
+        :param lte:
+        :param gte_excluded:
+        :param lte_excluded:
+
+        :return: Estimated count of records
+        """
+        if self._stats_histogram is None \
+                or self._stats_modified > self._stats_count // _STATS_HISTOGRAM_REBUILD_RATIO:
+            depth = self._stats_count // _STATS_HISTOGRAM_BUCKETS + 1
+            histogram = []
+            weight_acc = 0
+
+            for key, weight in self.get_stats_weighted_keys():
+                weight_acc += weight
+
+                while weight_acc >= depth:
+                    histogram.append(key)
+                    weight_acc -= depth
+
+            self._stats_histogram = histogram
+            self._stats_histogram_depth = depth
+            self._stats_modified = 0
+
+        histogram = self._stats_histogram
+        depth = self._stats_histogram_depth
+        lo = 0 if gte is None else (bisect_right if gte_excluded else bisect_left)(histogram, gte)
+        hi = len(histogram) if lte is None else (bisect_left if lte_excluded else bisect_right)(histogram, lte)
+
+        return max(hi - lo, 0) * depth + (depth >> 1)
+
+    def get_stats_weighted_keys(self):
+        """
+        Gets iterator over (index key, count of records) pairs in ascending order of index keys.
+        """
+        raise NotImplementedError
+
 
 class UdbBaseLinearEmbeddedIndex(UdbBaseLinearIndex):
     is_embedded = True
@@ -658,8 +1099,11 @@ class UdbBaseLinearEmbeddedIndex(UdbBaseLinearIndex):
             if passed:
                 yield rid
 
+    def get_cover_keys(self, items):
+        return UdbIndex.get_cover_keys(self, items)
+
     def get_cover_key(self, record, second=None):
-        key = ''
+        key = self.key_empty
         type_format_mappers = self.type_format_mappers
 
         for i, k in enumerate(self.schema_keys):
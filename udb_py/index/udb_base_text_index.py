@@ -15,6 +15,7 @@ class UdbBaseTextIndex(UdbIndex):
     is_prefixed = False
     is_ranged = False
     is_sorted_asc = False
+    is_sorted_desc = False
     is_sparse = False
     is_uniq = False
 
@@ -127,9 +128,15 @@ class UdbBaseTextIndex(UdbIndex):
             len(schema_keys_matched),
             len(schema_keys_matched),
             3,
-            lambda _: self.search_by_text(schema_keys_matched),
+            lambda _, by=self: by.search_by_text(schema_keys_matched),
             _q_arr_text,
         )
 
+    def count_by_text(self, q):
+        return None
+
+    def estimate_by_text(self, q):
+        return None
+
     def search_by_text(self, q):
         raise NotImplementedError
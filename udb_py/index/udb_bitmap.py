@@ -0,0 +1,288 @@
+from array import array
+from bisect import bisect_left
+
+
+# the container covers the 2^16 uids of the same high bits, it is kept as the sorted array of the low bits until grown
+# over the limit (the array is as large as the bitset then) and as the bitset otherwise
+_CONTAINER_ARRAY_SIZE_MAX = 4096
+_CONTAINER_BITSET_SIZE = 8192
+_BYTE_BITS = tuple(tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256))
+
+if hasattr(int, 'bit_count'):
+    def _popcount(x):
+        return x.bit_count()
+else:
+    def _popcount(x):
+        return bin(x).count('1')
+
+
+def _array_to_bitset(container):
+    bitset = bytearray(_CONTAINER_BITSET_SIZE)
+
+    for lo in container:
+        bitset[lo >> 3] |= 1 << (lo & 7)
+
+    return bitset
+
+
+def _bitset_iter(bitset):
+    byte_bits = _BYTE_BITS
+
+    for ind, byte in enumerate(bitset):
+        if byte:
+            ind <<= 3
+
+            for bit in byte_bits[byte]:
+                yield ind + bit
+
+
+def _bitset_len(bitset):
+    return _popcount(int.from_bytes(bitset, 'little'))
+
+
+def _bitset_from_int(x):
+    """
+    Gets the container of the bitset given as int, the sparse bitset is moved to the array.
+    """
+    if not x:
+        return None
+
+    bitset = bytearray(x.to_bytes(_CONTAINER_BITSET_SIZE, 'little'))
+
+    if _popcount(x) <= _CONTAINER_ARRAY_SIZE_MAX:
+        return array('H', _bitset_iter(bitset))
+
+    return bitset
+
+
+def _container_from_sorted(los):
+    if not los:
+        return None
+
+    if len(los) <= _CONTAINER_ARRAY_SIZE_MAX:
+        return array('H', los)
+
+    return _array_to_bitset(los)
+
+
+def _container_and(a, b):
+    if type(a) is array:
+        if type(b) is array:
+            return _container_from_sorted(sorted(set(a).intersection(b)))
+
+        return _container_from_sorted([lo for lo in a if b[lo >> 3] >> (lo & 7) & 1])
+
+    if type(b) is array:
+        return _container_from_sorted([lo for lo in b if a[lo >> 3] >> (lo & 7) & 1])
+
+    return _bitset_from_int(int.from_bytes(a, 'little') & int.from_bytes(b, 'little'))
+
+
+def _container_or(a, b):
+    if type(a) is array and type(b) is array:
+        return _container_from_sorted(sorted(set(a).union(b)))
+
+    if type(a) is array:
+        a = _array_to_bitset(a)
+
+    if type(b) is array:
+        b = _array_to_bitset(b)
+
+    return _bitset_from_int(int.from_bytes(a, 'little') | int.from_bytes(b, 'little'))
+
+
+def _container_sub(a, b):
+    if type(a) is array:
+        if type(b) is array:
+            return _container_from_sorted(sorted(set(a).difference(b)))
+
+        return _container_from_sorted([lo for lo in a if not b[lo >> 3] >> (lo & 7) & 1])
+
+    if type(b) is array:
+        b = _array_to_bitset(b)
+
+    return _bitset_from_int(int.from_bytes(a, 'little') & ~int.from_bytes(b, 'little'))
+
+
+class UdbBitmap(object):
+    """
+    Compressed bitmap of the non-negative int uids, the uids are split by the high bits into the containers of the low
+    bits kept as the sorted arrays if sparse or as the bitsets if dense (roaring bitmap like).
+    """
+    _containers = None
+
+    def __init__(self, uids=None):
+        self._containers = {}
+
+        if uids is not None:
+            self.update(uids)
+
+    def __and__(self, other):
+        bitmap = UdbBitmap()
+        other_containers = other._containers
+
+        for hi, container in self._containers.items():
+            other_container = other_containers.get(hi)
+
+            if other_container is not None:
+                container = _container_and(container, other_container)
+
+                if container is not None:
+                    bitmap._containers[hi] = container
+
+        return bitmap
+
+    def __bool__(self):
+        return bool(self._containers)
+
+    def __contains__(self, uid):
+        container = self._containers.get(uid >> 16)
+
+        if container is None:
+            return False
+
+        lo = uid & 0xFFFF
+
+        if type(container) is array:
+            pos = bisect_left(container, lo)
+
+            return pos < len(container) and container[pos] == lo
+
+        return container[lo >> 3] >> (lo & 7) & 1 == 1
+
+    def __eq__(self, other):
+        return isinstance(other, UdbBitmap) and list(self) == list(other)
+
+    def __iter__(self):
+        containers = self._containers
+
+        for hi in sorted(containers):
+            container = containers[hi]
+            hi <<= 16
+
+            if type(container) is array:
+                for lo in container:
+                    yield hi + lo
+            else:
+                for lo in _bitset_iter(container):
+                    yield hi + lo
+
+    def __len__(self):
+        return sum(
+            len(container) if type(container) is array else _bitset_len(container)
+            for container in self._containers.values()
+        )
+
+    def __or__(self, other):
+        bitmap = self.copy()
+        containers = bitmap._containers
+
+        for hi, other_container in other._containers.items():
+            container = containers.get(hi)
+
+            containers[hi] = other_container[:] if container is None else _container_or(container, other_container)
+
+        return bitmap
+
+    def __sub__(self, other):
+        bitmap = UdbBitmap()
+        other_containers = other._containers
+
+        for hi, container in self._containers.items():
+            other_container = other_containers.get(hi)
+
+            if other_container is not None:
+                container = _container_sub(container, other_container)
+            else:
+                container = container[:]
+
+            if container is not None:
+                bitmap._containers[hi] = container
+
+        return bitmap
+
+    def add(self, uid):
+        hi = uid >> 16
+        lo = uid & 0xFFFF
+        container = self._containers.get(hi)
+
+        if container is None:
+            self._containers[hi] = array('H', (lo,))
+        elif type(container) is array:
+            pos = bisect_left(container, lo)
+
+            if pos == len(container) or container[pos] != lo:
+                if len(container) < _CONTAINER_ARRAY_SIZE_MAX:
+                    container.insert(pos, lo)
+                else:
+                    container = self._containers[hi] = _array_to_bitset(container)
+                    container[lo >> 3] |= 1 << (lo & 7)
+        else:
+            container[lo >> 3] |= 1 << (lo & 7)
+
+        return self
+
+    def copy(self):
+        bitmap = UdbBitmap()
+        bitmap._containers = {hi: container[:] for hi, container in self._containers.items()}
+
+        return bitmap
+
+    def discard(self, uid):
+        hi = uid >> 16
+        lo = uid & 0xFFFF
+        container = self._containers.get(hi)
+
+        if container is None:
+            return self
+
+        if type(container) is array:
+            pos = bisect_left(container, lo)
+
+            if pos < len(container) and container[pos] == lo:
+                del container[pos]
+        else:
+            container[lo >> 3] &= ~(1 << (lo & 7)) & 0xFF
+
+            # the bitset is kept until it is sparse enough to be moved to the array without the flapping
+            if not container[lo >> 3] and _bitset_len(container) <= _CONTAINER_ARRAY_SIZE_MAX >> 1:
+                container = self._containers[hi] = array('H', _bitset_iter(container))
+
+        if not container:
+            self._containers.pop(hi)
+
+        return self
+
+    def update(self, uids):
+        """
+        Adds the uids at once, the containers are rebuilt once per the high bits.
+
+        :param uids:
+
+        :return:
+        """
+        groups = {}
+
+        for uid in uids:
+            hi = uid >> 16
+            los = groups.get(hi)
+
+            if los is None:
+                groups[hi] = [uid & 0xFFFF]
+            else:
+                los.append(uid & 0xFFFF)
+
+        containers = self._containers
+
+        for hi, los in groups.items():
+            container = containers.get(hi)
+
+            if container is None:
+                containers[hi] = _container_from_sorted(sorted(set(los)))
+            elif type(container) is array:
+                containers[hi] = _container_from_sorted(sorted(set(container).union(los)))
+            else:
+                for lo in los:
+                    container[lo >> 3] |= 1 << (lo & 7)
+
+        return self
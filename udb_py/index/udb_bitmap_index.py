@@ -0,0 +1,187 @@
+from ..common import EMPTY
+from ..udb_index import UdbIndexBitmapper
+from .udb_base_linear_index import (
+    UdbBaseLinearIndex,
+    SCAN_OP_CONST,
+    SCAN_OP_IN,
+    SCAN_OP_NE,
+    SCAN_OP_NIN,
+    _q_arr_nin,
+)
+from .udb_bitmap import UdbBitmap
+
+
+class UdbBitmapIndex(UdbBaseLinearIndex):
+    """
+    Index of the low cardinality fields keeping the compressed bitmap of the uids per index key, the record sets of the
+    bitmap indexes are intersected as the bitmaps and the records are counted without the scan.
+    """
+    intersecting_scan_ops = (SCAN_OP_CONST, SCAN_OP_NE, SCAN_OP_IN, SCAN_OP_NIN)
+    is_multivalued = True
+    type = 'bitmap'
+
+    def __init__(self, schema, name=None):
+        UdbBaseLinearIndex.__init__(self, schema, name)
+
+        self.bitmapper = UdbIndexBitmapper(self)
+
+        self._all = UdbBitmap()
+        self._hash = {}
+
+    def __len__(self):
+        return len(self._hash)
+
+    def clear(self):
+        self._all = UdbBitmap()
+        self._hash.clear()
+
+        self._stats_count = 0
+
+        return self
+
+    def delete(self, key, uid):
+        old_existing = self._hash.get(key, EMPTY)
+
+        if old_existing != EMPTY and uid in old_existing:
+            old_existing.discard(uid)
+
+            if not old_existing:
+                self._hash.pop(key)
+
+            self._all.discard(uid)
+
+            self._stats_count -= 1
+
+        return self
+
+    def bitmap_by_key_eq(self, key):
+        val = self._hash.get(key, EMPTY)
+
+        return UdbBitmap() if val == EMPTY else val
+
+    def bitmap_by_key_ne(self, key):
+        # the records missing the field are kept by the None key and match neither "$ne" nor "$nin"
+        return self._all - self.bitmap_by_key_eq(key) - self.bitmap_by_key_eq(None)
+
+    def bitmap_by_key_in(self, keys):
+        bitmap = UdbBitmap()
+
+        for key in set(keys):
+            val = self._hash.get(key, EMPTY)
+
+            if val != EMPTY:
+                bitmap = bitmap | val
+
+        return bitmap
+
+    def bitmap_by_key_nin(self, keys):
+        return self._all - self.bitmap_by_key_in(keys) - self.bitmap_by_key_eq(None)
+
+    def count_by_key_eq(self, key):
+        return len(self._hash.get(key, ()))
+
+    def count_by_key_ne(self, key):
+        return self._stats_count - self.count_by_key_eq(key) - self.count_by_key_eq(None)
+
+    def count_by_key_nin(self, keys):
+        return self._stats_count - self.count_by_key_in(keys) - self.count_by_key_eq(None)
+
+    def estimate_by_key_eq(self, key):
+        return len(self._hash.get(key, ()))
+
+    def get_scan_op(self, q, limit=None, offset=None, collection=None):
+        # the bitmap of the keys not in the list is the complement of their union, so the "$nin" is not sequential
+        if self.schema_last_index == 0:
+            condition = q.get(self.schema_keys[0], EMPTY)
+
+            if type(condition) == dict and len(condition) == 1 and '$nin' in condition:
+                c_nin = condition['$nin']
+                type_format_mappers = self.type_format_mappers
+
+                return (
+                    SCAN_OP_NIN,
+                    1,  # cover key length
+                    1,
+                    2,  # priority
+                    lambda k, by=self: by.search_by_key_nin(
+                        map(lambda x: k + type_format_mappers[type(x)](x), c_nin)
+                    ),
+                    _q_arr_nin,
+                )
+
+        return UdbBaseLinearIndex.get_scan_op(self, q, limit, offset, collection)
+
+    def get_snapshot(self):
+        return [{k: v.copy() for k, v in self._hash.items()}, self._stats_count]
+
+    def load_snapshot(self, snapshot):
+        self._hash, self._stats_count = snapshot
+        self._all = UdbBitmap()
+
+        for val in self._hash.values():
+            self._all = self._all | val
+
+        return self
+
+    def insert(self, key, uid):
+        old_existing = self._hash.get(key, EMPTY)
+
+        if old_existing == EMPTY:
+            self._hash[key] = UdbBitmap().add(uid)
+        elif uid in old_existing:
+            return self
+        else:
+            old_existing.add(uid)
+
+        self._all.add(uid)
+
+        self._stats_count += 1
+
+        return self
+
+    def insert_many(self, items):
+        batch = {}
+
+        # the uids are grouped by the keys and put into the bitmaps at once
+        for key, uid in items:
+            uids = batch.get(key, EMPTY)
+
+            if uids == EMPTY:
+                batch[key] = [uid]
+            else:
+                uids.append(uid)
+
+        for key, uids in batch.items():
+            old_existing = self._hash.get(key, EMPTY)
+
+            if old_existing == EMPTY:
+                old_existing = self._hash[key] = UdbBitmap()
+
+            count = len(old_existing)
+            old_existing.update(uids)
+
+            self._all.update(uids)
+
+            self._stats_count += len(old_existing) - count
+
+        return self
+
+    def search_by_key_eq(self, key):
+        return iter(self.bitmap_by_key_eq(key))
+
+    def search_by_key_ne(self, key):
+        return iter(self.bitmap_by_key_ne(key))
+
+    def search_by_key_in(self, keys):
+        return iter(self.bitmap_by_key_in(keys))
+
+    def search_by_key_nin(self, keys):
+        return iter(self.bitmap_by_key_nin(keys))
+
+    def upsert(self, old, new, uid):
+        if old != new:
+            self.delete(old, uid)
+
+        self.insert(new, uid)
+
+        return self
@@ -1,11 +1,55 @@
-from ..common import CHAR255, EMPTY, TYPE_INFL, TYPE_INFR, sort_iter
-from .udb_base_linear_index import UdbBaseLinearIndex, UdbBaseLinearEmbeddedIndex
+from ..common import EMPTY, sort_iter
+from .udb_base_linear_index import (
+    UdbBaseLinearIndex,
+    UdbBaseLinearEmbeddedIndex,
+    SCAN_OP_CONST,
+    SCAN_OP_IN,
+    SCAN_OP_PREFIX,
+    SCAN_OP_RANGE,
+)
+
+
+_BTREE_REVERSED_CHUNK_SIZE = 32
+
+
+def btree_reversed_iter(btree, min_key=None, max_key=None, min_excluded=False, max_excluded=False, items=False):
+    """
+    Iterates over the btree values (or items) of the keys range in the reverse order.
+
+    BTrees do not support the reverse iteration, so the values are sliced from the end of the range by the chunks of the
+    doubling size. Every chunk is sliced from the new items sequence, since seeking backward within the same sequence
+    walks the buckets from the first one.
+
+    :param btree:
+    :param min_key:
+    :param max_key:
+    :param min_excluded:
+    :param max_excluded:
+    :param items:
+
+    :return:
+    """
+    seq = btree.items if items else btree.values
+    hi = len(seq(min_key, max_key, min_excluded, max_excluded))
+    size = _BTREE_REVERSED_CHUNK_SIZE
+
+    while hi > 0:
+        lo = max(hi - size, 0)
+
+        for val in reversed(list(seq(min_key, max_key, min_excluded, max_excluded)[lo:hi])):
+            yield val
+
+        hi = lo
+        size <<= 1
 
 
 class UdbBtreeBaseIndex(UdbBaseLinearIndex):
+    covering_scan_ops = (SCAN_OP_CONST, SCAN_OP_IN, SCAN_OP_PREFIX, SCAN_OP_RANGE)
+    intersecting_scan_ops = (SCAN_OP_CONST, SCAN_OP_IN, SCAN_OP_PREFIX, SCAN_OP_RANGE)
     is_prefixed = True
     is_ranged = True
     is_sorted_asc = True
+    is_sorted_desc = True
     type = 'btree_base'
 
     def __init__(self, schema, name=None):
@@ -21,37 +65,102 @@ class UdbBtreeBaseIndex(UdbBaseLinearIndex):
     def clear(self):
         self._btree.clear()
 
+        self._stats_count = 0
+        self._stats_histogram = None
+
         return self
 
     def delete(self, key_or_keys, uid=None):
-        self._btree.pop(key_or_keys, EMPTY)
+        if self._btree.pop(key_or_keys, EMPTY) != EMPTY:
+            self._stats_count -= 1
+            self._stats_modified += 1
+
+        return self
+
+    def count_by_key_eq(self, key):
+        return 1 if key in self._btree else 0
+
+    def count_by_key_prefix(self, key):
+        return len(self._btree.values(key, key + self.key_infr))
+
+    def count_by_key_range(self, gte=None, lte=None, gte_excluded=False, lte_excluded=False):
+        return len(self._btree.values(gte, lte, gte_excluded, lte_excluded))
+
+    def estimate_by_key_eq(self, key):
+        return 1 if key in self._btree else 0
+
+    def estimate_by_key_prefix(self, key):
+        return self.estimate_by_histogram(key, key + self.key_infr)
+
+    def estimate_by_key_prefix_in(self, keys):
+        keys = list(keys)
+
+        return self.estimate_by_histogram(min(keys), max(keys) + self.key_infr)
+
+    def estimate_by_key_range(self, gte=None, lte=None, gte_excluded=False, lte_excluded=False):
+        return self.estimate_by_histogram(gte, lte, gte_excluded, lte_excluded)
+
+    def get_snapshot(self):
+        # pickling of the BTree itself recurses over its chain of buckets, so the items are flattened
+        return [list(self._btree.items()), self._stats_count]
+
+    def load_snapshot(self, snapshot):
+        self._btree.clear()
+        self._btree.update(snapshot[0])
+        self._stats_count = snapshot[1]
+        self._stats_histogram = None
+        self._stats_modified = 0
 
         return self
 
+    def get_stats_weighted_keys(self):
+        for key in self._btree.keys():
+            yield key, 1
+
     def insert(self, key_or_keys, uid):
-        self._btree.insert(key_or_keys, uid)
+        self._stats_count += self._btree.insert(key_or_keys, uid)
+        self._stats_modified += 1
+
+        return self
+
+    def insert_many(self, items):
+        btree = self._btree
+        batch = {}
+        count = 0
+
+        # the first uid of the key wins as in case of the single insert
+        for key, uid in items:
+            if key not in batch and key not in btree:
+                batch[key] = uid
+
+            count += 1
+
+        btree.update(batch)
+
+        self._stats_count += len(batch)
+        self._stats_modified += count
 
         return self
 
-    def search_by_key_eq(self, key):
+    def search_by_key_eq(self, key, items=False):
         val = self._btree.get(key, EMPTY)
 
         if val != EMPTY:
-            yield val
+            yield (key, val) if items else val
 
     def search_by_key_ne(self, key):
-        for val in self._btree.values(TYPE_INFL, key, False, True):
+        for val in self._btree.values(self.key_infl, key, False, True):
             yield val
 
-        for val in self._btree.values(key, TYPE_INFR, True, False):
+        for val in self._btree.values(key, self.key_infr, True, False):
             yield val
 
-    def search_by_key_in(self, keys):
+    def search_by_key_in(self, keys, items=False):
         for key in keys:
             val = self._btree.get(key, EMPTY)
 
             if val != EMPTY:
-                yield val
+                yield (key, val) if items else val
 
     def search_by_key_nin(self, keys):
         keys = list(keys)
@@ -59,59 +168,94 @@ class UdbBtreeBaseIndex(UdbBaseLinearIndex):
         if len(keys) > 1:
             keys = list(sorted(keys))
 
-            for val in self._btree.values(TYPE_INFL, keys[0], False, True):
+            for val in self._btree.values(self.key_infl, keys[0], False, True):
                 yield val
 
             for i in range(len(keys) - 1):
                 for val in self._btree.values(keys[i], keys[i + 1], True, True):
                     yield val
 
-            for val in self._btree.values(keys[-1], TYPE_INFR, True, False):
+            for val in self._btree.values(keys[-1], self.key_infr, True, False):
                 yield val
         else:
-            for val in self._btree.values(TYPE_INFL, keys[0], False, True):
+            for val in self._btree.values(self.key_infl, keys[0], False, True):
                 yield val
 
-            for val in self._btree.values(keys[0], TYPE_INFR, True, False):
+            for val in self._btree.values(keys[0], self.key_infr, True, False):
                 yield val
 
-    def search_by_key_prefix(self, key):
-        for val in self._btree.values(key, key + TYPE_INFR):
+    def search_by_key_prefix(self, key, reverse=False, items=False):
+        if reverse:
+            seq = btree_reversed_iter(self._btree, key, key + self.key_infr, items=items)
+        elif items:
+            seq = self._btree.items(key, key + self.key_infr)
+        else:
+            seq = self._btree.values(key, key + self.key_infr)
+
+        for val in seq:
             yield val
 
     def search_by_key_prefix_in(self, keys):
         keys = list(keys)
-        min_key = min(*keys)
-        max_key = max(*keys)
+        min_key = min(keys)
+        max_key = max(keys)
 
-        for val in self._btree.values(min_key, max_key + TYPE_INFR):
+        for val in self._btree.values(min_key, max_key + self.key_infr):
             yield val
 
-    def search_by_key_range(self, gte=None, lte=None, gte_excluded=False, lte_excluded=False):
-        for val in self._btree.values(gte, lte, gte_excluded, lte_excluded):
+    def search_by_key_range(
+        self,
+        gte=None,
+        lte=None,
+        gte_excluded=False,
+        lte_excluded=False,
+        reverse=False,
+        items=False,
+    ):
+        if reverse:
+            seq = btree_reversed_iter(self._btree, gte, lte, gte_excluded, lte_excluded, items)
+        elif items:
+            seq = self._btree.items(gte, lte, gte_excluded, lte_excluded)
+        else:
+            seq = self._btree.values(gte, lte, gte_excluded, lte_excluded)
+
+        for val in seq:
             yield val
 
     def upsert(self, old, new, uid):
         if old != new:
             self._btree.pop(old)
 
-        self._btree.insert(new, uid)
+            self._stats_count -= 1
+
+        self._stats_count += self._btree.insert(new, uid)
+        self._stats_modified += 1
 
         return self
 
 
 class UdbBtreeEmbeddedBaseIndex(UdbBtreeBaseIndex, UdbBaseLinearEmbeddedIndex):
+    covering_scan_ops = ()
     type = 'btree_base_embedded'
 
     def delete(self, key_or_keys, uid=None):
         for key in key_or_keys:
-            self._btree.pop(key, EMPTY)
+            if self._btree.pop(key, EMPTY) != EMPTY:
+                self._stats_count -= 1
+                self._stats_modified += 1
 
         return self
 
     def insert(self, key_or_keys, uid):
         for key in key_or_keys:
-            self._btree.insert(key, uid)
+            self._stats_count += self._btree.insert(key, uid)
+            self._stats_modified += 1
+
+        return self
+
+    def insert_many(self, items):
+        for key_or_keys, uid in items:
+            self.insert(key_or_keys, uid)
 
         return self
 
@@ -1,12 +1,33 @@
-from ..common import CHAR255, EMPTY, TYPE_INFL, TYPE_INFR
-from .udb_base_linear_index import UdbBaseLinearIndex, UdbBaseLinearEmbeddedIndex
+from ..common import EMPTY
+from .udb_base_linear_index import (
+    UdbBaseLinearIndex,
+    UdbBaseLinearEmbeddedIndex,
+    SCAN_OP_CONST,
+    SCAN_OP_IN,
+    SCAN_OP_PREFIX,
+    SCAN_OP_RANGE,
+)
+from .udb_btree_base_index import btree_reversed_iter
+from .udb_bucket import (
+    bucket_add,
+    bucket_contains,
+    bucket_from_snapshot,
+    bucket_iter,
+    bucket_len,
+    bucket_remove,
+    bucket_snapshot,
+    bucket_update,
+)
 
 
 class UdbBtreeIndex(UdbBaseLinearIndex):
+    covering_scan_ops = (SCAN_OP_CONST, SCAN_OP_IN, SCAN_OP_PREFIX, SCAN_OP_RANGE)
+    intersecting_scan_ops = (SCAN_OP_CONST, SCAN_OP_IN, SCAN_OP_PREFIX, SCAN_OP_RANGE)
     is_ranged = True
     is_multivalued = True
     is_prefixed = True
     is_sorted_asc = True
+    is_sorted_desc = True
     type = 'btree'
 
     def __init__(self, schema, name=None):
@@ -22,52 +43,134 @@ class UdbBtreeIndex(UdbBaseLinearIndex):
     def clear(self):
         self._btree.clear()
 
+        self._stats_count = 0
+        self._stats_histogram = None
+
         return self
 
     def delete(self, key_or_keys, uid):
         old_existing = self._btree.get(key_or_keys, EMPTY)
 
-        if old_existing != EMPTY and uid in old_existing:
-            if len(old_existing) == 1:
-                self._btree.pop(key_or_keys)
-            else:
-                old_existing.remove(uid)
+        if old_existing != EMPTY and bucket_contains(old_existing, uid):
+            self._set_bucket(key_or_keys, old_existing, bucket_remove(old_existing, uid))
+
+            self._stats_count -= 1
+            self._stats_modified += 1
+
+        return self
+
+    def count_by_key_eq(self, key):
+        return bucket_len(self._btree.get(key, ()))
+
+    def count_by_key_prefix(self, key):
+        return sum(map(bucket_len, self._btree.values(key, key + self.key_infr)))
+
+    def count_by_key_range(self, gte=None, lte=None, gte_excluded=False, lte_excluded=False):
+        return sum(map(bucket_len, self._btree.values(gte, lte, gte_excluded, lte_excluded)))
+
+    def estimate_by_key_eq(self, key):
+        return bucket_len(self._btree.get(key, ()))
+
+    def estimate_by_key_prefix(self, key):
+        return self.estimate_by_histogram(key, key + self.key_infr)
+
+    def estimate_by_key_prefix_in(self, keys):
+        keys = list(keys)
+
+        return self.estimate_by_histogram(min(keys), max(keys) + self.key_infr)
+
+    def estimate_by_key_range(self, gte=None, lte=None, gte_excluded=False, lte_excluded=False):
+        return self.estimate_by_histogram(gte, lte, gte_excluded, lte_excluded)
+
+    def get_snapshot(self):
+        # pickling of the BTree itself recurses over its chain of buckets, so the items are flattened
+        return [[(key, bucket_snapshot(val)) for key, val in self._btree.items()], self._stats_count]
+
+    def load_snapshot(self, snapshot):
+        self._btree.clear()
+        self._btree.update([(key, bucket_from_snapshot(val)) for key, val in snapshot[0]])
+        self._stats_count = snapshot[1]
+        self._stats_histogram = None
+        self._stats_modified = 0
 
         return self
 
+    def get_stats_weighted_keys(self):
+        for key, val in self._btree.items():
+            yield key, bucket_len(val)
+
     def insert(self, key_or_keys, uid):
         old_existing = self._btree.get(key_or_keys, EMPTY)
 
         if old_existing == EMPTY:
-            self._btree.insert(key_or_keys, {uid})
-        else:
-            old_existing.add(uid)
+            self._btree.insert(key_or_keys, uid)
+
+            self._stats_count += 1
+        elif not bucket_contains(old_existing, uid):
+            self._set_bucket(key_or_keys, old_existing, bucket_add(old_existing, uid))
+
+            self._stats_count += 1
+
+        self._stats_modified += 1
+
+        return self
+
+    def insert_many(self, items):
+        btree = self._btree
+        batch = {}
+        count = 0
+
+        # the uids are grouped by the keys and put into the btree at once
+        for key, uid in items:
+            uids = batch.get(key, EMPTY)
+
+            if uids == EMPTY:
+                batch[key] = uid
+            elif type(uids) is list:
+                uids.append(uid)
+            else:
+                batch[key] = [uids, uid]
+
+            count += 1
+
+        btree.update({key: bucket_update(btree.get(key), uids) for key, uids in batch.items()})
+
+        self._stats_count += count
+        self._stats_modified += count
 
         return self
 
-    def search_by_key_eq(self, key):
+    def search_by_key_eq(self, key, items=False):
         val = self._btree.get(key, EMPTY)
 
         if val != EMPTY:
-            for _ in val:
-                yield _
+            if items:
+                for _ in bucket_iter(val):
+                    yield key, _
+            else:
+                for _ in bucket_iter(val):
+                    yield _
 
     def search_by_key_ne(self, key):
-        for val in self._btree.values(TYPE_INFL, key, False, True):
-            for _ in val:
+        for val in self._btree.values(self.key_infl, key, False, True):
+            for _ in bucket_iter(val):
                 yield _
 
-        for val in self._btree.values(key, TYPE_INFR, True, False):
-            for _ in val:
+        for val in self._btree.values(key, self.key_infr, True, False):
+            for _ in bucket_iter(val):
                 yield _
 
-    def search_by_key_in(self, keys):
+    def search_by_key_in(self, keys, items=False):
         for key in keys:
             val = self._btree.get(key, EMPTY)
 
             if val != EMPTY:
-                for _ in val:
-                    yield _
+                if items:
+                    for _ in bucket_iter(val):
+                        yield key, _
+                else:
+                    for _ in bucket_iter(val):
+                        yield _
 
     def search_by_key_nin(self, keys):
         keys = list(keys)
@@ -75,78 +178,122 @@ class UdbBtreeIndex(UdbBaseLinearIndex):
         if len(keys) > 1:
             keys = list(sorted(keys))
 
-            for val in self._btree.values(TYPE_INFL, keys[0], False, True):
-                for _ in val:
+            for val in self._btree.values(self.key_infl, keys[0], False, True):
+                for _ in bucket_iter(val):
                     yield _
 
             for i in range(len(keys) - 1):
                 for val in self._btree.values(keys[i], keys[i + 1], True, True):
-                    for _ in val:
+                    for _ in bucket_iter(val):
                         yield _
 
-            for val in self._btree.values(keys[-1], TYPE_INFR, True, False):
-                for _ in val:
+            for val in self._btree.values(keys[-1], self.key_infr, True, False):
+                for _ in bucket_iter(val):
                     yield _
         else:
-            for val in self._btree.values(TYPE_INFL, keys[0], False, True):
-                for _ in val:
+            for val in self._btree.values(self.key_infl, keys[0], False, True):
+                for _ in bucket_iter(val):
                     yield _
 
-            for val in self._btree.values(keys[0], TYPE_INFR, True, False):
-                for _ in val:
+            for val in self._btree.values(keys[0], self.key_infr, True, False):
+                for _ in bucket_iter(val):
                     yield _
 
-    def search_by_key_prefix(self, key):
-        for val in self._btree.values(key, key + CHAR255):
-            for _ in val:
-                yield _
+    def search_by_key_prefix(self, key, reverse=False, items=False):
+        if reverse:
+            seq = btree_reversed_iter(self._btree, key, key + self.key_infr, items=items)
+        elif items:
+            seq = self._btree.items(key, key + self.key_infr)
+        else:
+            seq = self._btree.values(key, key + self.key_infr)
+
+        if items:
+            for key, val in seq:
+                for _ in bucket_iter(val):
+                    yield key, _
+        else:
+            for val in seq:
+                for _ in bucket_iter(val):
+                    yield _
 
     def search_by_key_prefix_in(self, keys):
         keys = list(keys)
-        min_key = min(*keys)
-        max_key = max(*keys)
+        min_key = min(keys)
+        max_key = max(keys)
 
-        for val in self._btree.values(min_key, max_key + TYPE_INFR):
-            for _ in val:
+        for val in self._btree.values(min_key, max_key + self.key_infr):
+            for _ in bucket_iter(val):
                 yield _
 
-    def search_by_key_range(self, gte=None, lte=None, gte_excluded=False, lte_excluded=False):
-        for val in self._btree.values(gte, lte, gte_excluded, lte_excluded):
-            for _ in val:
-                yield _
+    def search_by_key_range(
+        self,
+        gte=None,
+        lte=None,
+        gte_excluded=False,
+        lte_excluded=False,
+        reverse=False,
+        items=False,
+    ):
+        if reverse:
+            seq = btree_reversed_iter(self._btree, gte, lte, gte_excluded, lte_excluded, items)
+        elif items:
+            seq = self._btree.items(gte, lte, gte_excluded, lte_excluded)
+        else:
+            seq = self._btree.values(gte, lte, gte_excluded, lte_excluded)
+
+        if items:
+            for key, val in seq:
+                for _ in bucket_iter(val):
+                    yield key, _
+        else:
+            for val in seq:
+                for _ in bucket_iter(val):
+                    yield _
 
     def upsert(self, old, new, uid):
         if old != new:
             old_existing = self._btree.get(old, EMPTY)
 
-            if old_existing != EMPTY and uid in old_existing:
-                if len(old_existing) == 1:
-                    self._btree.pop(old)
-                else:
-                    old_existing.remove(uid)
+            if old_existing != EMPTY and bucket_contains(old_existing, uid):
+                self._set_bucket(old, old_existing, bucket_remove(old_existing, uid))
+
+                self._stats_count -= 1
 
         new_existing = self._btree.get(new, EMPTY)
 
         if new_existing == EMPTY:
-            self._btree.insert(new, {uid})
-        else:
-            new_existing.add(uid)
+            self._btree.insert(new, uid)
+
+            self._stats_count += 1
+        elif not bucket_contains(new_existing, uid):
+            self._set_bucket(new, new_existing, bucket_add(new_existing, uid))
+
+            self._stats_count += 1
+
+        self._stats_modified += 1
 
         return self
 
+    def _set_bucket(self, key, old_bucket, bucket):
+        if bucket is None:
+            self._btree.pop(key)
+        elif bucket is not old_bucket:
+            self._btree[key] = bucket
+
 
 class UdbBtreeEmbeddedIndex(UdbBtreeIndex, UdbBaseLinearEmbeddedIndex):
+    covering_scan_ops = ()
     type = 'btree_embedded'
 
     def delete(self, key_or_keys, uid=None):
         for key in key_or_keys:
             old_existing = self._btree.get(key, EMPTY)
 
-            if old_existing != EMPTY and uid in old_existing:
-                if len(old_existing) == 1:
-                    self._btree.pop(key)
-                else:
-                    old_existing.remove(uid)
+            if old_existing != EMPTY and bucket_contains(old_existing, uid):
+                self._set_bucket(key, old_existing, bucket_remove(old_existing, uid))
+
+                self._stats_count -= 1
+                self._stats_modified += 1
 
         return self
 
@@ -155,14 +302,26 @@ class UdbBtreeEmbeddedIndex(UdbBtreeIndex, UdbBaseLinearEmbeddedIndex):
             old_existing = self._btree.get(key, EMPTY)
 
             if old_existing == EMPTY:
-                self._btree.insert(key, {uid})
-            else:
-                old_existing.append(uid)
+                self._btree.insert(key, uid)
+
+                self._stats_count += 1
+            elif not bucket_contains(old_existing, uid):
+                self._set_bucket(key, old_existing, bucket_add(old_existing, uid))
+
+                self._stats_count += 1
+
+            self._stats_modified += 1
+
+        return self
+
+    def insert_many(self, items):
+        for key_or_keys, uid in items:
+            self.insert(key_or_keys, uid)
 
         return self
 
     def upsert(self, old, new, uid):
-        self.delete(old)
+        self.delete(old, uid)
         self.insert(new, uid)
 
         return self
@@ -0,0 +1,25 @@
+from .udb_base_int_index import UdbBaseIntIndex
+from .udb_btree_base_index import UdbBtreeBaseIndex
+from .udb_btree_index import UdbBtreeIndex
+
+
+class UdbBtreeIntBaseIndex(UdbBaseIntIndex, UdbBtreeBaseIndex):
+    type = 'btree_int_base'
+
+    def __init__(self, schema, name=None):
+        from BTrees.LLBTree import LLBTree
+
+        UdbBaseIntIndex.__init__(self, schema, name)
+
+        self._btree = LLBTree()
+
+
+class UdbBtreeIntIndex(UdbBaseIntIndex, UdbBtreeIndex):
+    type = 'btree_int'
+
+    def __init__(self, schema, name=None):
+        from BTrees.LOBTree import LOBTree
+
+        UdbBaseIntIndex.__init__(self, schema, name)
+
+        self._btree = LOBTree()
@@ -12,8 +12,23 @@ class UdbBtreeUniqBaseIndex(UdbBtreeBaseIndex):
 
         self._btree.insert(key, uid)
 
+        self._stats_count += 1
+        self._stats_modified += 1
+
         return self
 
+    def insert_many(self, items):
+        items = list(items)
+        keys = set()
+
+        for key, uid in items:
+            if key in keys or key in self._btree:
+                raise ConstraintError('duplicate value: {} on {}'.format(key, self.name))
+
+            keys.add(key)
+
+        return UdbBtreeBaseIndex.insert_many(self, items)
+
     def insert_is_allowed(self, key):
         if key in self._btree:
             raise ConstraintError('duplicate value: {} on {}'.format(key, self.name))
@@ -29,6 +44,8 @@ class UdbBtreeUniqBaseIndex(UdbBtreeBaseIndex):
 
         self._btree.insert(new, uid)
 
+        self._stats_modified += 1
+
         return self
 
     def upsert_is_allowed(self, old, new):
@@ -0,0 +1,154 @@
+from array import array
+from bisect import bisect_left
+
+
+# the sorted array is moved to the tree set once grown over, its insertion is linear to the size
+BUCKET_ARRAY_SIZE_MAX = 128
+
+
+def _create_tree_set(uids):
+    try:
+        from BTrees.LLBTree import LLTreeSet
+    except ImportError:
+        return set(uids)
+
+    return LLTreeSet(uids)
+
+
+def bucket_add(bucket, uid):
+    """
+    Adds the uid to the bucket of the multivalued index, the single uid is kept as is, the small buckets are kept as
+    the sorted arrays and the large ones as the tree sets.
+
+    :param bucket:
+    :param uid:
+
+    :return: bucket, the same one if changed in place
+    """
+    bucket_type = type(bucket)
+
+    if bucket_type is int:
+        if bucket == uid:
+            return bucket
+
+        return array('q', (bucket, uid) if bucket < uid else (uid, bucket))
+
+    if bucket_type is array:
+        pos = bisect_left(bucket, uid)
+
+        if pos < len(bucket) and bucket[pos] == uid:
+            return bucket
+
+        if len(bucket) < BUCKET_ARRAY_SIZE_MAX:
+            bucket.insert(pos, uid)
+
+            return bucket
+
+        bucket = _create_tree_set(bucket)
+
+    bucket.add(uid)
+
+    return bucket
+
+
+def bucket_update(bucket, uids):
+    """
+    Adds the uids to the bucket of the multivalued index at once.
+
+    :param bucket: Bucket or None to create the new one.
+    :param uids: List of uids or single uid.
+
+    :return: bucket, the same one if changed in place
+    """
+    if type(uids) is int:
+        return uids if bucket is None else bucket_add(bucket, uids)
+
+    if bucket is None:
+        uids = sorted(set(uids))
+    elif type(bucket) is int or type(bucket) is array:
+        uids = sorted(set(bucket_iter(bucket)).union(uids))
+    else:
+        bucket.update(uids)
+
+        return bucket
+
+    if len(uids) == 1:
+        return uids[0]
+
+    if len(uids) <= BUCKET_ARRAY_SIZE_MAX:
+        return array('q', uids)
+
+    return _create_tree_set(uids)
+
+
+def bucket_contains(bucket, uid):
+    bucket_type = type(bucket)
+
+    if bucket_type is int:
+        return bucket == uid
+
+    if bucket_type is array:
+        pos = bisect_left(bucket, uid)
+
+        return pos < len(bucket) and bucket[pos] == uid
+
+    return uid in bucket
+
+
+def bucket_iter(bucket):
+    return (bucket,) if type(bucket) is int else bucket
+
+
+def bucket_len(bucket):
+    return 1 if type(bucket) is int else len(bucket)
+
+
+def bucket_remove(bucket, uid):
+    """
+    Removes the uid from the bucket of the multivalued index.
+
+    :param bucket:
+    :param uid:
+
+    :return: bucket, the same one if changed in place, or None if the bucket is empty
+    """
+    bucket_type = type(bucket)
+
+    if bucket_type is int:
+        return None if bucket == uid else bucket
+
+    if bucket_type is array:
+        pos = bisect_left(bucket, uid)
+
+        if pos < len(bucket) and bucket[pos] == uid:
+            if len(bucket) == 2:
+                return bucket[1 - pos]
+
+            del bucket[pos]
+
+        return bucket
+
+    if uid in bucket:
+        bucket.remove(uid)
+
+    return bucket if bucket else None
+
+
+def bucket_snapshot(bucket):
+    """
+    Gets the picklable bucket, the tree set is flattened since its pickling recurses over its chain of buckets.
+
+    :param bucket:
+
+    :return:
+    """
+    bucket_type = type(bucket)
+
+    return bucket if bucket_type is int or bucket_type is array else list(bucket)
+
+
+def bucket_from_snapshot(bucket):
+    if type(bucket) is list:
+        return _create_tree_set(bucket)
+
+    return bucket
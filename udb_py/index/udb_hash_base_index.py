@@ -13,6 +13,10 @@ class UdbHashBaseIndex(UdbBaseLinearIndex):
     def __len__(self):
         return len(self._hash)
 
+    @property
+    def _stats_count(self):
+        return len(self._hash)
+
     def clear(self):
         self._hash.clear()
 
@@ -23,6 +27,27 @@ class UdbHashBaseIndex(UdbBaseLinearIndex):
 
         return self
 
+    def count_by_key_eq(self, key):
+        return 1 if key in self._hash else 0
+
+    def estimate_by_key_eq(self, key):
+        return 1 if key in self._hash else 0
+
+    # the hash is not searched by "$ne" and "$nin", so they are not estimated to be chosen for the scan
+    def estimate_by_key_ne(self, key):
+        return None
+
+    def estimate_by_key_nin(self, keys):
+        return None
+
+    def get_snapshot(self):
+        return dict(self._hash)
+
+    def load_snapshot(self, snapshot):
+        self._hash = snapshot
+
+        return self
+
     def insert(self, key_or_keys, uid):
         self._hash[key_or_keys] = uid
 
@@ -1,5 +1,15 @@
 from ..common import EMPTY
 from .udb_base_linear_index import UdbBaseLinearIndex, UdbBaseLinearEmbeddedIndex
+from .udb_bucket import (
+    bucket_add,
+    bucket_contains,
+    bucket_from_snapshot,
+    bucket_iter,
+    bucket_len,
+    bucket_remove,
+    bucket_snapshot,
+    bucket_update,
+)
 
 
 class UdbHashIndex(UdbBaseLinearIndex):
@@ -17,16 +27,39 @@ class UdbHashIndex(UdbBaseLinearIndex):
     def clear(self):
         self._hash.clear()
 
+        self._stats_count = 0
+
         return self
 
     def delete(self, key, uid):
         old_existing = self._hash.get(key, EMPTY)
 
-        if old_existing != EMPTY and uid in old_existing:
-            if len(old_existing) == 1:
-                self._hash.pop(key)
-            else:
-                old_existing.remove(uid)
+        if old_existing != EMPTY and bucket_contains(old_existing, uid):
+            self._set_bucket(key, bucket_remove(old_existing, uid))
+
+            self._stats_count -= 1
+
+        return self
+
+    def count_by_key_eq(self, key):
+        return bucket_len(self._hash.get(key, ()))
+
+    def estimate_by_key_eq(self, key):
+        return bucket_len(self._hash.get(key, ()))
+
+    # the hash is not searched by "$ne" and "$nin", so they are not estimated to be chosen for the scan
+    def estimate_by_key_ne(self, key):
+        return None
+
+    def estimate_by_key_nin(self, keys):
+        return None
+
+    def get_snapshot(self):
+        return [{key: bucket_snapshot(val) for key, val in self._hash.items()}, self._stats_count]
+
+    def load_snapshot(self, snapshot):
+        self._hash = {key: bucket_from_snapshot(val) for key, val in snapshot[0].items()}
+        self._stats_count = snapshot[1]
 
         return self
 
@@ -34,9 +67,37 @@ class UdbHashIndex(UdbBaseLinearIndex):
         old_existing = self._hash.get(key, EMPTY)
 
         if old_existing == EMPTY:
-            self._hash[key] = {uid}
-        else:
-            old_existing.add(uid)
+            self._hash[key] = uid
+
+            self._stats_count += 1
+        elif not bucket_contains(old_existing, uid):
+            self._hash[key] = bucket_add(old_existing, uid)
+
+            self._stats_count += 1
+
+        return self
+
+    def insert_many(self, items):
+        batch = {}
+        count = 0
+
+        # the uids are grouped by the keys and put into the buckets at once
+        for key, uid in items:
+            uids = batch.get(key, EMPTY)
+
+            if uids == EMPTY:
+                batch[key] = uid
+            elif type(uids) is list:
+                uids.append(uid)
+            else:
+                batch[key] = [uids, uid]
+
+            count += 1
+
+        hash_get = self._hash.get
+
+        self._hash.update({key: bucket_update(hash_get(key), uids) for key, uids in batch.items()})
+        self._stats_count += count
 
         return self
 
@@ -44,7 +105,7 @@ class UdbHashIndex(UdbBaseLinearIndex):
         val = self._hash.get(key, EMPTY)
 
         if val != EMPTY:
-            for _ in val:
+            for _ in bucket_iter(val):
                 yield _
 
     def search_by_key_in(self, keys):
@@ -52,28 +113,37 @@ class UdbHashIndex(UdbBaseLinearIndex):
             val = self._hash.get(key, EMPTY)
 
             if val != EMPTY:
-                for _ in val:
+                for _ in bucket_iter(val):
                     yield _
 
     def upsert(self, old, new, uid):
         if old != new:
             old_existing = self._hash.get(old, EMPTY)
 
-            if old_existing != EMPTY and uid in old_existing:
-                if len(old_existing) == 1:
-                    self._hash.pop(old)
-                else:
-                    old_existing.remove(uid)
+            if old_existing != EMPTY and bucket_contains(old_existing, uid):
+                self._set_bucket(old, bucket_remove(old_existing, uid))
+
+                self._stats_count -= 1
 
         new_existing = self._hash.get(new, EMPTY)
 
         if new_existing == EMPTY:
-            self._hash[new] = {uid}
-        else:
-            new_existing.add(uid)
+            self._hash[new] = uid
+
+            self._stats_count += 1
+        elif not bucket_contains(new_existing, uid):
+            self._hash[new] = bucket_add(new_existing, uid)
+
+            self._stats_count += 1
 
         return self
 
+    def _set_bucket(self, key, bucket):
+        if bucket is None:
+            self._hash.pop(key)
+        else:
+            self._hash[key] = bucket
+
 
 class UdbHashEmbeddedIndex(UdbHashIndex, UdbBaseLinearEmbeddedIndex):
     embedded = 'hash_embedded'
@@ -83,11 +153,10 @@ class UdbHashEmbeddedIndex(UdbHashIndex, UdbBaseLinearEmbeddedIndex):
         for key in key_or_keys:
             old_existing = self._hash.get(key, EMPTY)
 
-            if old_existing != EMPTY and uid in old_existing:
-                if len(old_existing) == 1:
-                    self._hash.pop(key)
-                else:
-                    old_existing.remove(uid)
+            if old_existing != EMPTY and bucket_contains(old_existing, uid):
+                self._set_bucket(key, bucket_remove(old_existing, uid))
+
+                self._stats_count -= 1
 
         return self
 
@@ -96,14 +165,24 @@ class UdbHashEmbeddedIndex(UdbHashIndex, UdbBaseLinearEmbeddedIndex):
             old_existing = self._hash.get(key, EMPTY)
 
             if old_existing == EMPTY:
-                self._hash[key] = {uid}
-            else:
-                old_existing.append(uid)
+                self._hash[key] = uid
+
+                self._stats_count += 1
+            elif not bucket_contains(old_existing, uid):
+                self._hash[key] = bucket_add(old_existing, uid)
+
+                self._stats_count += 1
+
+        return self
+
+    def insert_many(self, items):
+        for key_or_keys, uid in items:
+            self.insert(key_or_keys, uid)
 
         return self
 
     def upsert(self, old, new, uid):
-        self.delete(old)
+        self.delete(old, uid)
         self.insert(new, uid)
 
         return self
@@ -2,6 +2,9 @@ from ..common import EMPTY
 from .udb_base_geo_index import UdbBaseGEOIndex
 
 
+_INF = float('inf')
+
+
 class UdbRtreeIndex(UdbBaseGEOIndex):
     is_prefixed = False
     is_ranged = False
@@ -27,11 +30,31 @@ class UdbRtreeIndex(UdbBaseGEOIndex):
 
         return self
 
+    def estimate_by_intersection(self, p_x_min, p_y_min, p_x_max, p_y_max):
+        return self._rtree.count((p_x_min, p_y_min, p_x_max, p_y_max))
+
+    def get_snapshot(self):
+        return [
+            (item.id, item.bbox[:2])
+            for item in self._rtree.intersection((-_INF, -_INF, _INF, _INF), objects=True)
+        ]
+
     def insert(self, key, uid):
         self._rtree.insert(uid, (key[0], key[1], key[0], key[1]))
 
         return self
 
+    def load_snapshot(self, snapshot):
+        from rtree import index
+
+        if snapshot:
+            # the bulk loading is way faster than the sequential insertion
+            self._rtree = index.Index(((uid, (x, y, x, y), None) for uid, (x, y) in snapshot))
+        else:
+            self._rtree = index.Index()
+
+        return self
+
     def search_by_intersection(self, p_x_min, p_y_min, p_x_max, p_y_max):
         return self._rtree.intersection((p_x_min, p_y_min, p_x_max, p_y_max))
 
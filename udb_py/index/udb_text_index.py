@@ -64,6 +64,14 @@ class UdbTextIndex(UdbBaseTextIndex):
 
         return self
 
+    def get_snapshot(self):
+        if self._whoosh_writer:
+            self._whoosh_writer.commit(optimize=True)
+            self._whoosh_writer = None
+            self._whoosh_writer_opened_by = None
+
+        return dict(self._whoosh_storage.files)
+
     def insert(self, key_dict, uid):
         if key_dict:
             if self._whoosh_writer_opened_by != WRITER_OPENED_BY_INSERT:
@@ -77,6 +85,17 @@ class UdbTextIndex(UdbBaseTextIndex):
 
         return self
 
+    def load_snapshot(self, snapshot):
+        if self._whoosh_writer:
+            self._whoosh_writer.cancel()
+            self._whoosh_writer = None
+            self._whoosh_writer_opened_by = None
+
+        self._whoosh_storage.files = dict(snapshot)
+        self._whoosh_index = self._whoosh_storage.open_index()
+
+        return self
+
     def search_by_text(self, q):
         if self._whoosh_writer:
             self._whoosh_writer.commit(optimize=True)
@@ -1,2 +1,3 @@
 from .udb_json_file_storage import UdbJsonFileStorage
+from .udb_json_lines_file_storage import UdbJsonLinesFileStorage
 from .udb_wal_storage import UdbWalStorage
@@ -1,7 +1,17 @@
 import json
 import os
 
-from ..udb_storage import UdbStorage
+from ..udb_storage import (
+    DEFAULT_BLOCK_SIZE,
+    UdbStorage,
+    fsync_file,
+    get_compression_ext,
+    get_indexes_snapshot,
+    open_compressed,
+    read_snapshot,
+    remove_compressed_files,
+    write_snapshot,
+)
 
 
 BUILT_IN_TYPES = {
@@ -17,42 +27,98 @@ BUILT_IN_TYPES = {
 
 
 class UdbJsonFileStorage(UdbStorage):
+    _block_size = DEFAULT_BLOCK_SIZE
+    _compression = None
+    _compression_ext = ''
+    _ext = '.json'
     _name = None
 
-    def __init__(self, name):
+    def __init__(self, name, compression=None, block_size=DEFAULT_BLOCK_SIZE):
+        """
+        :param name:
+        :param compression: "bz2", "lzma" or "zlib" compression of the data and the snapshot files.
+        :param block_size: Block size in bytes the files are streamed through.
+        """
+        self._block_size = block_size
+        self._compression = compression
+        self._compression_ext = get_compression_ext(compression)
+        self._ext = self._ext + self._compression_ext
         self._name = name
 
     def is_available(self):
-        return os.path.isfile(self._name + '.json')
+        return os.path.isfile(self._name + self._ext)
 
     def drop(self):
-        if os.path.isfile(self._name + '.json'):
-            os.remove(self._name + '.json')
+        if os.path.isfile(self._name + self._ext):
+            os.remove(self._name + self._ext)
+
+        remove_compressed_files(self._name + '.snapshot')
 
         return self
 
     def load(self):
         if self.is_available():
-            with open(self._name + '.json', 'r') as file_r_desc:
-                data = json.load(file_r_desc)
+            data = self._read_data()
+
+            snapshot = read_snapshot(self._name + '.snapshot')
+
+            if snapshot and snapshot['data_stat'] == self._get_data_stat():
+                data['snapshot'] = {
+                    'delta': {},
+                    'indexes': snapshot['indexes'],
+                    'revision': snapshot['revision'],
+                }
 
             return data
 
         return {'indexes': {}, 'revision': 0, 'data': {}}
 
     def save(self, indexes, revision, data):
-        with open(self._name + '.json', 'w+') as file_w_desc:
-            json.dump({
-                'indexes': {k: [v.type, v.get_meta()] for k, v in indexes.items()},
-                'revision': revision,
-                'data': data,
-            }, file_w_desc, indent=2)
+        remove_compressed_files(self._name + '.snapshot')
+
+        # the data file is replaced at once, so the interrupted save leaves the previous one intact
+        with self._open_data(self._name + self._ext + '.tmp', 'w') as file_w_desc:
+            self._write_data(file_w_desc, {k: [v.type, v.get_meta()] for k, v in indexes.items()}, revision, data)
+
+        fsync_file(self._name + self._ext + '.tmp')
+        os.replace(self._name + self._ext + '.tmp', self._name + self._ext)
 
         return True
 
     def save_meta(self, indexes, revision):
         return self
 
+    def save_snapshot(self, indexes, revision, data):
+        self.save(indexes, revision, data)
+
+        # the snapshot is bound to the saved data file, any other save makes it outdated
+        write_snapshot(self._name + '.snapshot', {
+            'data_stat': self._get_data_stat(),
+            'indexes': get_indexes_snapshot(indexes),
+            'revision': revision,
+        }, self._compression)
+
+        return True
+
+    def _get_data_stat(self):
+        stat = os.stat(self._name + self._ext)
+
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def _open_data(self, name, mode):
+        return open_compressed(name, mode, self._compression, self._block_size)
+
+    def _read_data(self):
+        with self._open_data(self._name + self._ext, 'r') as file_r_desc:
+            return json.load(file_r_desc)
+
+    def _write_data(self, file_w_desc, indexes, revision, data):
+        json.dump({
+            'indexes': indexes,
+            'revision': revision,
+            'data': data,
+        }, file_w_desc, indent=2)
+
 
 def _encode(value):
     if type(value) in BUILT_IN_TYPES:
@@ -0,0 +1,43 @@
+import itertools
+import json
+
+from .udb_json_file_storage import UdbJsonFileStorage
+
+
+_READ_BATCH_SIZE = 10000
+
+
+class UdbJsonLinesFileStorage(UdbJsonFileStorage):
+    """
+    Stores the indexes and the revision in the first line of the file and every record in the separate line, so the
+    records are written and loaded one by one without the whole document in memory.
+    """
+    _ext = '.jsonl'
+
+    def _read_data(self):
+        with self._open_data(self._name + self._ext, 'r') as file_r_desc:
+            header = json.loads(file_r_desc.readline())
+
+        return {
+            'indexes': header['indexes'],
+            'revision': header['revision'],
+            'data': self._read_records(),
+        }
+
+    def _write_data(self, file_w_desc, indexes, revision, data):
+        file_w_desc.write(json.dumps({'indexes': indexes, 'revision': revision}) + '\n')
+        file_w_desc.writelines(json.dumps([rid, record]) + '\n' for rid, record in data.items())
+
+    def _read_records(self):
+        with self._open_data(self._name + self._ext, 'r') as file_r_desc:
+            file_r_desc.readline()
+
+            while True:
+                lines = list(itertools.islice(file_r_desc, _READ_BATCH_SIZE))
+
+                if not lines:
+                    break
+
+                # the batch of the lines is decoded as the single array at once
+                for rid, record in json.loads('[' + ','.join(lines) + ']'):
+                    yield rid, record
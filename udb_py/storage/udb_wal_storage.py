@@ -1,14 +1,77 @@
+import atexit
+import concurrent.futures
 import json
 import logging
+import lzma
+import mmap
 import os
+import queue
 import struct
-
-from ..udb_storage import UdbStorage
+import threading
+import time
+import zlib
+
+from ..udb_storage import (
+    DEFAULT_BLOCK_SIZE,
+    UdbStorage,
+    find_compressed_file,
+    fsync_file,
+    get_compression_ext,
+    get_file_compression,
+    get_indexes_snapshot,
+    open_compressed,
+    read_snapshot,
+    remove_compressed_files,
+    write_snapshot,
+)
 
 
 _DELETE_OP = 0
+_FRAME_CHECKSUM = struct.Struct('I')
+# the frames of the previous versions have no checksum
+_FRAME_CHECKSUM_FLAG = 0x08
+_FRAME_HEADER = struct.Struct('BIB')
+_FRAME_VALUE_LENGTH = struct.Struct('I')
 _INSERT_OP = 1
 _UPDATE_OP = 2
+_WAL_BUFFER_SIZE = 1 << 16
+_WRITER_GROUP_SIZE = 1024
+
+CODEC_JSON = 'json'
+CODEC_MSGPACK = 'msgpack'
+CODEC_STRUCT = 'struct'
+# the codec id is kept in the high bits of the op byte of the frame header, the frames of the previous versions are JSON
+_CODEC_IDS = {CODEC_JSON: 0, CODEC_STRUCT: 1, CODEC_MSGPACK: 2}
+
+# the value of the struct codec is the tag byte followed by the little-endian payload, the containers are followed by
+# their items
+_STRUCT_FLOAT = struct.Struct('<Bd')
+_STRUCT_INT = struct.Struct('<Bq')
+_STRUCT_INT_MAX = (1 << 63) - 1
+_STRUCT_INT_MIN = - (1 << 63)
+_STRUCT_LENGTH = struct.Struct('<BI')
+_STRUCT_SHORT_LENGTH = struct.Struct('<BB')
+_STRUCT_TAG_BIG_INT = 0x49  # I
+_STRUCT_TAG_BYTES = 0x62  # b
+_STRUCT_TAG_DICT = 0x6d  # m
+_STRUCT_TAG_FALSE = 0x46  # F
+_STRUCT_TAG_FLOAT = 0x64  # d
+_STRUCT_TAG_INT = 0x69  # i
+_STRUCT_TAG_LIST = 0x6c  # l
+_STRUCT_TAG_NONE = 0x4e  # N
+_STRUCT_TAG_SHORT_STR = 0x53  # S
+_STRUCT_TAG_STR = 0x73  # s
+_STRUCT_TAG_TRUE = 0x54  # T
+_STRUCT_FALSE = bytes((_STRUCT_TAG_FALSE,))
+_STRUCT_NONE = bytes((_STRUCT_TAG_NONE,))
+_STRUCT_TRUE = bytes((_STRUCT_TAG_TRUE,))
+
+
+DURABILITY_BATCH = 'batch'
+DURABILITY_INTERVAL = 'interval'
+DURABILITY_NONE = 'none'
+DURABILITY_OP = 'op'
+_DURABILITIES = (DURABILITY_BATCH, DURABILITY_INTERVAL, DURABILITY_NONE, DURABILITY_OP)
 
 
 class CorruptedWalError(Exception):
@@ -21,40 +84,201 @@ class FSWalError(Exception):
 
 class UdbWalStorage(UdbStorage):
     _allow_corrupted_wal = False
+    _block_size = DEFAULT_BLOCK_SIZE
+    _checkpoint_size = None
+    _codec_id = 0
+    _compression = None
+    _compression_ext = ''
+    _decode = None
+    _encode = None
+    _durable_condition = None
+    _durable_revision = -1
+    _durability = DURABILITY_NONE
     _file_wal = None
+    _fsync_interval = None
+    _is_checkpoint_required = False
+    _manifest = None
     _name = None
+    _queue = None
+    _queue_size = None
     _revision = -1
+    _segment_size = None
+    _wal_buffer = None
+    _wal_buffer_revision = -1
+    _wal_buffer_size = 0
+    _wal_is_dirty = False
+    _wal_lock = None
+    _wal_segment_size = 0
+    _wal_size = 0
+    _wal_synced_at = 0
+    _wal_written_revision = -1
+    _workers = None
+    _writer = None
+    _writer_error = None
+
+    def __init__(
+        self,
+        name,
+        allow_corrupted_wal=False,
+        checkpoint_size=None,
+        segment_size=None,
+        workers=None,
+        durability=DURABILITY_NONE,
+        fsync_interval=1000,
+        queue_size=None,
+        codec=CODEC_JSON,
+        compression=None,
+        block_size=DEFAULT_BLOCK_SIZE,
+    ):
+        """
+        :param name:
+        :param allow_corrupted_wal:
+        :param checkpoint_size: WAL size in bytes the checkpoint is required after.
+        :param segment_size: WAL segment size in bytes the segment is sealed after.
+        :param workers: Number of processes decoding the WAL segments on load.
+        :param durability: "none" - no fsync, "interval" - fsync every fsync_interval ms, "batch" - fsync per write
+            operation, "op" - fsync per WAL op.
+        :param fsync_interval: Interval in ms of the "interval" durability.
+        :param queue_size: Number of WAL ops queued for the background writer, the writing op blocks while the queue
+            is full. The ops are written by the caller if None.
+        :param codec: "json" - JSON, "struct" - built-in binary encoding of the primitive types, "msgpack" - MessagePack
+            (requires msgpack package). The WAL written by any codec is readable whatever the codec is.
+        :param compression: "bz2", "lzma" or "zlib" compression of the snapshot and the segments sealed by the size.
+        :param block_size: Block size in bytes the compressed files are streamed through.
+        """
+        if durability not in _DURABILITIES:
+            raise ValueError('unknown durability: {}'.format(durability))
+
+        if codec not in _CODEC_IDS:
+            raise ValueError('unknown codec: {}'.format(codec))
+
+        self._codec_id = _CODEC_IDS[codec]
+        self._compression = compression
+        self._compression_ext = get_compression_ext(compression)
+        self._encode, self._decode = _get_codec(self._codec_id)
 
-    def __init__(self, name, allow_corrupted_wal=False):
         self._allow_corrupted_wal = allow_corrupted_wal
+        self._block_size = block_size
+        self._checkpoint_size = checkpoint_size
+        self._durable_condition = threading.Condition()
+        self._durability = durability
+        self._fsync_interval = fsync_interval / 1000.0
         self._name = name
+        self._queue_size = queue_size
+        self._segment_size = segment_size
+        self._wal_buffer = []
+        self._wal_lock = threading.RLock()
+        self._workers = workers
 
     def is_available(self):
-        return os.path.isfile(self._name + '.wal.data') or os.path.isfile(self._name + '.wal.data.bak')
+        return os.path.isfile(self._name + '.wal.data') \
+            or os.path.isfile(self._name + '.wal.data.bak') \
+            or os.path.isfile(self._name + '.wal.manifest') \
+            or find_compressed_file(self._name + '.wal.snapshot') is not None
 
     def is_capture_events(self):
         return True
 
+    def is_checkpoint_required(self):
+        return self._is_checkpoint_required \
+            or self._checkpoint_size is not None and self._wal_size >= self._checkpoint_size
+
+    def close(self):
+        """
+        Writes the queued WAL ops, stops the background writer and closes the WAL.
+
+        :return:
+        """
+        self._wal_drain()
+        self._wal_close()
+
+        if self._writer:
+            self._queue.put(None)
+            self._writer.join()
+
+            self._writer = None
+
+        return self
+
+    def commit(self):
+        # the background writer commits the groups of the queued ops by itself
+        if not self._writer:
+            self._wal_commit()
+
+        return self
+
+    def flush(self):
+        """
+        Writes and fsyncs all WAL ops performed so far whatever the durability is.
+
+        :return:
+        """
+        self._wal_drain()
+
+        with self._wal_lock:
+            if self._file_wal:
+                self._wal_flush(True)
+
+        return self
+
+    def wait_durable(self, revision, timeout=None):
+        """
+        Waits until the WAL ops of the records up to the revision are fsynced. The background writer is waited for
+        on the "batch" and "op" durability, the WAL is flushed otherwise.
+
+        :param revision:
+        :param timeout: Timeout in seconds of waiting for the background writer.
+
+        :return: False if the timeout has expired.
+        """
+        if self._durable_revision >= revision:
+            return True
+
+        if self._writer and self._durability in (DURABILITY_BATCH, DURABILITY_OP):
+            with self._durable_condition:
+                is_durable = self._durable_condition.wait_for(
+                    lambda: self._durable_revision >= revision or self._writer_error is not None,
+                    timeout,
+                )
+
+            self._raise_writer_error()
+
+            return is_durable
+
+        self.flush()
+
+        return True
+
     def drop(self):
+        self._wal_drain()
         self._wal_close()
 
-        if os.path.isfile(self._name + '.wal.data'):
-            os.remove(self._name + '.wal.data')
+        for number in self._read_manifest()['segments']:
+            self._remove_segment(number)
 
-        if os.path.isfile(self._name + '.wal.data.bak'):
-            os.remove(self._name + '.wal.data.bak')
+        for ext in ('.wal.data', '.wal.data.bak', '.wal.manifest', '.wal.meta'):
+            if os.path.isfile(self._name + ext):
+                os.remove(self._name + ext)
 
-        if os.path.isfile(self._name + '.wal.meta'):
-            os.remove(self._name + '.wal.meta')
+        remove_compressed_files(self._name + '.wal.snapshot')
+
+        self._durable_revision = self._wal_buffer_revision = self._wal_written_revision = -1
+        self._manifest = None
 
         return self
 
     def load(self):
+        self._wal_drain()
         self._wal_close()
 
+        self._is_checkpoint_required = False
+        self._manifest = self._read_manifest()
         self._revision = -1
+        self._wal_segment_size = 0
+        self._wal_size = 0
 
         indexes = {}
+        snapshot = None
 
         if self.is_available():
             if os.path.isfile(self._name + '.wal.meta'):
@@ -63,44 +287,110 @@ class UdbWalStorage(UdbStorage):
 
                 indexes = meta['indexes']
 
-            if not os.path.isfile(self._name + '.wal.data.bak'):
-                with open(self._name + '.wal.data', 'rb') as file_r_desc:
-                    with open(self._name + '.wal.data.bak', 'wb') as file_w_desc:
-                        chunk = file_r_desc.read(1024 * 1024 * 16)
+            # the backup of the WAL left by the interrupted repacking of the previous versions is the complete one
+            if os.path.isfile(self._name + '.wal.data.bak'):
+                os.replace(self._name + '.wal.data.bak', self._name + '.wal.data')
+
+            snapshot = read_snapshot(self._name + '.wal.snapshot')
 
-                        while chunk:
-                            if file_w_desc.write(chunk) != len(chunk):
-                                os.remove(self._name + '.wal.data.bak')
+            if snapshot:
+                collection = {int(k): v for k, v in json.loads(snapshot['data'].decode('utf-8')).items()}
+                delta = {}
+            else:
+                collection = {}
+                delta = None
 
-                                raise FSWalError(self._name + '.wal.data')
+            segment_names = self._get_segment_names_after(snapshot['segment'] if snapshot else 0)
 
-                            chunk = file_r_desc.read(1024 * 1024 * 16)
+            if os.path.isfile(self._name + '.wal.data'):
+                segment_names.append(self._name + '.wal.data')
 
-            logging.debug('%s.wal.data replaying', self._name)
+            del_upd_count = 0
 
-            collection, del_upd_count = self._wal_read(open(self._name + '.wal.data.bak', 'rb'))
+            logging.debug('%s.wal.data replaying %i segments', self._name, len(segment_names))
 
-            logging.debug('%s.wal.data replayed, %i total records', self._name, len(collection))
+            if self._workers and self._workers > 1 and len(segment_names) > 1:
+                executor = concurrent.futures.ProcessPoolExecutor(self._workers)
+                segments = executor.map(
+                    _read_segment,
+                    segment_names,
+                    [self._allow_corrupted_wal] * len(segment_names),
+                    [self._block_size] * len(segment_names),
+                )
+            else:
+                executor = None
+                segments = (
+                    _read_segment(name, self._allow_corrupted_wal, self._block_size) for name in segment_names
+                )
+
+            try:
+                # the segments are decoded independently, every op holds the whole record, so the latest state wins
+                for ind, (name, (records, segment_del_upd_count, segment_revision, truncate_size)) in enumerate(zip(
+                    segment_names, segments
+                )):
+                    for rid, record in records.items():
+                        if delta is not None and rid not in delta:
+                            delta[rid] = collection.get(rid)
+
+                        if record is None:
+                            collection.pop(rid, None)
+                        else:
+                            collection[rid] = record
 
-            if del_upd_count or not os.path.isfile(self._name + '.wal.data'):
-                logging.debug('%s.wal.data repacking', self._name)
+                    del_upd_count += segment_del_upd_count
 
-                self._file_wal = open(self._name + '.wal.data', 'wb+')
+                    self._revision = max(self._revision, segment_revision)
 
-                for rid, record in collection.items():
-                    self.on_insert(int(rid), record)
+                    # the corrupted tail is cut off, so the ops written after it are not lost on the next load, the ops
+                    # of the later segments follow the lost ones, so they are not replayed over the gap and removed
+                    if truncate_size is not None:
+                        logging.warning('%s is truncated to %i bytes', name, truncate_size)
 
-                self._wal_close()
+                        self._truncate_segment(name, truncate_size)
 
-                logging.debug('%s.wal.data repacked', self._name)
+                        for later_name in segment_names[ind + 1:]:
+                            logging.warning('%s is removed following the truncated segment', later_name)
+
+                            os.remove(later_name)
+
+                        segment_names = segment_names[:ind + 1]
+
+                        break
+            finally:
+                if executor:
+                    executor.shutdown()
+
+            for name in segment_names:
+                self._wal_size += os.path.getsize(name)
+
+            logging.debug('%s.wal.data replayed, %i total records', self._name, len(collection))
 
-            os.remove(self._name + '.wal.data.bak')
+            # the deleted and updated records are compacted by the checkpoint as the repacking did before
+            self._is_checkpoint_required = del_upd_count > 0
+
+            if snapshot:
+                self._revision = max(self._revision, snapshot['revision'] - 1)
+
+                snapshot = {
+                    'delta': delta,
+                    'indexes': snapshot['indexes'],
+                    'revision': snapshot['revision'],
+                }
         else:
             collection = {}
 
         self._wal_open()
 
-        return {'indexes': indexes, 'revision': self._revision + 1, 'data': collection}
+        self._wal_segment_size = os.path.getsize(self._name + '.wal.data')
+        # the replayed ops are on the disk already
+        self._durable_revision = self._wal_buffer_revision = self._wal_written_revision = self._revision
+
+        data = {'indexes': indexes, 'revision': self._revision + 1, 'data': collection}
+
+        if snapshot:
+            data['snapshot'] = snapshot
+
+        return data
 
     def save(self, indexes, revision, data):
         return self
@@ -115,6 +405,38 @@ class UdbWalStorage(UdbStorage):
 
         return True
 
+    def save_snapshot(self, indexes, revision, data):
+        """
+        Checkpoints the WAL: the data and the indexes are saved into the snapshot along with the sealed WAL segments
+        it covers, the covered segments are deleted then.
+
+        :param indexes:
+        :param revision:
+        :param data:
+
+        :return:
+        """
+        self._wal_drain()
+        self._wal_rotate()
+
+        logging.debug('%s.wal.snapshot saving', self._name)
+
+        write_snapshot(self._name + '.wal.snapshot', {
+            'data': json.dumps(data).encode('utf-8'),
+            'indexes': get_indexes_snapshot(indexes),
+            'revision': revision,
+            'segment': self._manifest['last'],
+        }, self._compression)
+
+        logging.debug('%s.wal.snapshot saved', self._name)
+
+        self._get_segment_names_after(self._manifest['last'])
+
+        self._is_checkpoint_required = False
+        self._wal_size = 0
+
+        return True
+
     def on_delete(self, rid):
         if self._file_wal:
             self._wal_write(_DELETE_OP, rid)
@@ -123,116 +445,679 @@ class UdbWalStorage(UdbStorage):
 
     def on_insert(self, rid, record):
         if self._file_wal:
-            self._wal_write(_INSERT_OP, rid, record)
+            self._wal_write_packed(self._wal_pack(_INSERT_OP, rid, record), rid)
+
+        return self
+
+    def on_insert_many(self, records):
+        if self._file_wal:
+            packed = b''.join([self._wal_pack(_INSERT_OP, rid, record) for rid, record in records])
+
+            self._wal_write_packed(packed, records[-1][0] if records else None)
 
         return self
 
     def on_update(self, rid, record, values):
         if self._file_wal:
-            self._wal_write(_UPDATE_OP, rid, record, values)
+            self._wal_write_packed(self._wal_pack(_UPDATE_OP, rid, record, values), values.get('__rev__'))
 
         return self
 
+    def _compress_segment(self, number):
+        """
+        Compresses the sealed segment replacing the plain one.
+
+        :param number:
+
+        :return:
+        """
+        name = self._get_segment_name(number)
+
+        with open(name, 'rb') as file_r_desc, \
+                open_compressed(name + self._compression_ext + '.tmp', 'wb', self._compression, self._block_size) \
+                as file_w_desc:
+            while True:
+                chunk = file_r_desc.read(self._block_size)
+
+                if not chunk:
+                    break
+
+                file_w_desc.write(chunk)
+
+        # both the plain and the compressed segments are complete if interrupted before the plain one is removed
+        fsync_file(name + self._compression_ext + '.tmp')
+        os.replace(name + self._compression_ext + '.tmp', name + self._compression_ext)
+        os.remove(name)
+
+    def _find_segment_name(self, number):
+        """
+        Finds the file of the segment, the plain or compressed by any compression.
+
+        :param number:
+
+        :return: None if absent
+        """
+        return find_compressed_file(self._get_segment_name(number))
+
+    def _get_segment_name(self, number):
+        return self._name + '.wal.data.' + str(number)
+
+    def _get_segment_names_after(self, number):
+        """
+        Gets the names of the sealed segments after the number, the segments up to it are deleted.
+
+        :param number:
+
+        :return:
+        """
+        segments = self._manifest['segments']
+
+        if segments and segments[0] <= number:
+            for covered_number in segments:
+                if covered_number <= number:
+                    self._remove_segment(covered_number)
+
+            self._manifest['segments'] = segments = [n for n in segments if n > number]
+
+            self._write_manifest()
+
+        # the segment listed by the manifest may be absent if the rotation has been interrupted before the sealing
+        return [name for name in map(self._find_segment_name, segments) if name]
+
+    def _remove_segment(self, number):
+        remove_compressed_files(self._get_segment_name(number))
+
+    def _raise_writer_error(self):
+        if self._writer_error is not None:
+            error, self._writer_error = self._writer_error, None
+
+            raise error
+
+    def _read_manifest(self):
+        if os.path.isfile(self._name + '.wal.manifest'):
+            with open(self._name + '.wal.manifest', 'r') as file_r_desc:
+                return json.load(file_r_desc)
+
+        return {'last': 0, 'segments': []}
+
+    def _write_manifest(self):
+        with open(self._name + '.wal.manifest.tmp', 'w') as file_w_desc:
+            json.dump(self._manifest, file_w_desc)
+
+            file_w_desc.flush()
+            os.fsync(file_w_desc.fileno())
+
+        os.replace(self._name + '.wal.manifest.tmp', self._name + '.wal.manifest')
+
+    def _truncate_segment(self, name, size):
+        """
+        Truncates the segment, the plain or compressed one, to the size of its data.
+
+        :param name:
+        :param size:
+
+        :return:
+        """
+        compression = get_file_compression(name)
+
+        if compression is None:
+            os.truncate(name, size)
+
+            return
+
+        with open_compressed(name, 'rb', compression, self._block_size) as file_r_desc, \
+                open_compressed(name + '.tmp', 'wb', compression, self._block_size) as file_w_desc:
+            while size > 0:
+                chunk = file_r_desc.read(min(size, self._block_size))
+
+                if not chunk:
+                    break
+
+                file_w_desc.write(chunk)
+                size -= len(chunk)
+
+        fsync_file(name + '.tmp')
+        os.replace(name + '.tmp', name)
+
     def _wal_close(self):
-        if self._file_wal:
-            self._file_wal.close()
+        with self._wal_lock:
+            if self._file_wal:
+                self._wal_flush(self._durability != DURABILITY_NONE)
+                self._file_wal.close()
+
+                self._file_wal = None
+
+                atexit.unregister(self.close)
+
+    def _wal_commit(self):
+        # the buffered ops are written on every commit, only the fsync depends on the durability
+        if self._wal_buffer:
+            if self._durability == DURABILITY_BATCH:
+                self._wal_flush(True)
+            elif self._durability == DURABILITY_INTERVAL:
+                self._wal_flush(time.monotonic() - self._wal_synced_at >= self._fsync_interval)
+            else:
+                self._wal_flush()
+
+    def _wal_drain(self):
+        """
+        Waits until the background writer has written all queued WAL ops.
+
+        :return:
+        """
+        if self._writer:
+            self._queue.join()
+
+        self._raise_writer_error()
+
+    def _wal_flush(self, fsync=False):
+        """
+        Writes the buffered WAL ops at once.
+
+        :param fsync: Fsync the written ops.
 
-            self._file_wal = None
+        :return:
+        """
+        if self._wal_buffer:
+            packed = b''.join(self._wal_buffer)
+
+            self._wal_buffer = []
+            self._wal_buffer_size = 0
+
+            if self._file_wal.write(packed) != len(packed):
+                raise FSWalError()
+
+            self._file_wal.flush()
+
+            self._wal_is_dirty = True
+            self._wal_written_revision = self._wal_buffer_revision
+
+        if fsync:
+            os.fsync(self._file_wal.fileno())
+
+            self._wal_is_dirty = False
+            self._wal_synced_at = time.monotonic()
+
+            with self._durable_condition:
+                self._durable_revision = self._wal_written_revision
+                self._durable_condition.notify_all()
+
+        return self
 
     def _wal_open(self):
         if not self._file_wal:
             self._file_wal = open(self._name + '.wal.data', 'ab+')
 
+            # the queued ops and the tail not synced yet by the "interval" durability are written on the exit if not
+            # closed, the daemon background writer is drained before it is killed
+            atexit.register(self.close)
+
         return self._file_wal
 
-    def _wal_read(self, file_descriptor):
-        collection = {}
-        del_upd_count = 0
+    def _wal_rotate(self, compress=False):
+        """
+        Seals the current WAL segment and starts the fresh one.
+
+        :param compress: Compress the sealed segment.
+
+        :return:
+        """
+        if self._manifest is None:
+            self._manifest = self._read_manifest()
+
+        with self._wal_lock:
+            self._wal_close()
+
+            if os.path.isfile(self._name + '.wal.data'):
+                number = self._manifest['last'] + 1
+
+                # the manifest goes first, so the interrupted rotation leaves the listed segment absent but never
+                # unlisted
+                self._manifest['last'] = number
+                self._manifest['segments'].append(number)
+
+                self._write_manifest()
+
+                os.replace(self._name + '.wal.data', self._get_segment_name(number))
+
+                if compress:
+                    self._compress_segment(number)
+
+            self._wal_open()
+            self._wal_segment_size = 0
+
+        return self
+
+    def _wal_pack(self, operation, rid, *values):
+        packed = [_FRAME_HEADER.pack(operation | _FRAME_CHECKSUM_FLAG | self._codec_id << 4, rid, len(values))]
+        encode = self._encode
+
+        for val in values:
+            val = encode(val)
+
+            packed.append(_FRAME_VALUE_LENGTH.pack(len(val)))
+            packed.append(val)
+
+        packed = b''.join(packed)
+
+        return packed + _FRAME_CHECKSUM.pack(zlib.crc32(packed))
+
+    def _wal_write(self, operation, rid, *values):
+        self._wal_write_packed(self._wal_pack(operation, rid, *values))
+
+    def _wal_write_packed(self, packed, revision=None):
+        """
+        Writes the packed WAL ops or queues them for the background writer.
 
+        :param packed:
+        :param revision: Revision of the last record of the ops if any.
+
+        :return:
+        """
+        if self._queue_size is None:
+            return self._wal_append(packed, revision)
+
+        self._raise_writer_error()
+
+        if not self._writer:
+            self._queue = queue.Queue(self._queue_size)
+            self._writer = threading.Thread(target=self._wal_writer_loop, name=self._name + '.wal.writer', daemon=True)
+            self._writer.start()
+
+        # the bounded queue blocks the writing op while the background writer lags behind
+        self._queue.put((packed, revision))
+
+    def _wal_writer_loop(self):
         while True:
-            chunk = file_descriptor.read(9)
+            try:
+                items = [self._queue.get(
+                    timeout=self._fsync_interval if self._durability == DURABILITY_INTERVAL else None
+                )]
+            except queue.Empty:
+                items = []
+
+            while items and len(items) < _WRITER_GROUP_SIZE:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                with self._wal_lock:
+                    for item in items:
+                        if item is not None:
+                            self._wal_append(*item)
 
-            if chunk and len(chunk) < 9:
-                self._wal_corrupted_warn()
+                    if not items:
+                        # the ops written while the queue is idle are synced once the interval has elapsed
+                        if self._file_wal and (self._wal_buffer or self._wal_is_dirty):
+                            self._wal_flush(True)
+                    else:
+                        # the group of the queued ops is committed at once as the write operation is by the caller
+                        self._wal_commit()
+            except Exception as e:
+                with self._durable_condition:
+                    self._writer_error = e
+                    self._durable_condition.notify_all()
+
+            for _ in items:
+                self._queue.task_done()
+
+            if None in items:
+                return
+
+    def _wal_append(self, packed, revision=None):
+        # the ops are grouped in the buffer to be written and synced at once
+        if revision is not None:
+            self._wal_buffer_revision = max(self._wal_buffer_revision, revision)
+
+        self._wal_buffer.append(packed)
+        self._wal_buffer_size += len(packed)
+        self._wal_size += len(packed)
+        self._wal_segment_size += len(packed)
+
+        if self._durability == DURABILITY_OP:
+            self._wal_flush(True)
+        elif self._durability == DURABILITY_INTERVAL and time.monotonic() - self._wal_synced_at >= self._fsync_interval:
+            self._wal_flush(True)
+        elif self._wal_buffer_size >= _WAL_BUFFER_SIZE:
+            self._wal_flush()
+
+        if self._segment_size is not None and self._wal_segment_size >= self._segment_size:
+            self._wal_rotate(self._compression is not None)
+
+
+def _read_segment(name, allow_corrupted_wal=False, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Decodes the WAL segment up to the first torn or corrupted frame.
+
+    :param name:
+    :param allow_corrupted_wal:
+    :param block_size: Block size in bytes the compressed segment is streamed through.
+
+    :return: (records by rid with None for the deleted ones, count of deletes and updates, max rid, size of the data
+        the segment is to be truncated to or None)
+    """
+    compression = get_file_compression(name)
+
+    if compression:
+        chunks = []
+        is_torn = False
+
+        try:
+            with open_compressed(name, 'rb', compression, block_size) as file_r_desc:
+                while True:
+                    chunk = file_r_desc.read(block_size)
+
+                    if not chunk:
+                        break
 
-                return collection, del_upd_count
+                    chunks.append(chunk)
+        except (EOFError, OSError, ValueError, lzma.LZMAError, zlib.error):
+            is_torn = True
 
-            if not chunk:
-                file_descriptor.close()
+        buffer = b''.join(chunks)
 
-                return collection, del_upd_count
+        with memoryview(buffer) as view:
+            records, del_upd_count, revision, valid_size = _read_frames(buffer, view)
 
-            operation, rid, _ = struct.unpack('BIB', chunk)
+        if is_torn or valid_size < len(buffer):
+            _wal_corrupted_warn(name, allow_corrupted_wal)
 
-            if operation == _DELETE_OP:
-                collection.pop(rid, None)
+            return records, del_upd_count, revision, valid_size
 
-                del_upd_count += 1
-            else:
-                if operation in (_INSERT_OP, _UPDATE_OP):
-                    chunk = file_descriptor.read(4)
+        return records, del_upd_count, revision, None
 
-                    if len(chunk) < 4:
-                        self._wal_corrupted_warn()
+    # the empty file can not be mapped
+    if not os.path.getsize(name):
+        return {}, 0, -1, None
 
-                        return collection, del_upd_count
+    # the frames are decoded from the mapped file in place, the values are decoded from the slices without copying
+    with open(name, 'rb') as file_r_desc, mmap.mmap(file_r_desc.fileno(), 0, access=mmap.ACCESS_READ) as buffer, \
+            memoryview(buffer) as view:
+        records, del_upd_count, revision, valid_size = _read_frames(buffer, view)
 
-                    record_length = struct.unpack('I', chunk)[0]
+        if valid_size < len(buffer):
+            _wal_corrupted_warn(name, allow_corrupted_wal)
 
-                    chunk = file_descriptor.read(record_length)
+            return records, del_upd_count, revision, valid_size
 
-                    if len(chunk) < record_length:
-                        self._wal_corrupted_warn()
+    return records, del_upd_count, revision, None
 
-                        return collection, del_upd_count
 
-                    record = struct.unpack(str(record_length) + 's', chunk)[0]
+def _read_frames(buffer, view):
+    """
+    Decodes the frames up to the first torn or corrupted one.
 
-                    collection[rid] = json.loads(record.decode('utf-8'))
-                    collection[rid]['__rev__'] = rid
+    :param buffer:
+    :param view: Memory view of the buffer.
 
-                    self._revision = rid
+    :return: (records by rid with None for the deleted ones, count of deletes and updates, max rid, size of the valid
+        frames)
+    """
+    codec_id = 0
+    decode = _json_decode
+    records = {}
+    del_upd_count = 0
+    revision = - 1
+    size = len(buffer)
+    valid_size = 0
 
-                if operation == _UPDATE_OP:
-                    chunk = file_descriptor.read(4)
+    checksum_size = _FRAME_CHECKSUM.size
+    checksum_unpack_from = _FRAME_CHECKSUM.unpack_from
+    header_size = _FRAME_HEADER.size
+    header_unpack_from = _FRAME_HEADER.unpack_from
+    length_size = _FRAME_VALUE_LENGTH.size
+    length_unpack_from = _FRAME_VALUE_LENGTH.unpack_from
 
-                    if len(chunk) < 4:
-                        self._wal_corrupted_warn()
+    offset = 0
 
-                        return collection, del_upd_count
+    while offset + header_size <= size:
+        frame_offset = offset
+        operation, rid, _ = header_unpack_from(buffer, offset)
+        offset += header_size
 
-                    record_length = struct.unpack('I', chunk)[0]
+        value_count = 0 if operation & 0x07 == _DELETE_OP else 2 if operation & 0x07 == _UPDATE_OP else 1
+        value_slices = []
 
-                    chunk = file_descriptor.read(record_length)
+        while len(value_slices) < value_count and offset + length_size <= size:
+            record_length = length_unpack_from(buffer, offset)[0]
+            offset += length_size
 
-                    if len(chunk) < record_length:
-                        self._wal_corrupted_warn()
+            if offset + record_length > size:
+                break
 
-                        return collection, del_upd_count
+            value_slices.append((offset, offset + record_length))
+            offset += record_length
 
-                    record = struct.unpack(str(record_length) + 's', chunk)[0]
+        # the torn frame is discarded as a whole
+        if len(value_slices) < value_count:
+            break
 
-                    collection[rid].update(json.loads(record.decode('utf-8')))
-                    collection[rid]['__rev__'] = rid
+        # the checksum goes before the decoding, so the corrupted values are never decoded
+        if operation & _FRAME_CHECKSUM_FLAG:
+            if offset + checksum_size > size \
+                    or checksum_unpack_from(buffer, offset)[0] != zlib.crc32(view[frame_offset:offset]):
+                break
 
-                    del_upd_count += 1
+            offset += checksum_size
 
-    def _wal_write(self, operation, rid, *values):
-        packed = struct.pack('BIB', operation, rid, len(values))
+        if operation >> 4 != codec_id:
+            codec_id = operation >> 4
+            decode = _get_codec(codec_id)[1]
 
-        if self._file_wal.write(packed) != len(packed):
-            raise FSWalError()
+        operation &= 0x07
 
-        for val in values:
-            val = json.dumps(val).encode('utf-8')
+        if operation == _DELETE_OP:
+            records[rid] = None
 
-            packed = struct.pack('I' + str(len(val)) + 's', len(val), val)
+            del_upd_count += 1
+            valid_size = offset
 
-            if self._file_wal.write(packed) != len(packed):
-                raise FSWalError()
+            continue
+
+        try:
+            values = [decode(view[value_start:value_end]) for value_start, value_end in value_slices]
+        except (TypeError, ValueError):
+            break
+
+        record = values[0]
+
+        if operation == _UPDATE_OP:
+            record.update(values[1])
+
+            del_upd_count += 1
+
+        record['__rev__'] = rid
+        records[rid] = record
+        revision = rid
+        valid_size = offset
+
+    return records, del_upd_count, revision, valid_size
+
+
+def _get_codec(codec_id):
+    """
+    Gets the encoder and the decoder of the codec.
+
+    :param codec_id:
+
+    :return: (encode, decode)
+    """
+    if codec_id == _CODEC_IDS[CODEC_JSON]:
+        return _json_encode, _json_decode
+
+    if codec_id == _CODEC_IDS[CODEC_STRUCT]:
+        return _struct_encode, _struct_decode
+
+    if codec_id == _CODEC_IDS[CODEC_MSGPACK]:
+        import msgpack
+
+        return msgpack.packb, lambda val: msgpack.unpackb(val, raw=False, strict_map_key=False)
+
+    raise CorruptedWalError('unknown codec id: {}'.format(codec_id))
+
+
+def _json_decode(val):
+    return json.loads(str(val, 'utf-8'))
+
+
+def _json_encode(val):
+    return json.dumps(val).encode('utf-8')
+
+
+def _struct_decode(val):
+    """
+    Decodes the value encoded by the struct codec.
+
+    :param val: bytes-like
+
+    :return:
+    """
+    val = bytes(val)
+
+    try:
+        decoded, offset = _struct_decode_from(val, 0)
+    except (IndexError, struct.error):
+        raise ValueError('truncated struct value')
+
+    if offset != len(val):
+        raise ValueError('extra data after struct value')
+
+    return decoded
+
+
+def _struct_decode_from(buffer, offset):
+    tag = buffer[offset]
+
+    if tag == _STRUCT_TAG_SHORT_STR or tag == _STRUCT_TAG_STR:
+        if tag == _STRUCT_TAG_SHORT_STR:
+            length = buffer[offset + 1]
+            offset += _STRUCT_SHORT_LENGTH.size
+        else:
+            length = _STRUCT_LENGTH.unpack_from(buffer, offset)[1]
+            offset += _STRUCT_LENGTH.size
+
+        if offset + length > len(buffer):
+            raise IndexError()
+
+        return buffer[offset:offset + length].decode('utf-8'), offset + length
+
+    if tag == _STRUCT_TAG_INT:
+        return _STRUCT_INT.unpack_from(buffer, offset)[1], offset + _STRUCT_INT.size
+
+    if tag == _STRUCT_TAG_DICT:
+        count = _STRUCT_LENGTH.unpack_from(buffer, offset)[1]
+        offset += _STRUCT_LENGTH.size
+        val = {}
+
+        for _ in range(count):
+            key, offset = _struct_decode_from(buffer, offset)
+            val[key], offset = _struct_decode_from(buffer, offset)
+
+        return val, offset
+
+    if tag == _STRUCT_TAG_LIST:
+        count = _STRUCT_LENGTH.unpack_from(buffer, offset)[1]
+        offset += _STRUCT_LENGTH.size
+        val = []
+
+        for _ in range(count):
+            item, offset = _struct_decode_from(buffer, offset)
+            val.append(item)
+
+        return val, offset
+
+    if tag == _STRUCT_TAG_FLOAT:
+        return _STRUCT_FLOAT.unpack_from(buffer, offset)[1], offset + _STRUCT_FLOAT.size
+
+    if tag == _STRUCT_TAG_NONE:
+        return None, offset + 1
+
+    if tag == _STRUCT_TAG_TRUE:
+        return True, offset + 1
+
+    if tag == _STRUCT_TAG_FALSE:
+        return False, offset + 1
+
+    if tag == _STRUCT_TAG_BIG_INT or tag == _STRUCT_TAG_BYTES:
+        length = _STRUCT_LENGTH.unpack_from(buffer, offset)[1]
+        offset += _STRUCT_LENGTH.size
+
+        if offset + length > len(buffer):
+            raise IndexError()
+
+        val = buffer[offset:offset + length]
+
+        return int.from_bytes(val, 'little', signed=True) if tag == _STRUCT_TAG_BIG_INT else val, offset + length
+
+    raise ValueError('unknown struct tag: {}'.format(tag))
+
+
+def _struct_encode(val):
+    """
+    Encodes the value of the primitive types: None, bool, int, float, str, bytes, list, tuple (decoded as list) and
+    dict.
+
+    :param val:
+
+    :return: bytes
+    """
+    packed = []
+
+    _struct_encode_into(val, packed)
+
+    return b''.join(packed)
+
+
+def _struct_encode_into(val, packed):
+    val_type = type(val)
+
+    if val_type is str:
+        val = val.encode('utf-8')
+
+        if len(val) < 256:
+            packed.append(_STRUCT_SHORT_LENGTH.pack(_STRUCT_TAG_SHORT_STR, len(val)))
+        else:
+            packed.append(_STRUCT_LENGTH.pack(_STRUCT_TAG_STR, len(val)))
 
-    def _wal_corrupted_warn(self):
-        if self._allow_corrupted_wal:
-            logging.warning('%s.wal.data is corrupted', self._name)
+        packed.append(val)
+    elif val_type is int:
+        if _STRUCT_INT_MIN <= val <= _STRUCT_INT_MAX:
+            packed.append(_STRUCT_INT.pack(_STRUCT_TAG_INT, val))
         else:
-            raise CorruptedWalError(self._name)
+            val = val.to_bytes(val.bit_length() // 8 + 1, 'little', signed=True)
+
+            packed.append(_STRUCT_LENGTH.pack(_STRUCT_TAG_BIG_INT, len(val)))
+            packed.append(val)
+    elif val_type is dict:
+        packed.append(_STRUCT_LENGTH.pack(_STRUCT_TAG_DICT, len(val)))
+
+        for key, item in val.items():
+            _struct_encode_into(key, packed)
+            _struct_encode_into(item, packed)
+    elif val_type is list or val_type is tuple:
+        packed.append(_STRUCT_LENGTH.pack(_STRUCT_TAG_LIST, len(val)))
+
+        for item in val:
+            _struct_encode_into(item, packed)
+    elif val_type is float:
+        packed.append(_STRUCT_FLOAT.pack(_STRUCT_TAG_FLOAT, val))
+    elif val is None:
+        packed.append(_STRUCT_NONE)
+    elif val is True:
+        packed.append(_STRUCT_TRUE)
+    elif val is False:
+        packed.append(_STRUCT_FALSE)
+    elif val_type is bytes:
+        packed.append(_STRUCT_LENGTH.pack(_STRUCT_TAG_BYTES, len(val)))
+        packed.append(val)
+    else:
+        raise TypeError('{} is not encodable by the struct codec'.format(val_type.__name__))
+
+
+def _wal_corrupted_warn(name, allow_corrupted_wal):
+    if allow_corrupted_wal:
+        logging.warning('%s is corrupted', name)
+    else:
+        raise CorruptedWalError(name)
@@ -1,11 +1,14 @@
 import logging
 
-from .common import Lst
+from .common import ConstraintError, Lst, gc_disabled
 from .index import (
+    UdbBitmapIndex,
     UdbBtreeBaseIndex,
     UdbBtreeEmbeddedBaseIndex,
     UdbBtreeIndex,
     UdbBtreeEmbeddedIndex,
+    UdbBtreeIntBaseIndex,
+    UdbBtreeIntIndex,
     UdbBtreeUniqBaseIndex,
     UdbHashBaseIndex,
     UdbHashEmbeddedBaseIndex,
@@ -19,11 +22,16 @@ from .udb_core import UdbCore
 
 
 _DELETE_BUFFER_SIZE = 5000
+_INSERT_BATCH_SIZE = 5000
+_LOAD_BATCH_SIZE = 50000
 _INDEXES = (
+    UdbBitmapIndex,
     UdbBtreeBaseIndex,
     UdbBtreeEmbeddedBaseIndex,
     UdbBtreeIndex,
     UdbBtreeEmbeddedIndex,
+    UdbBtreeIntBaseIndex,
+    UdbBtreeIntIndex,
     UdbBtreeUniqBaseIndex,
     UdbHashBaseIndex,
     UdbHashEmbeddedBaseIndex,
@@ -42,10 +50,12 @@ class Udb(UdbCore):
     _indexes_to_check_for_ins_upd_allowance = None
     _on_delete = None
     _on_insert = None
+    _on_insert_many = None
     _on_update = None
     _revision = 0
     _schema = None
     _storage = None
+    _storage_mapper = None
 
     @property
     def revision(self):
@@ -58,6 +68,7 @@ class Udb(UdbCore):
         self._delete_buffer = [None] * _DELETE_BUFFER_SIZE
         self._on_delete = []
         self._on_insert = []
+        self._on_insert_many = {}
         self._on_update = []
 
         if schema:
@@ -68,7 +79,7 @@ class Udb(UdbCore):
 
             if storage.is_capture_events():
                 self._on_delete.append(storage.on_delete)
-                self._on_insert.append(storage.on_insert)
+                self.add_on_insert(storage.on_insert, storage.on_insert_many)
                 self._on_update.append(storage.on_update)
 
     def set_copy_on_insert(self):
@@ -81,9 +92,18 @@ class Udb(UdbCore):
 
         return self
 
-    def add_on_insert(self, on_insert):
+    def add_on_insert(self, on_insert, on_insert_many=None):
+        """
+        :param on_insert: Callback of the single record insert.
+        :param on_insert_many: Callback of the batch insert, called instead of the single record insert callback.
+
+        :return:
+        """
         self._on_insert.append(on_insert)
 
+        if on_insert_many:
+            self._on_insert_many[on_insert] = on_insert_many
+
         return self
 
     def add_on_update(self, on_update):
@@ -91,13 +111,27 @@ class Udb(UdbCore):
 
         return self
 
-    def load_db(self, mapper=None):
+    def load_db(self, mapper=None, on_progress=None):
+        """
+        Loads the db from the storage, restores the indexes from the snapshot if any and bulk builds the rest.
+
+        :param mapper: Record mapper, it is used by the checkpoints as well.
+        :param on_progress: Callable of (index name, indexed count, total count).
+
+        :return:
+        """
+        self._storage_mapper = mapper
+
         if not self._storage:
             self._collection = {}
             self._revision = 0
 
             return False
 
+        with gc_disabled():
+            return self._load_db(mapper, on_progress)
+
+    def _load_db(self, mapper=None, on_progress=None):
         logging.debug('db loading')
 
         data = self._storage.load()
@@ -107,10 +141,13 @@ class Udb(UdbCore):
         if not isinstance(data, dict) or 'indexes' not in data or 'data' not in data:
             raise ValueError('invalid db format')
 
+        # the records may be streamed by the storage
+        items = data['data'].items() if isinstance(data['data'], dict) else data['data']
+
         if mapper:
-            self._collection = {int(k): mapper(v) for k, v in data['data'].items()}
+            self._collection = {int(k): mapper(v) for k, v in items}
         else:
-            self._collection = {int(k): v for k, v in data['data'].items()}
+            self._collection = {int(k): v for k, v in items}
 
         self._revision = data.get('revision', 0)
 
@@ -132,20 +169,95 @@ class Udb(UdbCore):
                     raise ValueError('unknown index type: {} on {}'.format(index[1], key))
 
             self._indexes = indexes
+            self._plan_cache.clear()
 
         logging.debug('db indexing')
 
-        for key, record in self._collection.items():
-            for index in self._indexes.values():
-                index.insert_by_schema(Lst(record) if type(record) == list else record, int(key))
+        snapshot = data.get('snapshot')
+
+        if snapshot:
+            self._revision = max(self._revision, snapshot['revision'])
+            self._load_indexes(self._load_snapshot(snapshot, mapper, on_progress), on_progress)
+        else:
+            self._load_indexes(self._indexes, on_progress)
 
         logging.debug('db indexed')
 
         self._storage.save_meta(self._indexes, self._revision)
 
+        if self._storage.is_checkpoint_required():
+            self.save_snapshot(mapper)
+
         return True
 
+    def _load_snapshot(self, snapshot, mapper=None, on_progress=None):
+        """
+        Restores the indexes from the snapshot and reindexes the records changed after it.
+
+        :param snapshot:
+        :param mapper:
+        :param on_progress:
+
+        :return: indexes not restored
+        """
+        delta = {}
+
+        for rid, record in snapshot['delta'].items():
+            if record is not None and mapper:
+                record = mapper(record)
+
+            delta[rid] = Lst(record) if type(record) == list else record
+
+        total = len(self._collection)
+        not_restored = {}
+
+        for name, index in self._indexes.items():
+            index_snapshot = snapshot['indexes'].get(name)
+
+            # the index having been changed since the snapshot is rebuilt
+            if not index_snapshot or index_snapshot[2] is None or index_snapshot[:2] != [index.type, index.get_meta()]:
+                not_restored[name] = index
+
+                continue
+
+            index.load_snapshot(index_snapshot[2])
+
+            for rid, record in delta.items():
+                if record is not None:
+                    index.delete(index.get_cover_key(record, index.get_schema_default_values(record)), rid)
+
+            for rid in delta:
+                record = self._collection.get(rid)
+
+                if record is not None:
+                    index.insert_by_schema(Lst(record) if type(record) == list else record, rid)
+
+            if on_progress:
+                on_progress(name, total, total)
+
+        logging.debug('db indexes restored from snapshot, %i records reindexed', len(delta))
+
+        return not_restored
+
+    def _load_indexes(self, indexes, on_progress=None):
+        if not indexes:
+            return self
+
+        items = [(uid, Lst(record) if type(record) == list else record) for uid, record in self._collection.items()]
+        total = len(items)
+
+        for name, index in indexes.items():
+            for i in range(0, total, _LOAD_BATCH_SIZE):
+                index.insert_many_by_schema(items[i:i + _LOAD_BATCH_SIZE])
+
+                if on_progress:
+                    on_progress(name, min(i + _LOAD_BATCH_SIZE, total), total)
+
+        return self
+
     def save_db(self, mapper=None):
+        self._storage_mapper = mapper
+
         if self._storage:
             return self._storage.save(
                 self._indexes,
@@ -155,6 +267,24 @@ class Udb(UdbCore):
 
         return False
 
+    def save_snapshot(self, mapper=None):
+        """
+        Saves the snapshot of the indexes, so **load_db** restores them instead of the rebuilding.
+
+        :param mapper: Record mapper.
+
+        :return:
+        """
+        if self._storage:
+            with gc_disabled():
+                return self._storage.save_snapshot(
+                    self._indexes,
+                    self._revision,
+                    {k: mapper(v) for k, v in self._collection.items()} if mapper else self._collection,
+                )
+
+        return False
+
     def delete(self, q=None, limit=None, offset=None):
         delete_count = 0
 
@@ -170,6 +300,8 @@ class Udb(UdbCore):
                     break
 
             if ind == - 1:
+                self._commit()
+
                 return delete_count
 
             for j in range(ind + 1):
@@ -190,11 +322,7 @@ class Udb(UdbCore):
             values = cpy_dict(values)
 
         if self._schema:
-            for key, schema_entry in self._schema.items():
-                if callable(schema_entry):
-                    values[key] = schema_entry(key, values)
-                elif key not in values:
-                    values[key] = schema_entry
+            self._apply_schema(values)
 
         if self._indexes_to_check_for_ins_upd_allowance:
             for index in self._indexes_to_check_for_ins_upd_allowance:
@@ -212,18 +340,46 @@ class Udb(UdbCore):
 
         self._revision += 1
 
+        self._commit()
+
         return values
 
+    def insert_many(self, records, batch_size=_INSERT_BATCH_SIZE):
+        """
+        Inserts the records by the batches, every batch is checked for the uniqueness constraints before any of its
+        records is inserted and is indexed at once.
+
+        :param records:
+        :param batch_size:
+
+        :return: count of inserted records
+        """
+        insert_count = 0
+        batch = []
+
+        for values in records:
+            batch.append(values)
+
+            if len(batch) == batch_size:
+                insert_count += self._insert_batch(batch)
+                batch = []
+
+        if batch:
+            insert_count += self._insert_batch(batch)
+
+        return insert_count
+
     def update(self, values, q=None, limit=None, offset=None):
         update_count = 0
         self._revision += 1
 
-        for key in self.get_q_cursor(
+        # the keys are taken at once since the cursor may iterate the index buckets the update changes in place
+        for key in list(self.get_q_cursor(
                 q and cpy_dict(q, {'__rev__': {'$lte': self._revision - 1}}),
                 limit,
                 offset,
                 get_keys_only=True
-        ):
+        )):
             before = self._collection.get(key)
             values['__rev__'] = self._revision
 
@@ -241,8 +397,78 @@ class Udb(UdbCore):
             self._collection[key].update(values)
             update_count += 1
 
+        self._commit()
+
         return update_count
 
+    def _commit(self):
+        if self._storage:
+            self._storage.commit()
+
+            # the checkpoint maps the records as the db has been loaded or saved by
+            if self._storage.is_checkpoint_required():
+                self.save_snapshot(self._storage_mapper)
+
+        return self
+
+    def _apply_schema(self, values):
+        for key, schema_entry in self._schema.items():
+            if callable(schema_entry):
+                values[key] = schema_entry(key, values)
+            elif key not in values:
+                values[key] = schema_entry
+
+        return values
+
+    def _insert_batch(self, batch):
+        if self._copy_on_insert:
+            batch = [cpy_dict(values) for values in batch]
+
+        if self._schema:
+            for values in batch:
+                self._apply_schema(values)
+
+        if self._indexes_to_check_for_ins_upd_allowance:
+            for index in self._indexes_to_check_for_ins_upd_allowance:
+                keys = set()
+
+                for values in batch:
+                    key = index.get_cover_key(values)
+
+                    index.insert_is_allowed(key)
+
+                    if key in keys:
+                        raise ConstraintError('duplicate value: {} on {}'.format(key, index.name))
+
+                    keys.add(key)
+
+        items = []
+
+        for values in batch:
+            values['__rev__'] = self._revision
+            self._collection[self._revision] = values
+
+            items.append((self._revision, values))
+
+            self._revision += 1
+
+        if self._on_insert:
+            for on_insert in self._on_insert:
+                on_insert_many = self._on_insert_many.get(on_insert)
+
+                if on_insert_many:
+                    on_insert_many(items)
+                else:
+                    for rid, values in items:
+                        on_insert(rid, values)
+
+        for index in self._indexes.values():
+            index.insert_many_by_schema(items)
+
+        self._commit()
+
+        return len(items)
+
 
 def cpy_dict(dct, update=None):
     dct = dict(dct)
@@ -1,23 +1,37 @@
+import collections
+
 from .aggregate import aggregate, register_aggregation_pipe, SKIP
-from .common import cpy_dict, sort_key_iter
+from .common import EMPTY, cpy_dict, sort_key_iter
 from .index import (
     UdbBaseGEOIndex,
     UdbBaseLinearIndex,
     UdbBaseTextIndex,
 )
+from .index.udb_base_linear_index import SCAN_OP_PREFIX, SCAN_OP_RANGE
 from .udb_index import (
+    UdbIndex,
+    UdbIndexSearcher,
+    SCAN_OP_AND,
     SCAN_OP_CONST,
+    SCAN_OP_COVER,
     SCAN_OP_SEQ,
     SCAN_OP_SORT,
     SCAN_OP_SUB,
 )
 
 
+_INTERSECTION_ESTIMATE_RATIO = 4
+_PLAN_CACHE_SIZE = 256
+
+
 class UdbCore(object):
     _collection = None
     _copy_on_select = False
     _indexes_with_custom_ops = {UdbBaseLinearIndex, UdbBaseGEOIndex}
     _indexes = {}
+    _plan_cache = None
+    _plan_cache_schema_revision = 0
+    _plan_cache_size = _PLAN_CACHE_SIZE
 
     @property
     def collection(self):
@@ -36,11 +50,14 @@ class UdbCore(object):
     @classmethod
     def register_index(cls, index_class):
         cls._indexes_with_custom_ops.add(index_class)
+
+        UdbIndex.schema_revision += 1
         
         return cls
 
     def __init__(self, indexes=None, indexes_with_custom_ops=None):
         self._collection = {}
+        self._plan_cache = collections.OrderedDict()
 
         if indexes_with_custom_ops:
             self._indexes_with_custom_ops = set(indexes_with_custom_ops)
@@ -66,11 +83,20 @@ class UdbCore(object):
 
         return self
 
-    def aggregate(self, *pipes, q=None, limit=None, offset=None, sort=None, use_indexes=None):
-        return aggregate(self.get_q_cursor(q, limit, offset, sort, use_indexes=use_indexes), *pipes)
+    def set_plan_cache_size(self, size=_PLAN_CACHE_SIZE):
+        self._plan_cache_size = size
+        self._plan_cache.clear()
+
+        return self
+
+    def aggregate(self, *pipes, q=None, limit=None, offset=None, sort=None, use_indexes=None, fields=None):
+        return aggregate(self.get_q_cursor(q, limit, offset, sort, use_indexes=use_indexes, fields=fields), *pipes)
 
-    def select(self, q=None, limit=None, offset=None, sort=None, use_indexes=None, get_plan=False):
-        return self.get_q_cursor(q, limit, offset, sort, use_indexes=use_indexes, get_plan=get_plan)
+    def count(self, q=None, use_indexes=None):
+        return self.get_q_cursor(q, use_indexes=use_indexes, get_count=True)
+
+    def select(self, q=None, limit=None, offset=None, sort=None, use_indexes=None, get_plan=False, fields=None):
+        return self.get_q_cursor(q, limit, offset, sort, use_indexes=use_indexes, get_plan=get_plan, fields=fields)
 
     def select_one(self, q=None, offset=None, use_indexes=None):
         for record in self.get_q_cursor(q, 1, offset, None, use_indexes=use_indexes):
@@ -86,7 +112,9 @@ class UdbCore(object):
         sort=None,
         get_plan=False,
         get_keys_only=False,
-        use_indexes=None
+        use_indexes=None,
+        fields=None,
+        get_count=False,
     ):
         """
         :param q:
@@ -96,6 +124,8 @@ class UdbCore(object):
         :param get_plan:
         :param get_keys_only:
         :param use_indexes:
+        :param fields: Fields to project the records to, the records are assembled from the index if it covers them.
+        :param get_count: Gets the count of records instead of the records, limit, offset and sort are ignored.
 
         :return:
         """
@@ -104,53 +134,66 @@ class UdbCore(object):
         s_op_key_sequence_length = 0
         s_op_key_sequence_length_to_remove = 0
         s_op_priority = 0
+        s_op_estimate = EMPTY
         s_op_fn = None
         s_op_fn_q_arranger = None
+        s_op_cover = False
+
+        if get_count:
+            if not q:
+                return len(self._collection)
+
+            limit = offset = sort = None
+            get_keys_only = True
 
         sort_is_fn = sort and callable(sort)
         sort_direction = None if sort is None or sort_is_fn else sort[0] != '-'
 
         plan = [] if get_plan else None
+        plan_cache_key = None
 
         if q:
-            for custom_seq in \
-                    map(lambda ind: self._indexes[ind], use_indexes) \
-                    if use_indexes \
-                    else self._indexes.values():
-                if custom_seq.schema_last_index < s_op_key_sequence_length:
-                    continue
+            candidates = None
 
-                (
-                    c_s_op_type,
-                    c_op_key_sequence_length,
-                    c_op_key_sequence_length_to_remove,
-                    c_op_priority,
-                    c_op_fn,
-                    c_op_fn_q_arranger,
-                ) = custom_seq.get_scan_op(
-                    q,
-                    limit,
-                    offset,
-                    self._collection,
-                )
+            if self._plan_cache_size:
+                plan_cache_key = (tuple(use_indexes) if use_indexes else None, _get_q_shape(q))
+                candidates = self._get_plan_cache(plan_cache_key)
 
-                if s_op_key_sequence_length < c_op_key_sequence_length \
-                        or s_op_key_sequence_length_to_remove < c_op_key_sequence_length_to_remove:
-                    s_index = custom_seq
-                    s_op_type = c_s_op_type
-                    s_op_key_sequence_length = c_op_key_sequence_length
-                    s_op_key_sequence_length_to_remove = c_op_key_sequence_length_to_remove
-                    s_op_priority = c_op_priority
-                    s_op_fn = c_op_fn
-                    s_op_fn_q_arranger = c_op_fn_q_arranger
-                elif s_op_priority < c_op_priority:
-                    s_index = custom_seq
-                    s_op_type = c_s_op_type
-                    s_op_key_sequence_length = c_op_key_sequence_length
-                    s_op_key_sequence_length_to_remove = c_op_key_sequence_length_to_remove
-                    s_op_priority = c_op_priority
-                    s_op_fn = c_op_fn
-                    s_op_fn_q_arranger = c_op_fn_q_arranger
+                if candidates is not None:
+                    (
+                        s_index,
+                        s_op_type,
+                        s_op_key_sequence_length,
+                        s_op_key_sequence_length_to_remove,
+                        s_op_priority,
+                        s_op_estimate,
+                        s_op_fn,
+                        s_op_fn_q_arranger,
+                    ) = self._get_cheapest_scan_op(candidates, q, limit, offset)
+
+                    # none of the cached indexes is applicable to the query values (e.g. "$like" pattern), plan anew
+                    if s_index is None:
+                        candidates = None
+
+            if candidates is None:
+                candidates = [self._indexes[ind] for ind in use_indexes] if use_indexes else self._indexes.values()
+
+                applicable = [] if plan_cache_key is not None else None
+
+                (
+                    s_index,
+                    s_op_type,
+                    s_op_key_sequence_length,
+                    s_op_key_sequence_length_to_remove,
+                    s_op_priority,
+                    s_op_estimate,
+                    s_op_fn,
+                    s_op_fn_q_arranger,
+                ) = self._get_cheapest_scan_op(candidates, q, limit, offset, applicable)
+
+                # the shape none of the indexes is applicable to is planned anew, the values may make them applicable
+                if applicable:
+                    self._set_plan_cache(plan_cache_key, tuple(applicable))
 
         if s_index is not None:
             if s_op_type == SCAN_OP_CONST:
@@ -160,29 +203,173 @@ class UdbCore(object):
 
                     limit = sort = None
 
-            key = ''
-            type_format_mappers = s_index.type_format_mappers
+            # the sort is needless if the records are provided by the index in the sort order, the descending order is
+            # provided by the reverse scan of the index
+            if sort and not sort_is_fn and (s_index.is_sorted_asc if sort_direction else s_index.is_sorted_desc):
+                s_op_sort_order = _get_scan_op_sort_order(
+                    s_index,
+                    s_op_type,
+                    q,
+                    sort if sort_direction else sort[1:],
+                )
+            else:
+                s_op_sort_order = None
+
+            key = self._get_scan_op_key(s_index, q, s_op_key_sequence_length_to_remove, s_op_fn_q_arranger)
 
-            for i in range(0, s_op_key_sequence_length_to_remove):
-                if i == s_op_key_sequence_length_to_remove - 1 and s_op_fn_q_arranger:
-                    pass
-                else:
-                    c_key_val = q.pop(s_index.schema_keys[i])
-                    key = key + type_format_mappers[type(c_key_val)](c_key_val)
+            self._pop_scan_op_keys(
+                s_index,
+                q,
+                s_op_key_sequence_length,
+                s_op_key_sequence_length_to_remove,
+                s_op_fn_q_arranger,
+            )
 
-            if s_op_fn_q_arranger:
-                s_op_fn_q_arranger(q[s_index.schema_keys[s_op_key_sequence_length - 1]])
+            if s_op_estimate is EMPTY and (get_plan or q):
+                s_op_estimate = s_op_fn(key, s_index.estimator)
 
-                if not q[s_index.schema_keys[s_op_key_sequence_length - 1]]:
-                    q.pop(s_index.schema_keys[s_op_key_sequence_length - 1])
+            s_op_reverse = False
+
+            # the descending sort is dropped for the scans of the ordered key ranges only
+            if s_op_sort_order is not None and (
+                sort_direction or s_op_type == SCAN_OP_CONST or s_op_type == SCAN_OP_PREFIX or s_op_type == SCAN_OP_RANGE
+            ):
+                s_op_reverse = s_op_sort_order and not sort_direction
+                sort = None
+
+            intersection = None
+
+            # the rest of the query covered by other indexes is applied as the intersection of their record sets
+            # with the records of the driving (least estimated) scan op, if the record sets are small enough
+            if q and s_op_estimate:
+                for custom_seq in candidates:
+                    if custom_seq is s_index:
+                        continue
+
+                    (
+                        c_s_op_type,
+                        c_op_key_sequence_length,
+                        c_op_key_sequence_length_to_remove,
+                        c_op_priority,
+                        c_op_fn,
+                        c_op_fn_q_arranger,
+                    ) = custom_seq.get_scan_op(
+                        q,
+                        limit,
+                        offset,
+                        self._collection,
+                    )
+
+                    if c_op_fn is None or c_s_op_type not in custom_seq.intersecting_scan_ops:
+                        continue
+
+                    c_key = self._get_scan_op_key(
+                        custom_seq,
+                        q,
+                        c_op_key_sequence_length_to_remove,
+                        c_op_fn_q_arranger,
+                    )
+                    c_op_estimate = c_op_fn(c_key, custom_seq.estimator)
+
+                    if c_op_estimate is None or c_op_estimate > s_op_estimate * _INTERSECTION_ESTIMATE_RATIO:
+                        continue
+
+                    self._pop_scan_op_keys(
+                        custom_seq,
+                        q,
+                        c_op_key_sequence_length,
+                        c_op_key_sequence_length_to_remove,
+                        c_op_fn_q_arranger,
+                    )
+
+                    if intersection is None:
+                        intersection = []
+
+                    intersection.append((
+                        c_op_estimate,
+                        custom_seq,
+                        c_s_op_type,
+                        c_op_key_sequence_length,
+                        c_op_priority,
+                        c_op_fn,
+                        c_key,
+                    ))
+
+                    if not q:
+                        break
+
+                if intersection:
+                    intersection.sort(key=lambda c_op: c_op[0])
+
+            # the records are assembled from the cover keys of the index if the query is fully covered by the scan op
+            # and the fields are the part of the index schema
+            s_op_cover = (
+                fields is not None
+                and not q
+                and not intersection
+                and not get_keys_only
+                and s_op_type in s_index.covering_scan_ops
+                and (not sort or sort_is_fn or (sort if sort_direction else sort[1:]) in fields)
+                and s_index.is_covering(fields)
+            )
 
             if get_plan:
-                plan.append((s_index, s_op_type, s_op_key_sequence_length, s_op_priority))
+                plan.append((s_index, s_op_type, s_op_key_sequence_length, s_op_priority, s_op_estimate))
+
+                if intersection:
+                    for c_op_estimate, custom_seq, c_s_op_type, c_op_key_sequence_length, c_op_priority, _, _ in \
+                            intersection:
+                        plan.append((
+                            custom_seq,
+                            SCAN_OP_AND,
+                            c_op_key_sequence_length,
+                            c_op_priority,
+                            c_op_estimate,
+                            c_s_op_type,
+                        ))
+
+                if s_op_cover:
+                    plan.append((s_index, SCAN_OP_COVER, 0, 0, fields))
             else:
-                seq = s_op_fn(key)
+                bitmap = None
 
-            if not sort_is_fn and s_index.is_sorted_asc and sort_direction and s_index.has_key(sort):
-                sort = None
+                # the record sets of the bitmap indexes are intersected as the bitmaps
+                if intersection and s_index.bitmapper is not None \
+                        and all(c_op[1].bitmapper is not None for c_op in intersection):
+                    bitmap = s_op_fn(key, s_index.bitmapper)
+
+                    for c_op in intersection:
+                        bitmap = bitmap & c_op[5](c_op[6], c_op[1].bitmapper)
+
+                    intersection = None
+
+                    if get_count and not q:
+                        return len(bitmap)
+
+                # the count of records is provided by the index if the query is fully covered by the scan op
+                if get_count and not q and not intersection and not s_index.is_embedded:
+                    count = s_op_fn(key, s_index.counter)
+
+                    if count is not None:
+                        return count
+
+                if bitmap is not None:
+                    seq = iter(bitmap)
+                elif s_op_reverse or s_op_cover:
+                    search_options = {}
+
+                    if s_op_reverse:
+                        search_options['reverse'] = True
+
+                    if s_op_cover:
+                        search_options['items'] = True
+
+                    seq = s_op_fn(key, UdbIndexSearcher(s_index, **search_options))
+                else:
+                    seq = s_op_fn(key)
+
+                if intersection:
+                    seq = self._get_intersection_cursor(seq, [c_op[5](c_op[6]) for c_op in intersection])
         else:
             if get_keys_only or q:
                 seq = self._collection.keys()
@@ -193,33 +380,48 @@ class UdbCore(object):
             if q:
                 plan.append((None, SCAN_OP_SEQ, 0, 0, q))
 
-            if limit or offset:
-                plan.append((None, SCAN_OP_SUB, 0, 0, limit, offset))
-
             if sort:
                 plan.append((None, SCAN_OP_SORT, 0, 0, sort if sort_direction else sort[1:], sort_direction))
 
+            if limit or offset:
+                plan.append((None, SCAN_OP_SUB, 0, 0, limit, offset))
+
             return plan
 
         if q and self._indexes_with_custom_ops:
-            for index in self._indexes_with_custom_ops:
+            for index in _get_distinct_by_method(self._indexes_with_custom_ops, 'seq'):
                 seq = index.seq(seq, q, self._collection)
 
-        if limit or offset:
+        if get_count:
+            return sum(1 for _ in seq)
+
+        # the subset is taken before the records fetching if there is no sort to be applied
+        if not sort and (limit or offset):
             seq = self._get_subset_cursor(seq, limit, offset)
 
         if not get_keys_only:
-            if s_index is not None or q:
+            if s_op_cover:
+                seq = self._get_covering_cursor(seq, s_index, fields)
+            elif s_index is not None or q:
                 seq = self._get_collection_fetch_cursor(seq)
 
         if sort:
             if sort_is_fn:
                 seq = sort(seq)
             else:
+                # only the top (offset + limit) records are kept by the sort in case of the limit is provided
+                top = limit + (offset or 0) if limit else None
+
                 if sort_direction:
-                    seq = sort_key_iter(sort, seq)
+                    seq = sort_key_iter(sort, seq, limit=top)
                 else:
-                    seq = sort_key_iter(sort[1:], seq, reverse=True)
+                    seq = sort_key_iter(sort[1:], seq, reverse=True, limit=top)
+
+            if limit or offset:
+                seq = self._get_subset_cursor(seq, limit, offset)
+
+        if fields is not None and not s_op_cover and not get_keys_only:
+            seq = self._get_projection_cursor(seq, fields)
 
         return seq
 
@@ -240,6 +442,22 @@ class UdbCore(object):
 
             yield record                
 
+    def _get_covering_cursor(self, source, index, fields):
+        decode_cover_key = index.decode_cover_key
+
+        for key, k in source:
+            values = decode_cover_key(key)
+
+            # fallback to the record if the cover key is ambiguous
+            if values is None:
+                values = self._collection.get(k)
+
+            yield {field: values[field] for field in fields if field in values}
+
+    def _get_projection_cursor(self, source, fields):
+        for record in source:
+            yield {field: record[field] for field in fields if field in record}
+
     def _get_collection_fetch_cursor(self, source):
         if self._copy_on_select:
             for k in source:
@@ -248,6 +466,145 @@ class UdbCore(object):
             for k in source:
                 yield self._collection.get(k)
 
+    def _get_cheapest_scan_op(self, candidates, q, limit=None, offset=None, applicable=None):
+        s_index = None
+        s_op_type = None
+        s_op_key_sequence_length = 0
+        s_op_key_sequence_length_to_remove = 0
+        s_op_priority = 0
+        s_op_estimate = EMPTY
+        s_op_fn = None
+        s_op_fn_q_arranger = None
+
+        for custom_seq in candidates:
+            (
+                c_s_op_type,
+                c_op_key_sequence_length,
+                c_op_key_sequence_length_to_remove,
+                c_op_priority,
+                c_op_fn,
+                c_op_fn_q_arranger,
+            ) = custom_seq.get_scan_op(
+                q,
+                limit,
+                offset,
+                self._collection,
+            )
+
+            if c_op_fn is None:
+                continue
+
+            if applicable is not None:
+                applicable.append(custom_seq)
+
+            c_op_estimate = EMPTY
+
+            # the cheapest scan op by the estimated count of records wins, the key sequence length and the
+            # priority are used in case of the estimation is not available or equal
+            if s_index is not None:
+                if s_op_estimate is EMPTY:
+                    s_op_estimate = s_op_fn(
+                        self._get_scan_op_key(s_index, q, s_op_key_sequence_length_to_remove, s_op_fn_q_arranger),
+                        s_index.estimator,
+                    )
+
+                c_op_estimate = c_op_fn(
+                    self._get_scan_op_key(custom_seq, q, c_op_key_sequence_length_to_remove, c_op_fn_q_arranger),
+                    custom_seq.estimator,
+                )
+
+                if c_op_estimate is None or s_op_estimate is None or c_op_estimate == s_op_estimate:
+                    if not (
+                        s_op_key_sequence_length < c_op_key_sequence_length
+                        or s_op_key_sequence_length_to_remove < c_op_key_sequence_length_to_remove
+                        or s_op_priority < c_op_priority
+                    ):
+                        continue
+                elif s_op_estimate < c_op_estimate:
+                    continue
+
+            s_index = custom_seq
+            s_op_type = c_s_op_type
+            s_op_key_sequence_length = c_op_key_sequence_length
+            s_op_key_sequence_length_to_remove = c_op_key_sequence_length_to_remove
+            s_op_priority = c_op_priority
+            s_op_estimate = c_op_estimate
+            s_op_fn = c_op_fn
+            s_op_fn_q_arranger = c_op_fn_q_arranger
+
+        return (
+            s_index,
+            s_op_type,
+            s_op_key_sequence_length,
+            s_op_key_sequence_length_to_remove,
+            s_op_priority,
+            s_op_estimate,
+            s_op_fn,
+            s_op_fn_q_arranger,
+        )
+
+    def _get_intersection_cursor(self, source, sources):
+        rids = None
+
+        for c_source in sources:
+            if rids is None:
+                rids = set(c_source)
+            else:
+                rids = {rid for rid in c_source if rid in rids}
+
+            if not rids:
+                return
+
+        for rid in source:
+            if rid in rids:
+                yield rid
+
+    def _get_plan_cache(self, key):
+        if self._plan_cache_schema_revision != UdbIndex.schema_revision:
+            self._plan_cache.clear()
+            self._plan_cache_schema_revision = UdbIndex.schema_revision
+
+            return None
+
+        candidates = self._plan_cache.get(key)
+
+        if candidates is not None:
+            self._plan_cache.move_to_end(key)
+
+        return candidates
+
+    def _set_plan_cache(self, key, candidates):
+        self._plan_cache[key] = candidates
+
+        if len(self._plan_cache) > self._plan_cache_size:
+            self._plan_cache.popitem(False)
+
+    def _get_scan_op_key(self, index, q, key_sequence_length_to_remove, fn_q_arranger):
+        key = index.key_empty
+        type_format_mappers = index.type_format_mappers
+
+        # the last key part is extracted by the scan op fn itself in case of q arranger is provided
+        if fn_q_arranger:
+            key_sequence_length_to_remove -= 1
+
+        for i in range(0, key_sequence_length_to_remove):
+            c_key_val = q[index.schema_keys[i]]
+            key = key + type_format_mappers[type(c_key_val)](c_key_val)
+
+        return key
+
+    def _pop_scan_op_keys(self, index, q, key_sequence_length, key_sequence_length_to_remove, fn_q_arranger):
+        for i in range(0, key_sequence_length_to_remove - (1 if fn_q_arranger else 0)):
+            q.pop(index.schema_keys[i])
+
+        if fn_q_arranger:
+            fn_q_arranger(q[index.schema_keys[key_sequence_length - 1]])
+
+            if not q[index.schema_keys[key_sequence_length - 1]]:
+                q.pop(index.schema_keys[key_sequence_length - 1])
+
+        return q
+
     def _get_subset_cursor(self, source, limit=None, offset=None):
         if limit is None:
             limit = 999999999
@@ -272,8 +629,80 @@ class UdbCore(object):
                     break
 
 
+def _get_q_shape(q):
+    """
+    Gets the normalized query shape consisting of the keys and the ops, but not the values.
+    """
+    return tuple(
+        (key, _get_condition_shape(condition) if type(condition) == dict else callable(condition))
+        for key, condition in q.items()
+    )
+
+
+def _get_condition_shape(condition):
+    c_like = condition.get('$like')
+
+    # the applicability of the "$like" scan op depends on the position of the first pattern symbol
+    if type(c_like) == str:
+        c_like_pos = min(len(c_like) if pos == -1 else pos for pos in (c_like.find('%'), c_like.find('_')))
+
+        return tuple(condition) + (c_like_pos == 0, c_like_pos == len(c_like))
+
+    return tuple(condition)
+
+
+def _get_scan_op_sort_order(index, op_type, q, sort_key):
+    """
+    Checks the records of the scan op are provided in the order of the sort key: the leading index keys fixed by the
+    equality are constant and the next one is ordered by the prefix and range scans.
+
+    :param index:
+    :param op_type:
+    :param q: Query before the scan op keys are popped.
+    :param sort_key:
+
+    :return: None if not ordered, False if the sort key is constant, True if ordered by the scan
+    """
+    for key in index.schema_keys:
+        condition = q.get(key, EMPTY)
+
+        if type(condition) == dict:
+            is_eq = len(condition) == 1 and '$eq' in condition
+        else:
+            is_eq = condition != EMPTY and not callable(condition)
+
+        if key == sort_key:
+            if is_eq:
+                return False
+
+            return True if op_type == SCAN_OP_PREFIX or op_type == SCAN_OP_RANGE else None
+
+        if not is_eq:
+            return None
+
+    return None
+
+
+def _get_distinct_by_method(indexes, method):
+    """
+    Reduces the index classes sharing the same implementation of the method to the single one, so the same condition is
+    not checked multiple times.
+    """
+    distinct = {}
+
+    for index in indexes:
+        fn = getattr(index, method)
+
+        distinct.setdefault(getattr(fn, '__func__', fn), index)
+
+    return distinct.values()
+
+
 def _match_aggregation_pipe(seq, q, with_facet=False):
-    index_context = [(index, index.create_condition_context(q)) for index in UdbCore._indexes_with_custom_ops]
+    index_context = [
+        (index, index.create_condition_context(q))
+        for index in _get_distinct_by_method(UdbCore._indexes_with_custom_ops, 'check_condition')
+    ]
 
     for record in seq:
         if record == SKIP:
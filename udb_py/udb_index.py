@@ -1,6 +1,13 @@
+import functools
+
 from .common import (
     EMPTY,
     TYPE_FORMAT_MAPPERS,
+    TYPE_FORMAT_MAPPERS_BINARY,
+    TYPE_INFL,
+    TYPE_INFL_BINARY,
+    TYPE_INFR,
+    TYPE_INFR_BINARY,
     configure_float_precision,
 )
 
@@ -8,20 +15,88 @@ from .common import (
 _PRIMITIVE_VALS = (None, bool, float, int, str)
 
 
+SCAN_OP_AND = 'and'
 SCAN_OP_CONST = 'const'
+SCAN_OP_COVER = 'cover'
 SCAN_OP_SEQ = 'seq'
 SCAN_OP_SORT = 'sort'
 SCAN_OP_SUB = 'sub'
 
 
+class UdbIndexEstimator(object):
+    """
+    Proxies the "search_by_*" calls of the scan op fn to the "estimate_by_*" methods of the index, so the same scan op
+    fn returns the estimated count of records instead of the records.
+    """
+    __slots__ = ('_index',)
+
+    _method_prefix = 'estimate_by_'
+
+    def __init__(self, index):
+        self._index = index
+
+    def __getattr__(self, name):
+        return getattr(self._index, self._method_prefix + name[10:])
+
+
+class UdbIndexCounter(UdbIndexEstimator):
+    """
+    Proxies the "search_by_*" calls of the scan op fn to the "count_by_*" methods of the index, so the same scan op fn
+    returns the exact count of records or None if it can not be counted without the scan.
+    """
+    __slots__ = ()
+
+    _method_prefix = 'count_by_'
+
+
+class UdbIndexBitmapper(UdbIndexEstimator):
+    """
+    Proxies the "search_by_*" calls of the scan op fn to the "bitmap_by_*" methods of the index, so the same scan op fn
+    returns the bitmap of the record ids.
+    """
+    __slots__ = ()
+
+    _method_prefix = 'bitmap_by_'
+
+
+class UdbIndexSearcher(object):
+    """
+    Proxies the "search_by_*" calls of the scan op fn to the same methods of the index passing the extra search options,
+    e.g. the reverse order of the records or the (cover key, record id) pairs instead of the record ids.
+    """
+    __slots__ = ('_index', '_options')
+
+    def __init__(self, index, **options):
+        self._index = index
+        self._options = options
+
+    def __getattr__(self, name):
+        return functools.partial(getattr(self._index, name), **self._options)
+
+
 class UdbIndex(object):
+    bitmapper = None
+    counter = None
+    covering_scan_ops = ()
+    estimator = None
+    # the scan ops the record sets of are intersected with the ones of the driving scan op
+    intersecting_scan_ops = ()
+    float_precision = None
+    is_binary_keys = False
+    is_embedded = False
     is_sorted_asc = False
+    is_tuple_keys = False
+    is_sorted_desc = False
     is_uniq = False
+    key_empty = ''
+    key_infl = TYPE_INFL
+    key_infr = TYPE_INFR
     name = 'index'
     schema = {}
     schema_default_values = None
     schema_keys = []
     schema_last_index = - 1
+    schema_revision = 0
     type = None
     type_format_mappers = TYPE_FORMAT_MAPPERS
 
@@ -47,6 +122,11 @@ class UdbIndex(object):
 
     def __init__(self, name=None):
         self.name = name or type(self).__name__
+        self.counter = UdbIndexCounter(self)
+        self.estimator = UdbIndexEstimator(self)
+
+    def decode_cover_key(self, cover_key):
+        raise NotImplementedError
 
     def get_cover_key(self, record, second=None):
         raise NotImplementedError
@@ -57,19 +137,63 @@ class UdbIndex(object):
     def get_meta(self):
         raise NotImplementedError
 
+    def get_snapshot(self):
+        """
+        Gets the picklable state of the index to be restored by **load_snapshot**.
+
+        :return: None if the index does not support the snapshots
+        """
+        return None
+
+    def load_snapshot(self, snapshot):
+        raise NotImplementedError
+
+    def set_binary_keys(self, binary=True):
+        """
+        Switches the cover keys to bytes, which are built twice faster than the strings. Must be set before the index
+        is filled.
+
+        :param binary:
+
+        :return:
+        """
+        self.is_binary_keys = binary
+        self.is_tuple_keys = False
+
+        if binary:
+            self.key_empty, self.key_infl, self.key_infr = b'', TYPE_INFL_BINARY, TYPE_INFR_BINARY
+        else:
+            self.key_empty, self.key_infl, self.key_infr = '', TYPE_INFL, TYPE_INFR
+
+        if self.float_precision is not None:
+            self.type_format_mappers = configure_float_precision(self.float_precision, binary)
+        else:
+            self.type_format_mappers = TYPE_FORMAT_MAPPERS_BINARY if binary else TYPE_FORMAT_MAPPERS
+
+        return self
+
     def set_float_precision(self, precision=18):
-        self.type_format_mappers = configure_float_precision(precision)
+        self.float_precision = precision
+
+        # the tuple keys keep the floats as is
+        if not self.is_tuple_keys:
+            self.type_format_mappers = configure_float_precision(precision, self.is_binary_keys)
 
         return self
     
     def has_key(self, key):
         return key in self.schema
 
+    def is_covering(self, fields):
+        return False
+
     def append_key(self, key, default_value=EMPTY):
         self.schema[key] = default_value
         self.schema_keys.append(key)
         self.schema_last_index += 1
 
+        UdbIndex.schema_revision += 1
+
         return self
 
     def clear(self):
@@ -82,22 +206,60 @@ class UdbIndex(object):
         raise NotImplementedError
 
     def insert_by_schema(self, values, uid):
-        if self.schema_default_values:
-            second = {}
-
-            for key, val in self.schema_default_values.items():
-                if key not in values:
-                    if callable(val):
-                        second[key] = val(key, values)
-                    else:
-                        second[key] = val
-        else:
-            second = None
+        self.insert(self.get_cover_key(values, self.get_schema_default_values(values)), uid)
+
+        return True
+
+    def insert_many(self, items):
+        """
+        Inserts the (key, uid) pairs.
 
-        self.insert(self.get_cover_key(values, second), uid)
+        :param items:
+
+        :return:
+        """
+        for key, uid in items:
+            self.insert(key, uid)
+
+        return self
+
+    def insert_many_by_schema(self, items):
+        """
+        Inserts the (uid, values) pairs.
+
+        :param items:
+
+        :return:
+        """
+        self.insert_many(self.get_cover_keys(items))
 
         return True
 
+    def get_cover_keys(self, items):
+        """
+        Gets the (cover key, uid) pairs of the (uid, values) pairs.
+
+        :param items:
+
+        :return:
+        """
+        return [(self.get_cover_key(values, self.get_schema_default_values(values)), uid) for uid, values in items]
+
+    def get_schema_default_values(self, values):
+        if not self.schema_default_values:
+            return None
+
+        second = {}
+
+        for key, val in self.schema_default_values.items():
+            if key not in values:
+                if callable(val):
+                    second[key] = val(key, values)
+                else:
+                    second[key] = val
+
+        return second
+
     def insert_is_allowed(self, key):
         return True
 
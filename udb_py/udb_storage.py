@@ -1,3 +1,23 @@
+import bz2
+import gzip
+import io
+import lzma
+import os
+import pickle
+
+
+COMPRESSION_BZ2 = 'bz2'
+COMPRESSION_LZMA = 'lzma'
+COMPRESSION_ZLIB = 'zlib'
+# the compressed file is recognized by its extension
+COMPRESSIONS = {
+    COMPRESSION_BZ2: ('.bz2', bz2.open),
+    COMPRESSION_LZMA: ('.xz', lzma.open),
+    COMPRESSION_ZLIB: ('.gz', gzip.open),
+}
+DEFAULT_BLOCK_SIZE = 1 << 20
+
+
 class UdbStorage(object):
     def is_available(self):
         raise NotImplementedError
@@ -5,10 +25,27 @@ class UdbStorage(object):
     def is_capture_events(self):
         return False
 
+    def is_checkpoint_required(self):
+        return False
+
+    def commit(self):
+        """
+        Commits the changes of the write operation having been done.
+
+        :return:
+        """
+        return self
+
     def drop(self):
         raise NotImplementedError
 
     def load(self):
+        """
+        Loads the db as dict of "indexes", "revision" and "data" - dict of the records by rid or iterable of (rid, record)
+        pairs to be streamed into the collection.
+
+        :return:
+        """
         raise NotImplementedError
 
     def save(self, indexes, revision, data):
@@ -17,11 +54,185 @@ class UdbStorage(object):
     def save_meta(self, indexes, revision):
         raise NotImplementedError
 
+    def save_snapshot(self, indexes, revision, data):
+        """
+        Saves the snapshot of the indexes, **load** returns it as "snapshot" entry with "revision", "indexes" and
+        "delta" - the records changed after the snapshot mapped to their state at the snapshot time (None if absent).
+
+        :param indexes:
+        :param revision:
+        :param data:
+
+        :return: False if the storage does not support the snapshots
+        """
+        return False
+
     def on_delete(self, rid):
         return self
 
     def on_insert(self, rid, record):
         return self
 
+    def on_insert_many(self, records):
+        for rid, record in records:
+            self.on_insert(rid, record)
+
+        return self
+
     def on_update(self, rid, record, values):
         return self
+
+
+def get_indexes_snapshot(indexes):
+    """
+    Gets the snapshots of the indexes along with their types and metas, so the snapshot is not applied to the index
+    having been changed since.
+
+    :param indexes:
+
+    :return:
+    """
+    return {k: [v.type, v.get_meta(), v.get_snapshot()] for k, v in indexes.items()}
+
+
+def fsync_file(name):
+    fd = os.open(name, os.O_RDONLY)
+
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def find_compressed_file(name):
+    """
+    Finds the file, the plain or compressed by any compression.
+
+    :param name: Name of the plain file.
+
+    :return: None if absent
+    """
+    for ext in [''] + [ext for ext, _ in COMPRESSIONS.values()]:
+        if os.path.isfile(name + ext):
+            return name + ext
+
+    return None
+
+
+def get_compression_ext(compression):
+    """
+    Gets the extension of the file compressed by the compression.
+
+    :param compression: "bz2", "lzma", "zlib" or None.
+
+    :return:
+    """
+    if compression is None:
+        return ''
+
+    if compression not in COMPRESSIONS:
+        raise ValueError('unknown compression: {}'.format(compression))
+
+    return COMPRESSIONS[compression][0]
+
+
+def get_file_compression(name):
+    """
+    Gets the compression of the file by its extension.
+
+    :param name:
+
+    :return: None if the file is plain
+    """
+    for compression, (ext, _) in COMPRESSIONS.items():
+        if name.endswith(ext):
+            return compression
+
+    return None
+
+
+def open_compressed(name, mode, compression=None, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Opens the file compressed by the compression streaming the data through the blocks of the block size.
+
+    :param name:
+    :param mode: "r", "rb", "w" or "wb".
+    :param compression: "bz2", "lzma", "zlib" or None for the plain file.
+    :param block_size: Block size in bytes.
+
+    :return:
+    """
+    if compression is None:
+        return open(name, mode, buffering=block_size)
+
+    file_desc = COMPRESSIONS[compression][1](name, mode[0] + 'b')
+
+    if mode[0] == 'r':
+        file_desc = io.BufferedReader(file_desc, block_size)
+    else:
+        file_desc = io.BufferedWriter(file_desc, block_size)
+
+    return file_desc if 'b' in mode else io.TextIOWrapper(file_desc, encoding='utf-8')
+
+
+def read_snapshot(name):
+    """
+    Reads the snapshot, the plain or compressed by any compression, so it is read whatever the compression is now.
+
+    :param name: Name of the plain snapshot file.
+
+    :return: None if absent
+    """
+    name = find_compressed_file(name)
+
+    if name is None:
+        return None
+
+    with open_compressed(name, 'rb', get_file_compression(name)) as file_r_desc:
+        return pickle.load(file_r_desc)
+
+
+def remove_compressed_files(name):
+    """
+    Removes the file, the plain and compressed by all compressions.
+
+    :param name: Name of the plain file.
+
+    :return:
+    """
+    name_found = find_compressed_file(name)
+
+    while name_found:
+        os.remove(name_found)
+
+        name_found = find_compressed_file(name)
+
+
+def write_snapshot(name, snapshot, compression=None):
+    """
+    Writes the snapshot compressed by the compression replacing the previous one compressed by any compression.
+
+    :param name: Name of the plain snapshot file.
+    :param snapshot:
+    :param compression:
+
+    :return:
+    """
+    name_compressed = name + get_compression_ext(compression)
+
+    # the snapshot is replaced at once, so the crash while writing leaves the previous one intact
+    with open_compressed(name_compressed + '.tmp', 'wb', compression) as file_w_desc:
+        pickle.dump(snapshot, file_w_desc, pickle.HIGHEST_PROTOCOL)
+
+    fsync_file(name_compressed + '.tmp')
+    os.replace(name_compressed + '.tmp', name_compressed)
+
+    # the previous snapshot compressed otherwise would be found along with the new one
+    for ext, _ in COMPRESSIONS.values():
+        if name + ext != name_compressed and os.path.isfile(name + ext):
+            os.remove(name + ext)
+
+    if name != name_compressed and os.path.isfile(name):
+        os.remove(name)
+
+    return True
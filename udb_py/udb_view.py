@@ -37,15 +37,28 @@ class UdbView(UdbCore):
         sort=None,
         get_plan=False,
         get_keys_only=False,
-        use_indexes=None
+        use_indexes=None,
+        fields=None,
+        get_count=False,
     ):
         for index in self._indexes_with_custom_ops:
             q = index.merge_condition(q or {}, self._query)
 
         if self._indexes:
-            return UdbCore.get_q_cursor(self, q, limit, offset, sort, get_plan, get_keys_only, use_indexes)
-
-        return self._udb.get_q_cursor(q, limit, offset, sort, get_plan, get_keys_only, use_indexes)
+            return UdbCore.get_q_cursor(
+                self,
+                q,
+                limit,
+                offset,
+                sort,
+                get_plan,
+                get_keys_only,
+                use_indexes,
+                fields,
+                get_count,
+            )
+
+        return self._udb.get_q_cursor(q, limit, offset, sort, get_plan, get_keys_only, use_indexes, fields, get_count)
 
     def _on_delete(self, rid):
         record = self._collection.get(rid, None)